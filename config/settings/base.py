@@ -44,6 +44,27 @@ QUESTIONS_TO_AUTODETECT_DUPLICATES = os.environ.get(
     "QUESTIONS_TO_AUTODETECT_DUPLICATES", None
 )
 
+# ==> Configuration for streaming VA ingest
+# When set to a positive number, VA CSV exports (load_va_csv, ODK imports) are
+# read and committed in chunks of this many rows so that memory usage stays flat
+# regardless of file size. By default (0) the whole file is loaded at once
+VA_IMPORT_CHUNK_SIZE = env.int("VA_IMPORT_CHUNK_SIZE", default=0)
+# When True, VAs and their history rows are written with PostgreSQL COPY rather
+# than multi-row INSERTs, which is much faster for large imports and backfills
+VA_IMPORT_USE_COPY = env.bool("VA_IMPORT_USE_COPY", default=False)
+# When True, imported VAs don't get a full historical row each. They reference
+# their import batch instead and the row is written when a VA is first changed
+VA_IMPORT_DEFER_HISTORY = env.bool("VA_IMPORT_DEFER_HISTORY", default=False)
+# When True, Celery imports queue coding of the VAs they create rather than
+# leaving them for the nightly coding run. Imports within
+# VA_CODING_TRIGGER_DELAY seconds of the first one are coded together
+VA_CODE_AFTER_IMPORT = env.bool("VA_CODE_AFTER_IMPORT", default=False)
+VA_CODING_TRIGGER_DELAY = env.int("VA_CODING_TRIGGER_DELAY", default=300)
+# When True, the dashboard's charts are answered from a rollup of VA counts that
+# imports, coding and edits keep up to date, rather than by aggregating the VAs
+# on every request. Build it with the rebuild_dashboard_rollup command first
+DASHBOARD_USE_ROLLUP = env.bool("DASHBOARD_USE_ROLLUP", default=False)
+
 DEFAULT_AUTO_FIELD = "django.db.models.AutoField"
 
 # Databases
@@ -31,7 +31,7 @@ class IndexView(CustomAuthMixin, PermissionRequiredMixin, TemplateView):
             events = cmd.get_pushed_va("sv91bCroFFx", auth)
 
             va_list = VerbalAutopsy.objects.filter(
-                causes__isnull=False, dhisva__isnull=True
+                causes__variant="", dhisva__isnull=True
             ).values_list("id", flat=True)
             list1 = list(va_list)
             list1 = [str(i) for i in list1]
@@ -82,7 +82,7 @@ class PushDHISView(CustomAuthMixin, PermissionRequiredMixin, TemplateView):
             dhis_data = [int(i) for i in va_in_dhis]
 
             va_data = (
-                VerbalAutopsy.objects.filter(causes__isnull=False, dhisva__isnull=True)
+                VerbalAutopsy.objects.filter(causes__variant="", dhisva__isnull=True)
                 .exclude(id__in=dhis_data)
                 .count()
             )
@@ -5,11 +5,11 @@ from django.db.models import F
 from pandas.tseries.offsets import DateOffset
 
 from va_explorer.va_data_management.constants import REDACTED_STRING
-from va_explorer.va_data_management.utils.date_parsing import (
-    get_interview_dates,
-    parse_date,
-    to_dt,
+from va_explorer.va_data_management.models import (
+    default_cause,
+    prefetch_default_cause,
 )
+from va_explorer.va_data_management.utils.date_parsing import parse_date, to_dt
 
 TODAY = pd.to_datetime(date.today())
 START_MONTH = pd.to_datetime(date(TODAY.year - 1, TODAY.month, 1))
@@ -17,13 +17,11 @@ START_MONTH = pd.to_datetime(date(TODAY.year - 1, TODAY.month, 1))
 NUM_TABLE_ROWS = 5
 VA_DF_FIELDS = [
     "id",
-    "Id10023",
+    "death_date",
     "location",
-    "Id10011",
-    "Id10012",
+    "interview_date",
     "created",
     "Id10010",
-    "Id10011",
 ]
 VA_TABLE_FIELDS = [
     "id",
@@ -105,10 +103,11 @@ def get_context_for_va_table(va_list, user):
     return context
 
 
-# NOTE: using Id10012 (Interview date) to drive stats/views. submissiondate is
-# unreliable or inaccurate due to bulk submissions
+# NOTE: using interview_date (Id10012, or Id10011 if missing) to drive
+# stats/views. submissiondate is unreliable or inaccurate due to bulk submissions
 def get_trends_data(user):
-    user_vas = user.verbal_autopsies()
+    # only the causes of the default algorithm settings are counted
+    user_vas = user.verbal_autopsies().annotate(cod=default_cause())
     va_table = empty_va_table()
     graphs = empty_graph_data()
     issue_list = []
@@ -120,26 +119,21 @@ def get_trends_data(user):
         va_df = pd.DataFrame(
             user_vas.only(*VA_DF_FIELDS)
             .select_related("location")
-            .select_related("causes")
             .values(
                 "id",
-                "Id10023",
+                "death_date",
                 "created",
-                "Id10011",
-                "Id10012",
+                "interview_date",
                 name=F("Id10010"),
                 facility=F("location__name"),
-                cause=F("causes__cause"),
+                cause=F("cod__cause"),
             )
         )
 
-        va_df["date"] = get_interview_dates(va_df)
-
-        # clean date fields - strip timezones from Id10012 (Interview date
-        # created dates
-        va_df["date"] = to_dt(va_df["date"])
+        # clean date fields - strip timezones from created dates
+        va_df["date"] = to_dt(va_df["interview_date"])
         va_df["created"] = to_dt(va_df["created"])
-        va_df["Id10023"] = to_dt(va_df["Id10023"])
+        va_df["death_date"] = to_dt(va_df["death_date"])
         va_df["yearmonth"] = va_df["date"].dt.strftime("%Y-%m")
 
         # Load the VAs that are collected over various periods of time
@@ -215,15 +209,15 @@ def get_trends_data(user):
         # refetching makes this more efficient
         vas_to_address = (
             user_vas.only(*user_va_table_fields)
-            .filter(causes__isnull=True)[:NUM_TABLE_ROWS]
-            .prefetch_related("causes", "coding_issues", "location")
+            .filter(cod__isnull=True)[:NUM_TABLE_ROWS]
+            .prefetch_related(prefetch_default_cause(), "coding_issues", "location")
         )
 
         # List the VAs with Indeterminate COD
         vas_with_indeterminate_cod = (
             user_vas.only(*user_va_table_fields)
-            .filter(causes__cause="Indeterminate")[:NUM_TABLE_ROWS]
-            .prefetch_related("causes", "coding_issues", "location")
+            .filter(cod__cause="Indeterminate")[:NUM_TABLE_ROWS]
+            .prefetch_related(prefetch_default_cause(), "coding_issues", "location")
         )
 
         issue_list = get_context_for_va_table(vas_to_address, user)
@@ -237,7 +231,7 @@ def get_trends_data(user):
             (len(vas_overall) - vas_coded_overall) - NUM_TABLE_ROWS, 0
         )
         additional_indeterminate_cods = max(
-            user_vas.only("id").filter(causes__cause="Indeterminate").count()
+            user_vas.only("id").filter(cod__cause="Indeterminate").count()
             - NUM_TABLE_ROWS,
             0,
         )
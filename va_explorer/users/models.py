@@ -78,18 +78,11 @@ class User(AbstractUser):
         date_cutoff = date_cutoff if date_cutoff else "1901-01-01"
         end_date = end_date if end_date else datetime.today().strftime("%Y-%m-%d")
         va_objects = VerbalAutopsy.objects.filter(
-            Id10023__gte=date_cutoff, Id10023__lte=end_date
+            death_date__gte=date_cutoff, death_date__lte=end_date
         )
 
-        if self.location_restrictions.count() > 0:
-            # Get the query set of all locations at or below the parent nodes
-            # the user can access by joining the query sets of all the location
-            # trees; using the | operator leads to an efficient query
-            location_sets = [
-                Location.get_tree(location)
-                for location in self.location_restrictions.all()
-            ]
-            locations = reduce((lambda set1, set2: set1 | set2), location_sets)
+        locations = self.accessible_locations()
+        if locations is not None:
             # Return the list of all verbal autopsies associated with that
             # query set of locations
             return va_objects.filter(location__in=locations)
@@ -97,6 +90,18 @@ class User(AbstractUser):
             # No location restrictions, which implies access to all data
             return va_objects
 
+    # The locations the user can access VAs at, or None if they're not restricted
+    def accessible_locations(self):
+        if self.location_restrictions.count() == 0:
+            return None
+        # Get the query set of all locations at or below the parent nodes
+        # the user can access by joining the query sets of all the location
+        # trees; using the | operator leads to an efficient query
+        location_sets = [
+            Location.get_tree(location) for location in self.location_restrictions.all()
+        ]
+        return reduce((lambda set1, set2: set1 | set2), location_sets)
+
     def is_fieldworker(self):
         return self.groups.filter(name="Field Workers").exists()
 
@@ -0,0 +1,32 @@
+# Generated by Django 4.1.2 on 2026-10-17 05:03
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('va_data_management', '0021_causeofdeath_input_hash'),
+        ('va_analytics', '0001_initial'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='DashboardRollup',
+            fields=[
+                ('id', models.AutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('death_date', models.DateField(null=True)),
+                ('age_group', models.TextField()),
+                ('sex', models.TextField(blank=True)),
+                ('place', models.TextField(blank=True)),
+                ('cause', models.TextField(null=True)),
+                ('count', models.IntegerField()),
+                ('location', models.ForeignKey(null=True, on_delete=django.db.models.deletion.CASCADE, related_name='+', to='va_data_management.location')),
+            ],
+        ),
+        migrations.AddIndex(
+            model_name='dashboardrollup',
+            index=models.Index(fields=['location', 'death_date'], name='va_analytic_locatio_c0d25b_idx'),
+        ),
+    ]
@@ -15,3 +15,28 @@ class Dashboard(models.Model):
             ("view_pii", "Can view PII in data"),
             ("supervise_users", "Can supervise other users"),
         )
+
+
+# Pre-aggregated VA counts the dashboard can be answered from instead of the VAs
+# themselves (see utils/rollup.py): how many VAs (per cause of death) share each
+# combination of the values the dashboard filters and groups by. VAs without a
+# cause are counted with a blank cause
+class DashboardRollup(models.Model):
+    # the derived fields of the VAs, see VerbalAutopsy.set_derived_fields
+    death_date = models.DateField(null=True)
+    location = models.ForeignKey(
+        "va_data_management.Location",
+        related_name="+",
+        on_delete=models.CASCADE,
+        null=True,
+    )
+    age_group = models.TextField()
+    sex = models.TextField(blank=True)
+    # Id10058
+    place = models.TextField(blank=True)
+    cause = models.TextField(null=True)
+    count = models.IntegerField()
+
+    class Meta:
+        # rows are rebuilt by (death date, location)
+        indexes = [models.Index(fields=["location", "death_date"])]
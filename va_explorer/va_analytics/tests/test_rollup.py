@@ -0,0 +1,189 @@
+import pandas as pd
+import pytest
+from django.core.management import call_command
+
+from va_explorer.tests.factories import (
+    CauseOfDeathFactory,
+    UserFactory,
+    VerbalAutopsyFactory,
+)
+from va_explorer.va_analytics.models import DashboardRollup
+from va_explorer.va_analytics.utils.loading import load_va_data
+from va_explorer.va_analytics.utils.rollup import (
+    rebuild_dashboard_rollup,
+    refresh_dashboard_rollup,
+    rollup_partitions,
+)
+from va_explorer.va_data_management.models import Location, VerbalAutopsy
+from va_explorer.va_data_management.utils.loading import load_records_from_dataframe
+
+pytestmark = pytest.mark.django_db
+
+FILTERS = [
+    {},
+    {"age": "adult", "sex": "female"},
+    {"region_of_interest": "North Province"},
+    {"region_of_interest": "East District"},
+    {"cause_of_death": "Malaria"},
+    {"start_date": "2021-02-01", "end_date": "2021-02-28"},
+]
+
+
+def dashboard_data(user, **filters):
+    filters = {
+        "cause_of_death": None,
+        "start_date": "1901-01-01",
+        "end_date": "2030-01-01",
+        "region_of_interest": None,
+        "age": None,
+        "sex": None,
+        **filters,
+    }
+    data = load_va_data(user, **filters)
+    # order doesn't matter between groups with equal counts
+    return {
+        key: (
+            sorted(map(repr, value))
+            if key.startswith(("COD", "place", "geo"))
+            else value
+        )
+        for key, value in data.items()
+    }
+
+
+def rollup_rows():
+    return sorted(
+        DashboardRollup.objects.values_list(
+            "death_date", "location", "age_group", "sex", "place", "cause", "count"
+        ),
+        key=repr,
+    )
+
+
+@pytest.fixture
+def facilities():
+    country = Location.add_root(name="Country", location_type="country")
+    facilities = []
+    for province_name, district_name in [("North", "East"), ("South", "West")]:
+        province = country.add_child(
+            name=f"{province_name} Province", location_type="province"
+        )
+        district = province.add_child(
+            name=f"{district_name} District", location_type="district"
+        )
+        facilities.append(
+            district.add_child(
+                name=f"{district_name} Facility", location_type="facility"
+            )
+        )
+    return facilities
+
+
+@pytest.fixture
+def vas(facilities):
+    vas = []
+    for i in range(12):
+        va = VerbalAutopsyFactory.create(
+            location=facilities[i % 2],
+            Id10023=f"2021-0{1 + i % 3}-1{i % 5}",
+            Id10019=["male", "female"][i % 2],
+            Id10058=["home", "hospital"][i % 4 // 2],
+            isAdult="1" if i % 3 else "",
+            isChild="" if i % 3 else "1.0",
+        )
+        if i % 4:
+            CauseOfDeathFactory.create(
+                verbalautopsy=va, cause=["Malaria", "HIV/AIDS related death"][i % 2]
+            )
+        # causes of other settings variants aren't counted
+        CauseOfDeathFactory.create(verbalautopsy=va, cause="Other", variant="other")
+        vas.append(va)
+    # VAs the dashboard leaves out of its charts but counts as uncoded
+    vas.append(VerbalAutopsyFactory.create(location=None, Id10023="2021-01-01"))
+    vas.append(VerbalAutopsyFactory.create(location=facilities[0], Id10023="dk"))
+    return vas
+
+
+@pytest.mark.parametrize("filters", FILTERS)
+def test_rollup_matches_vas(settings, vas, facilities, filters):
+    rebuild_dashboard_rollup()
+
+    for user in [
+        UserFactory.create(),
+        UserFactory.create(location_restrictions=[facilities[1]]),
+    ]:
+        settings.DASHBOARD_USE_ROLLUP = False
+        expected = dashboard_data(user, **filters)
+        settings.DASHBOARD_USE_ROLLUP = True
+        assert dashboard_data(user, **filters) == expected
+
+
+@pytest.mark.parametrize("use_rollup", [False, True])
+def test_region_filters(settings, vas, use_rollup):
+    settings.DASHBOARD_USE_ROLLUP = use_rollup
+    rebuild_dashboard_rollup()
+
+    data = load_va_data(
+        UserFactory.create(),
+        None,
+        "1901-01-01",
+        "2030-01-01",
+        "North Province",
+        None,
+        None,
+    )
+    # coded VAs at the facility in North Province / East District
+    assert list(data["geographic_province_sums"]) == [
+        {"province_name": "North Province", "count": 3}
+    ]
+    assert list(data["geographic_district_sums"]) == [
+        {"district_name": "East District", "count": 3}
+    ]
+
+
+def test_refresh_dashboard_rollup(settings, vas, facilities):
+    settings.DASHBOARD_USE_ROLLUP = True
+    rebuild_dashboard_rollup()
+
+    # code a VA, move another to a new date and location, delete a third
+    CauseOfDeathFactory.create(verbalautopsy=vas[0], cause="Malaria")
+    partitions = rollup_partitions([vas[1].id])
+    vas[1].Id10023 = "2022-05-05"
+    vas[1].location = facilities[0]
+    vas[1].save()
+    vas[2].delete()
+    refresh_dashboard_rollup([va.id for va in vas[:3]], partitions)
+
+    refreshed = rollup_rows()
+    rebuild_dashboard_rollup()
+    assert refreshed == rollup_rows()
+
+
+def test_rollup_kept_up_to_date_by_imports(settings, vas):
+    settings.DASHBOARD_USE_ROLLUP = True
+    rebuild_dashboard_rollup()
+    df = pd.DataFrame.from_records(
+        [{"instanceid": f"instance{i}", "Id10023": "2021-01-10"} for i in range(3)]
+    ).assign(Id10017="name", Id10018="surname", Id10012="2021-03-21")
+
+    load_records_from_dataframe(df)
+
+    refreshed = rollup_rows()
+    rebuild_dashboard_rollup()
+    assert refreshed == rollup_rows()
+    assert DashboardRollup.objects.filter(death_date="2021-01-10").exists()
+
+
+def test_rollup_kept_up_to_date_by_refresh_locations(settings, vas, facilities):
+    settings.DASHBOARD_USE_ROLLUP = True
+    rebuild_dashboard_rollup()
+    facilities[0].key = "east"
+    facilities[0].save()
+    VerbalAutopsy.objects.filter(location=facilities[1]).update(hospital="east")
+
+    call_command("refresh_locations")
+
+    refreshed = rollup_rows()
+    rebuild_dashboard_rollup()
+    assert refreshed == rollup_rows()
+    assert not DashboardRollup.objects.filter(location=facilities[1]).exists()
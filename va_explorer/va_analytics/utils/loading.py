@@ -4,22 +4,13 @@ import os
 from operator import itemgetter
 from pathlib import Path
 
-from django.db.models import (
-    Case,
-    CharField,
-    Count,
-    DateField,
-    F,
-    OuterRef,
-    Q,
-    Subquery,
-    Value,
-    When,
-)
-from django.db.models.functions import Cast, Substr, TruncMonth
+from django.conf import settings
+from django.db.models import Count, F, Sum
+from django.db.models.functions import TruncMonth
 
+from va_explorer.va_analytics.utils.rollup import user_rollup
 from va_explorer.va_data_management.models import (
-    Location,
+    default_cause,
     questions_to_autodetect_duplicates,
 )
 from va_explorer.va_data_management.utils.loading import get_va_summary_stats
@@ -69,108 +60,51 @@ def load_va_data(
     if len(questions_to_autodetect_duplicates()) > 0:
         update_stats["duplicates"] = user_vas.filter(duplicate=True).count()
 
-    user_vas_filtered = user_vas.exclude(Id10023__in=["dk", "DK"]).exclude(
+    if settings.DASHBOARD_USE_ROLLUP:
+        return {
+            **load_rollup_data(
+                user, cause_of_death, start_date, end_date, region_of_interest, age, sex
+            ),
+            "update_stats": update_stats,
+            "all_causes_list": load_cod_groupings(cause_of_death=cause_of_death)[
+                "dropdown_options"
+            ],
+        }
+
+    # only the causes of the default algorithm settings are counted
+    user_vas = user_vas.annotate(cod=default_cause())
+    user_vas_filtered = user_vas.exclude(death_date__isnull=True).exclude(
         location__isnull=True
     )
 
     # apply cause of death filtering if sent in with request
     if cause_of_death:
         causes = load_cod_groupings(cause_of_death=cause_of_death)["filter_causes"]
-        user_vas_filtered = user_vas_filtered.filter(causes__cause__in=causes)
+        user_vas_filtered = user_vas_filtered.filter(cod__cause__in=causes)
 
     # apply geographic filtering if sent in with request
     if region_of_interest:
         if "District" in region_of_interest:
-            user_vas_filtered = (
-                user_vas_filtered.annotate(
-                    district_name=Subquery(
-                        Location.objects.values("name").filter(
-                            Q(path=Substr(OuterRef("location__path"), 1, 12)),
-                            Q(depth=3),
-                        )[:1]
-                    )
-                )
-                .filter(district_name=region_of_interest)
-                .select_related("location")
+            user_vas_filtered = user_vas_filtered.filter(
+                location__district_name=region_of_interest
             )
 
         if "Province" in region_of_interest:
-            user_vas_filtered = (
-                user_vas_filtered.annotate(
-                    province_name=Subquery(
-                        Location.objects.values("name").filter(
-                            Q(path=Substr(OuterRef("location__path"), 1, 8)), Q(depth=2)
-                        )[:1]
-                    )
-                )
-                .filter(province_name=region_of_interest)
-                .select_related("location")
-            )
-
-    # apply filtering for age sent in request, cover is<X>, is<X>1, and is<X>2
-    # from VA specification
-    if age:
-        if age == "adult":
-            user_vas_filtered = user_vas_filtered.filter(
-                Q(isAdult="1")
-                | Q(isAdult="1.0")
-                | Q(isAdult1="1")
-                | Q(isAdult1="1.0")
-                | Q(isAdult2="1")
-                | Q(isAdult2="1.0")
-            )
-        if age == "child":
-            user_vas_filtered = user_vas_filtered.filter(
-                Q(isChild="1")
-                | Q(isChild="1.0")
-                | Q(isChild1="1")
-                | Q(isChild1="1.0")
-                | Q(isChild2="1")
-                | Q(isChild2="1.0")
-            )
-        if age == "neonate":
             user_vas_filtered = user_vas_filtered.filter(
-                Q(isNeonatal="1")
-                | Q(isNeonatal="1")
-                | Q(isNeonatal1="1")
-                | Q(isNeonatal1="1")
-                | Q(isNeonatal2="1")
-                | Q(isNeonatal2="1")
+                location__province_name=region_of_interest
             )
 
-    # apply filtering for sex sent in request
+    # apply filtering for age and sex sent in request
+    if age:
+        user_vas_filtered = user_vas_filtered.filter(age_category=age)
     if sex:
-        user_vas_filtered = user_vas_filtered.filter(Id10019=sex)
+        user_vas_filtered = user_vas_filtered.filter(sex=sex)
 
-    uncoded_vas = user_vas.filter(causes__cause__isnull=True).count()
+    uncoded_vas = user_vas.filter(cod__cause__isnull=True).count()
 
     demographics = (
-        user_vas_filtered.filter(causes__isnull=False)
-        .values(
-            gender=F("Id10019"),
-            age_group_named=Case(
-                When(isNeonatal="1", then=Value("neonate")),
-                When(isNeonatal="1.0", then=Value("neonate")),
-                When(isNeonatal1="1", then=Value("neonate")),
-                When(isNeonatal1="1.0", then=Value("neonate")),
-                When(isNeonatal2="1", then=Value("neonate")),
-                When(isNeonatal2="1.0", then=Value("neonate")),
-                When(isChild="1", then=Value("child")),
-                When(isChild="1.0", then=Value("child")),
-                When(isChild1="1", then=Value("child")),
-                When(isChild1="1.0", then=Value("child")),
-                When(isChild2="1", then=Value("child")),
-                When(isChild2="1.0", then=Value("child")),
-                When(isAdult="1", then=Value("adult")),
-                When(isAdult="1.0", then=Value("adult")),
-                When(isAdult1="1", then=Value("adult")),
-                When(isAdult1="1.0", then=Value("adult")),
-                When(isAdult2="1", then=Value("adult")),
-                When(isAdult2="1.0", then=Value("adult")),
-                default=Value("Unknown"),
-                output_field=CharField(),
-            ),
-        )
+        user_vas_filtered.filter(cod__isnull=False)
+        .values(gender=F("sex"), age_group_named=F("age_category"))
         .annotate(count=Count("pk"))
         .order_by("age_group_named")
     )
@@ -184,55 +118,36 @@ def load_va_data(
     ]
 
     COD_sums = (
-        user_vas_filtered.filter(causes__isnull=False)
-        .select_related("causes")
-        .values(cause=F("causes__cause"))
+        user_vas_filtered.filter(cod__isnull=False)
+        .values(cause=F("cod__cause"))
         .annotate(count=Count("pk"))
         .order_by("-count")
     )
 
     COD_trend = (
-        user_vas_filtered.annotate(
-            month=TruncMonth(Cast("Id10023", output_field=DateField()))
-        )
-        .filter(causes__isnull=False)
+        user_vas_filtered.annotate(month=TruncMonth("death_date"))
+        .filter(cod__isnull=False)
         .values("month")
         .annotate(count=Count("pk"))
         .order_by("month")
     )
 
     place_of_death = (
-        user_vas_filtered.filter(causes__isnull=False)
+        user_vas_filtered.filter(cod__isnull=False)
         .values(place=F("Id10058"))
         .annotate(count=Count("pk"))
         .order_by("-count")
     )
 
     geographic_province_sums = (
-        user_vas_filtered.annotate(
-            province_name=Subquery(
-                Location.objects.values("name").filter(
-                    Q(path=Substr(OuterRef("location__path"), 1, 8)), Q(depth=2)
-                )[:1]
-            )
-        )
-        .filter(causes__isnull=False)
-        .select_related("location")
-        .values("province_name")
+        user_vas_filtered.filter(cod__isnull=False)
+        .values(province_name=F("location__province_name"))
         .annotate(count=Count("pk"))
     )
 
     geographic_district_sums = (
-        user_vas_filtered.annotate(
-            district_name=Subquery(
-                Location.objects.values("name").filter(
-                    Q(path=Substr(OuterRef("location__path"), 1, 12)), Q(depth=3)
-                )[:1]
-            )
-        )
-        .filter(causes__isnull=False)
-        .select_related("location")
-        .values("district_name")
+        user_vas_filtered.filter(cod__isnull=False)
+        .values(district_name=F("location__district_name"))
         .annotate(count=Count("pk"))
     )
 
@@ -251,3 +166,62 @@ def load_va_data(
     }
 
     return data
+
+
+# The charts of load_va_data, answered from the dashboard rollup (see
+# utils/rollup.py) rather than the VAs, so their cost doesn't grow with the
+# number of VAs. Counts are summed over the rollup rows of each group
+def load_rollup_data(
+    user, cause_of_death, start_date, end_date, region_of_interest, age, sex
+):
+    rollup = user_rollup(user, start_date, end_date)
+    uncoded_vas = rollup.filter(cause__isnull=True).aggregate(count=Sum("count"))
+
+    filtered = rollup.exclude(death_date__isnull=True).exclude(location__isnull=True)
+    if cause_of_death:
+        causes = load_cod_groupings(cause_of_death=cause_of_death)["filter_causes"]
+        filtered = filtered.filter(cause__in=causes)
+    if region_of_interest:
+        if "District" in region_of_interest:
+            filtered = filtered.filter(location__district_name=region_of_interest)
+        if "Province" in region_of_interest:
+            filtered = filtered.filter(location__province_name=region_of_interest)
+    if age:
+        filtered = filtered.filter(age_group=age)
+    if sex:
+        filtered = filtered.filter(sex=sex)
+    coded = filtered.filter(cause__isnull=False)
+
+    demographics = (
+        coded.values(gender=F("sex"), age_group_named=F("age_group"))
+        .annotate(count=Sum("count"))
+        .order_by("age_group_named")
+    )
+    demographics = [
+        {
+            "age_group": key,
+            **{item.get("gender"): item.get("count") for item in list(group)},
+        }
+        for key, group in itertools.groupby(demographics, itemgetter("age_group_named"))
+    ]
+
+    return {
+        "COD_grouping": coded.values("cause")
+        .annotate(count=Sum("count"))
+        .order_by("-count"),
+        "COD_trend": coded.annotate(month=TruncMonth("death_date"))
+        .values("month")
+        .annotate(count=Sum("count"))
+        .order_by("month"),
+        "place_of_death": coded.values("place")
+        .annotate(count=Sum("count"))
+        .order_by("-count"),
+        "demographics": demographics,
+        "geographic_province_sums": coded.values(
+            province_name=F("location__province_name")
+        ).annotate(count=Sum("count")),
+        "geographic_district_sums": coded.values(
+            district_name=F("location__district_name")
+        ).annotate(count=Sum("count")),
+        "uncoded_vas": uncoded_vas["count"] or 0,
+    }
@@ -0,0 +1,96 @@
+from collections import defaultdict
+
+from django.conf import settings
+from django.db import connection, transaction
+from django.db.models import Count, F, Q
+
+from va_explorer.va_analytics.models import DashboardRollup
+from va_explorer.va_data_management.models import VerbalAutopsy, default_cause
+
+# pg_advisory_xact_lock namespace for rebuilding a location's rollup rows, so
+# concurrent refreshes (e.g. parallel coding chunks) don't double count
+ROLLUP_LOCK = 20230
+
+
+# Rollup rows counting the given VAs
+def _rollup_rows(vas):
+    counts = (
+        vas.annotate(cod=default_cause())
+        .values(
+            "location_id",
+            "death_date",
+            "sex",
+            "age_category",
+            place=F("Id10058"),
+            cause=F("cod__cause"),
+        )
+        .annotate(count=Count("pk"))
+        .order_by()
+    )
+    return [DashboardRollup(age_group=row.pop("age_category"), **row) for row in counts]
+
+
+# The (death date, location) pairs the given VAs, live or deleted, are counted
+# under in the rollup. Rows are rebuilt for these pairs; collect them before a
+# change that may move VAs to other pairs (e.g. an edit of the date of death)
+def rollup_partitions(va_ids):
+    if not settings.DASHBOARD_USE_ROLLUP or not va_ids:
+        return set()
+    return set(
+        VerbalAutopsy.all_objects.filter(id__in=va_ids).values_list(
+            "death_date", "location_id"
+        )
+    )
+
+
+# Keep the rollup in step after the given VAs were created, coded, edited or
+# deleted, by recounting the (death date, location) pairs they're counted under
+# now and any others given (e.g. those they were counted under before an edit)
+def refresh_dashboard_rollup(va_ids, partitions=()):
+    if not settings.DASHBOARD_USE_ROLLUP:
+        return
+    dates_by_location = defaultdict(set)
+    for death_date, location_id in rollup_partitions(va_ids) | set(partitions):
+        dates_by_location[location_id].add(death_date)
+    if not dates_by_location:
+        return
+
+    with transaction.atomic(), connection.cursor() as cursor:
+        # lock in a consistent order, so concurrent refreshes can't deadlock
+        for location_id in sorted(dates_by_location, key=lambda key: key or 0):
+            cursor.execute(
+                "SELECT pg_advisory_xact_lock(%s, %s)", [ROLLUP_LOCK, location_id or 0]
+            )
+        for location_id, dates in dates_by_location.items():
+            # VAs with an unknown date of death are counted under a null date
+            in_dates = Q(death_date__in=dates)
+            if None in dates:
+                in_dates |= Q(death_date__isnull=True)
+            DashboardRollup.objects.filter(in_dates, location_id=location_id).delete()
+            vas = VerbalAutopsy.objects.filter(in_dates, location_id=location_id)
+            DashboardRollup.objects.bulk_create(_rollup_rows(vas))
+
+
+# Recount the whole rollup from the VAs, e.g. to build it when turning on
+# DASHBOARD_USE_ROLLUP or after causes were cleared in bulk
+def rebuild_dashboard_rollup(batch_size=1000):
+    with transaction.atomic(), connection.cursor() as cursor:
+        # refreshes wait for the rebuild rather than write to the table under it
+        cursor.execute(f"LOCK TABLE {DashboardRollup._meta.db_table} IN EXCLUSIVE MODE")
+        DashboardRollup.objects.all().delete()
+        DashboardRollup.objects.bulk_create(
+            _rollup_rows(VerbalAutopsy.objects.all()), batch_size=batch_size
+        )
+    return DashboardRollup.objects.count()
+
+
+# The rollup rows of the VAs a user can access (their location restrictions
+# applied as a facility filter) with deaths from start_date to end_date
+def user_rollup(user, start_date, end_date):
+    rollup = DashboardRollup.objects.filter(
+        death_date__gte=start_date, death_date__lte=end_date
+    )
+    locations = user.accessible_locations()
+    if locations is not None:
+        rollup = rollup.filter(location__in=locations)
+    return rollup
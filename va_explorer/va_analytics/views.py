@@ -12,9 +12,9 @@ from rest_framework.views import APIView
 from va_explorer.users.models import User
 from va_explorer.utils.mixins import CustomAuthMixin
 from va_explorer.va_analytics.filters import SupervisionFilter
-from va_explorer.va_data_management.utils.date_parsing import (
-    get_interview_dates,
-    parse_date,
+from va_explorer.va_data_management.models import (
+    default_cause,
+    prefetch_default_cause,
 )
 
 from .utils.loading import load_va_data
@@ -60,7 +60,7 @@ class UserSupervisionView(CustomAuthMixin, PermissionRequiredMixin, ListView):
         # Restrict to VAs this user can access and prefetch related for performance
         queryset = (
             self.request.user.verbal_autopsies()
-            .prefetch_related("location", "causes", "coding_issues")
+            .prefetch_related("location", prefetch_default_cause(), "coding_issues")
             .exclude(Id10010="")
         )
 
@@ -93,17 +93,17 @@ class UserSupervisionView(CustomAuthMixin, PermissionRequiredMixin, ListView):
 
         all_vas = (
             context["object_list"]
-            .only("id", "Id10012", "Id10011", "Id10010")
+            .only("id", "interview_date", "Id10010")
             .select_related("location")
-            .select_related("causes")
             .select_related("coding_issues")
+            # only the causes of the default algorithm settings are counted
+            .annotate(cod=default_cause())
             .values(
                 "id",
-                "Id10012",
-                "Id10011",
+                "interview_date",
                 interviewer=F("Id10010"),
                 facility=F("location__name"),
-                cause=F("causes__cause"),
+                cause=F("cod__cause"),
                 errors=Count(
                     F("coding_issues"), filter=Q(coding_issues__severity="error")
                 ),
@@ -115,10 +115,8 @@ class UserSupervisionView(CustomAuthMixin, PermissionRequiredMixin, ListView):
         va_df = pd.DataFrame(all_vas)
 
         if not va_df.empty:
-            va_df["date"] = get_interview_dates(va_df)
             context["supervision_stats"] = (
-                va_df.assign(date=lambda df: df["date"].apply(parse_date))
-                .assign(date=lambda df: to_dt(df["date"], errors="coerce"))
+                va_df.assign(date=lambda df: to_dt(df["interview_date"]))
                 # only analyze vas with valid interview dates
                 .query("date == date")
                 .assign(
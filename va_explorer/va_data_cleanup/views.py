@@ -11,6 +11,7 @@ from ..utils.file_io import download_list_as_csv, download_queryset_as_csv
 from ..utils.mixins import CustomAuthMixin
 from ..va_data_management.models import (
     VerbalAutopsy,
+    prefetch_default_cause,
     questions_to_autodetect_duplicates,
 )
 from ..va_data_management.utils.date_parsing import parse_date
@@ -28,7 +29,7 @@ class DataCleanupIndexView(CustomAuthMixin, PermissionRequiredMixin, ListView):
     def get_queryset(self):
         queryset = (
             self.request.user.verbal_autopsies()
-            .prefetch_related("location", "causes", "coding_issues")
+            .prefetch_related("location", prefetch_default_cause(), "coding_issues")
             .annotate(
                 deceased=Concat("Id10017", V(" "), "Id10018", output_field=CharField())
             )
@@ -47,13 +47,13 @@ class VAFilter(FilterSet):
         widget=TextInput(attrs={"class": "form-text"}),
     )
     start_date = DateFilter(
-        field_name="Id10023",
+        field_name="death_date",
         lookup_expr="gte",
         label="Earliest Date",
         widget=DateInput(attrs={"class": "form-date datepicker"}),
     )
     end_date = DateFilter(
-        field_name="Id10023",
+        field_name="death_date",
         lookup_expr="lte",
         label="Latest Date",
         widget=DateInput(attrs={"class": "form-date datepicker"}),
@@ -65,7 +65,8 @@ class VAFilter(FilterSet):
         widget=TextInput(attrs={"class": "form-text"}),
     )
     cause = CharFilter(
-        field_name="causes__cause",
+        # the VA querysets filtered are annotated with their default_cause
+        field_name="cod__cause",
         lookup_expr="icontains",
         label="Cause",
         widget=TextInput(attrs={"class": "form-text"}),
@@ -0,0 +1,51 @@
+from django.conf import settings
+from django.core.management.base import BaseCommand
+
+from va_explorer.va_analytics.utils.rollup import rebuild_dashboard_rollup
+from va_explorer.va_data_management.models import VerbalAutopsy
+from va_explorer.va_data_management.models.verbal_autopsy import (
+    AGE_CATEGORY_FLAGS,
+    DERIVED_FIELDS,
+)
+
+# the answers the derived fields are set from (see set_derived_fields)
+SOURCE_FIELDS = ["Id10023", "Id10012", "Id10011", "Id10019"] + [
+    f"{flag}{suffix}" for flag, _ in AGE_CATEGORY_FLAGS for suffix in ["", "1", "2"]
+]
+
+
+class Command(BaseCommand):
+    help = (
+        "Sets the typed date of death, interview date, age group and sex of "
+        "existing VAs from their answers"
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--batch_size", type=int, default=5000)
+
+    def handle(self, *args, **options):
+        batch_size = options["batch_size"]
+        # deleted VAs too, so they're right if they're ever restored
+        vas = VerbalAutopsy.all_objects.only("id", *SOURCE_FIELDS).order_by("id")
+
+        self.stdout.write(self.style.SUCCESS("Setting derived fields of VAs..."))
+        num_vas = 0
+        last_id = 0
+        while True:
+            batch = list(vas.filter(id__gt=last_id)[:batch_size])
+            if not batch:
+                break
+            for va in batch:
+                va.set_derived_fields()
+            VerbalAutopsy.all_objects.bulk_update(batch, DERIVED_FIELDS)
+            num_vas += len(batch)
+            last_id = batch[-1].id
+
+        self.stdout.write(
+            self.style.SUCCESS(f"Set the derived fields of {num_vas} VAs!")
+        )
+
+        # the rollup is counted by the derived fields
+        if settings.DASHBOARD_USE_ROLLUP:
+            self.stdout.write(self.style.SUCCESS("Rebuilding dashboard rollup..."))
+            rebuild_dashboard_rollup()
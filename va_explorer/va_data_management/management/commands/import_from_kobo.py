@@ -2,8 +2,11 @@ import os
 
 from django.core.management.base import BaseCommand
 
-from va_explorer.va_data_management.utils.kobo import download_responses
-from va_explorer.va_data_management.utils.loading import load_records_from_dataframe
+from va_explorer.va_data_management.utils.kobo import sync_responses
+from va_explorer.va_data_management.utils.loading import (
+    IngestContext,
+    load_records_from_dataframe,
+)
 
 BATCH_SIZE = 5000
 
@@ -24,6 +27,11 @@ class Command(BaseCommand):
             required=False,
             default=os.environ.get("KOBO_ASSET_ID"),
         )
+        parser.add_argument(
+            "--full_resync",
+            action="store_true",
+            help="Download every submission instead of only those since the last sync",
+        )
 
     def handle(self, *args, **options):
         _ = args  # unused
@@ -37,31 +45,28 @@ class Command(BaseCommand):
             )
             return
 
-        # Make an initial call and loop if necessary
-        forms, next_page = download_responses(token, asset_id, BATCH_SIZE, None)
-        results = load_records_from_dataframe(forms)
-
-        num_created = len(results["created"])
-        num_ignored = len(results["ignored"])
-        num_outdated = len(results["outdated"])
-        num_corrected = len(results["corrected"])
-        num_invalid = len(results["removed"])
-        pages_processed = 1
-
-        while next_page is not None:
-            forms, next_page = download_responses(
-                token, asset_id, BATCH_SIZE, next_page
+        # Only submissions added or edited since the last sync are downloaded,
+        # unless a full resync is requested. Kobo serves them page by page, and
+        # all pages share one ingest context.
+        context = IngestContext(source="kobo")
+        num_created = num_ignored = num_outdated = num_corrected = num_invalid = 0
+        pages = sync_responses(
+            token, asset_id, BATCH_SIZE, full_resync=options["full_resync"]
+        )
+        for pages_processed, forms in enumerate(pages, start=1):
+            results = load_records_from_dataframe(
+                forms, mark_duplicates=False, context=context
             )
-            results = load_records_from_dataframe(forms)
             num_created = num_created + len(results["created"])
             num_ignored = num_ignored + len(results["ignored"])
             num_outdated = num_outdated + len(results["outdated"])
             num_corrected = num_corrected + len(results["corrected"])
             num_invalid = num_invalid + len(results["removed"])
-            pages_processed = pages_processed + 1
-            self.stdout.write(
-                "Processed Additional Page. " f"{pages_processed} processed total.."
-            )
+            if pages_processed > 1:
+                self.stdout.write(
+                    f"Processed Additional Page. {pages_processed} processed total.."
+                )
+        context.mark_duplicates()
 
         self.stdout.write(
             f"Loaded {num_created} verbal autopsies from Kobo "
@@ -1,9 +1,17 @@
 import os
 
+from django.conf import settings
 from django.core.management.base import BaseCommand
 
-from va_explorer.va_data_management.utils.loading import load_records_from_dataframe
-from va_explorer.va_data_management.utils.odk import download_responses
+from va_explorer.va_data_management.utils.loading import (
+    load_records_from_dataframe,
+    load_records_in_chunks,
+)
+from va_explorer.va_data_management.utils.odk import (
+    ODK_INCREMENTAL_SYNC,
+    download_responses,
+    sync_responses,
+)
 
 
 class Command(BaseCommand):
@@ -23,6 +31,16 @@ class Command(BaseCommand):
         parser.add_argument("--project-id", type=str, required=False)
         parser.add_argument("--form-id", type=str, required=False)
         parser.add_argument("--form-name", type=str, required=False)
+        # read and commit submissions this many rows at a time (0 loads all at once)
+        parser.add_argument(
+            "--chunk-size", type=int, default=settings.VA_IMPORT_CHUNK_SIZE
+        )
+        # only download submissions received or edited since the last sync
+        parser.add_argument(
+            "--incremental", action="store_true", default=ODK_INCREMENTAL_SYNC
+        )
+        # with --incremental, ignore the last sync and download every submission
+        parser.add_argument("--full-resync", action="store_true")
 
     def handle(self, *args, **options):
         _ = args  # unused
@@ -54,15 +72,42 @@ class Command(BaseCommand):
             )
             return
 
-        forms = download_responses(
-            email, password, project_name, project_id, form_name, form_id
-        )
-
-        results = load_records_from_dataframe(forms)
+        chunk_size = options["chunk_size"]
+        if options["incremental"]:
+            # new submissions are paged from ODK and loaded one page at a time
+            pages = sync_responses(
+                email,
+                password,
+                project_name,
+                project_id,
+                form_name,
+                form_id,
+                full_resync=options["full_resync"],
+            )
+            counts = load_records_in_chunks(pages)
+        elif chunk_size and chunk_size > 0:
+            form_chunks = download_responses(
+                email,
+                password,
+                project_name,
+                project_id,
+                form_name,
+                form_id,
+                chunk_size=chunk_size,
+            )
+            counts = load_records_in_chunks(form_chunks)
+        else:
+            forms = download_responses(
+                email, password, project_name, project_id, form_name, form_id
+            )
+            results = load_records_from_dataframe(forms)
+            counts = {
+                key: len(results[key]) for key in ["created", "ignored", "outdated"]
+            }
 
-        num_created = len(results["created"])
-        num_ignored = len(results["ignored"])
-        num_outdated = len(results["outdated"])
+        num_created = counts["created"]
+        num_ignored = counts["ignored"]
+        num_outdated = counts["outdated"]
 
         self.stdout.write(
             f"Loaded {num_created} verbal autopsies from ODK "
@@ -229,7 +229,7 @@ def _process_facility_tree(tree, delete_previous=False):
                     }
                     # only update if values changed
                     if old_values != new_values:
-                        current_node.save()
+                        current_node.save(refresh_regions=False)
                         update_ct += 1
                 else:
                     db[path] = parent_node.add_child(**model_data)
@@ -262,7 +262,7 @@ def _process_facility_tree(tree, delete_previous=False):
                 node = db.get(extra)
                 if node.is_active:
                     node.is_active = False
-                    node.save()
+                    node.save(refresh_regions=False)
                     delete_ct += 1
 
     # if non existent, add 'Null' location to database to account for VAs with
@@ -274,6 +274,10 @@ def _process_facility_tree(tree, delete_previous=False):
         )
         location_ct += 1
 
+    # existing locations are saved above without refreshing their regions, so
+    # refresh the regions of the whole tree once, now it's loaded
+    Location.refresh_regions()
+
     print(f"  added {location_ct} new locations to system")
     print(f"  updated {update_ct} locations with new data")
     print(f"  marked {delete_ct} locations as inactive")
@@ -1,9 +1,13 @@
 import argparse
 
 import pandas as pd
+from django.conf import settings
 from django.core.management.base import BaseCommand
 
-from va_explorer.va_data_management.utils.loading import load_records_from_dataframe
+from va_explorer.va_data_management.utils.loading import (
+    load_records_from_dataframe,
+    load_records_in_chunks,
+)
 
 
 class Command(BaseCommand):
@@ -12,16 +16,30 @@ class Command(BaseCommand):
     def add_arguments(self, parser):
         parser.add_argument("csv_file", type=argparse.FileType("r"))
         parser.add_argument("--random_locations", type=str, nargs="?", default=False)
+        # read and commit the CSV this many rows at a time (0 loads it all at once)
+        parser.add_argument(
+            "--chunk_size", type=int, default=settings.VA_IMPORT_CHUNK_SIZE
+        )
 
     def handle(self, *args, **options):
-        csv_data = pd.read_csv(options["csv_file"], low_memory=False)
         random_locations = options.get("random_locations", False)
-
-        results = load_records_from_dataframe(csv_data, random_locations)
-
-        num_created = len(results["created"])
-        num_ignored = len(results["ignored"])
-        num_outdated = len(results["outdated"])
+        chunk_size = options["chunk_size"]
+
+        if chunk_size and chunk_size > 0:
+            csv_chunks = pd.read_csv(
+                options["csv_file"], low_memory=False, chunksize=chunk_size
+            )
+            counts = load_records_in_chunks(csv_chunks, random_locations)
+        else:
+            csv_data = pd.read_csv(options["csv_file"], low_memory=False)
+            results = load_records_from_dataframe(csv_data, random_locations)
+            counts = {
+                key: len(results[key]) for key in ["created", "ignored", "outdated"]
+            }
+
+        num_created = counts["created"]
+        num_ignored = counts["ignored"]
+        num_outdated = counts["outdated"]
 
         self.stdout.write(
             f"Loaded {num_created} verbal autopsies from CSV "
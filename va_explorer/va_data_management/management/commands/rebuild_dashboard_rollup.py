@@ -0,0 +1,23 @@
+from django.conf import settings
+from django.core.management.base import BaseCommand
+
+from va_explorer.va_analytics.utils.rollup import rebuild_dashboard_rollup
+
+
+class Command(BaseCommand):
+    help = "Rebuilds the dashboard's rollup of VA counts from the VAs"
+
+    def handle(self, *args, **options):
+        if not settings.DASHBOARD_USE_ROLLUP:
+            self.stdout.write(
+                self.style.WARNING(
+                    "DASHBOARD_USE_ROLLUP is off: the dashboard won't use the rollup "
+                    "and it won't be kept up to date until it's turned on."
+                )
+            )
+
+        self.stdout.write(self.style.SUCCESS("Rebuilding dashboard rollup..."))
+        num_rows = rebuild_dashboard_rollup()
+        self.stdout.write(
+            self.style.SUCCESS(f"Dashboard rollup rebuilt with {num_rows} rows!")
+        )
@@ -3,8 +3,12 @@ from math import ceil
 from django.conf import settings
 from django.core.management.base import BaseCommand
 
+from va_explorer.va_analytics.utils.rollup import rebuild_dashboard_rollup
 from va_explorer.va_data_management.models import Location, VerbalAutopsy
-from va_explorer.va_data_management.utils.location_assignment import assign_va_location
+from va_explorer.va_data_management.utils.location_assignment import (
+    LocationIndex,
+    assign_locations,
+)
 from va_explorer.va_data_management.utils.validate import validate_vas_for_dashboard
 
 
@@ -12,6 +16,9 @@ class Command(BaseCommand):
     help = "Reassigns locations based on most recent facility list"
 
     def handle(self, *args, **options):
+        # bring the province and district stored on each location up to date first
+        Location.refresh_regions()
+
         count = VerbalAutopsy.objects.count()
         print(f"Refreshing locations for all {count} VAs in the database.")
 
@@ -20,6 +27,9 @@ class Command(BaseCommand):
         batches = ceil(count / batch_size)
         changed_count = 0
 
+        # index all facilities once so each batch is matched without extra queries
+        location_index = LocationIndex()
+
         for i in range(batches):
             if settings.DEBUG:
                 print(f"  refresh_locations batch {i} out of {batches}")
@@ -27,31 +37,22 @@ class Command(BaseCommand):
             batch_start = i * batch_size
             batch_end = (i + 1) * batch_size
 
-            # build location mapper to map csv locations to known db locations
-            # using list comprehension to remove duplicated from list
-            location_map = {}
-            verbal_autopsies = list(VerbalAutopsy.objects.all()[batch_start:batch_end])
-            h = [va.hospital for va in verbal_autopsies]
-            hospitals = []
-            [hospitals.append(x) for x in h if x not in hospitals]
-
-            location_map = {
-                key_name_pair[0]: key_name_pair[1]
-                for key_name_pair in Location.objects.filter(key__in=hospitals)
-                .only("name", "key")
-                .values_list("key", "name")
-            }
-
-            for va in verbal_autopsies:
-                old_location = va.location
-                new_va = assign_va_location(va, location_map)
-                new_location = new_va.location
-
-                if old_location != new_location:
+            verbal_autopsies = list(
+                VerbalAutopsy.objects.order_by("id")[batch_start:batch_end]
+            )
+            old_locations = [va.location_id for va in verbal_autopsies]
+            assign_locations(verbal_autopsies, location_index)
+
+            for va, old_location in zip(verbal_autopsies, old_locations):
+                if old_location != va.location_id:
                     changed_count += 1
-                    va.location = new_va.location
                     va.save()
 
-            validate_vas_for_dashboard(verbal_autopsies)
+            validate_vas_for_dashboard(verbal_autopsies, location_index)
 
         print(f"Done: changed locations for {changed_count} VA(s).")
+
+        # the rollup is counted by location
+        if changed_count and settings.DASHBOARD_USE_ROLLUP:
+            print("Rebuilding dashboard rollup...")
+            rebuild_dashboard_rollup()
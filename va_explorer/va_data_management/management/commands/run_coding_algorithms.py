@@ -1,11 +1,15 @@
+import json
 import time
 
 import pandas as pd
+from django.conf import settings
 from django.core.management.base import BaseCommand
 
+from va_explorer.va_analytics.utils.rollup import rebuild_dashboard_rollup
 from va_explorer.va_data_management.models import CauseOfDeath
 from va_explorer.va_data_management.utils.coding import (
     ALGORITHM_SETTINGS,
+    CODING_REUSE_RESULTS,
     run_coding_algorithms,
     validate_algorithm_settings,
 )
@@ -21,16 +25,35 @@ class Command(BaseCommand):
         parser.add_argument(
             "--cod_fname", type=str, nargs="?", default="old_cod_mapping.csv"
         )
+        # reuse earlier results for VAs whose algorithm input hasn't changed
+        parser.add_argument(
+            "--reuse_results",
+            action="store_true",
+            default=CODING_REUSE_RESULTS,
+        )
+        # JSON file with a list of algorithm settings (each overriding the default
+        # settings) to code every VA with, e.g. for a sensitivity analysis. VAs
+        # are transformed once and coded with each of them
+        parser.add_argument("--settings_variants", type=str, nargs="?", default=None)
 
     def handle(self, **options):
         ti = time.time()
+        settings_variants = [ALGORITHM_SETTINGS]
+        if options["settings_variants"]:
+            with open(options["settings_variants"]) as f:
+                settings_variants = [
+                    {**ALGORITHM_SETTINGS, **variant} for variant in json.load(f)
+                ]
         # validate algorithm settings first. Only proceed if settings are valid.
-        if validate_algorithm_settings():
+        if all(validate_algorithm_settings(v) for v in settings_variants):
             if options["overwrite"]:
                 self.clear_and_save_old_cods(options["cod_fname"])
 
             print("coding all eligible VAs... ")
-            stats = run_coding_algorithms()
+            stats = run_coding_algorithms(
+                reuse_results=options["reuse_results"],
+                settings_variants=settings_variants,
+            )
             num_coded = len(stats["causes"])
             num_total = len(stats["verbal_autopsies"])
             num_issues = len(stats["issues"])
@@ -38,9 +61,13 @@ class Command(BaseCommand):
             self.stdout.write(
                 f"Coded {num_coded} verbal autopsies (out of {num_total}) [{num_issues} issues]"
             )
+            if options["reuse_results"]:
+                self.stdout.write(
+                    f"Reused earlier results for {len(stats['reused'])} of them"
+                )
         else:
             print(
-                f"At least one invalid algorithm setting in: \n {ALGORITHM_SETTINGS}. \
+                f"At least one invalid algorithm setting in: \n {settings_variants}. \
                   See va_data_management.utils.coding.py for valid settings.\n Exiting."
             )
             exit()
@@ -58,3 +85,6 @@ class Command(BaseCommand):
 
         # clear CODs to re-run coding algorithm
         CauseOfDeath.objects.all().delete()
+        # every VA is uncoded now, which is quicker to recount in one go
+        if settings.DASHBOARD_USE_ROLLUP:
+            rebuild_dashboard_rollup()
@@ -8,7 +8,6 @@ import numpy as np
 import pandas as pd
 import requests
 from django.core.management.base import BaseCommand
-from django.forms.models import model_to_dict
 
 from va_explorer.dhis_manager.dhis import DHIS
 from va_explorer.va_data_management.models import (
@@ -17,6 +16,10 @@ from va_explorer.va_data_management.models import (
     DhisStatus,
     VerbalAutopsy,
 )
+from va_explorer.va_data_management.utils.coding import (
+    pycross_input,
+    pycross_rows,
+)
 
 DHIS_USER = os.environ.get("DHIS_USER")
 DHIS_PASS = os.environ.get("DHIS_PASS")
@@ -67,33 +70,35 @@ class Command(BaseCommand):
 
         # to subset few rows,add at the end [:10] for 10 rows etc..
         # exclude vas that have no dhis2 status; not pushed
-        va_data = VerbalAutopsy.objects.filter(causes__isnull=False).exclude(
-            id__in=dhis_data
+        va_data = (
+            # VAs with a cause under the default algorithm settings
+            VerbalAutopsy.objects.filter(causes__variant="")
+            .exclude(id__in=dhis_data)
+            .distinct()
+            .order_by("id")
         )  # [:30]
 
         # create a list of available VA IDs to help during filtering queries
-        va_not_in_dhis = []
-        for va in va_data:
-            va_not_in_dhis.append(va.id)
-        va_not_in_dhis = [str(i) for i in va_not_in_dhis]
+        va_ids = list(va_data.values_list("id", flat=True))
+        va_not_in_dhis = [str(i) for i in va_ids]
 
         if len(va_not_in_dhis) > 0:
             # load VAs with causes
             cod = CauseOfDeath.objects.filter(
-                verbalautopsy_id__in=va_not_in_dhis
+                verbalautopsy_id__in=va_not_in_dhis, variant=""
             ).values()
             cod = pd.DataFrame.from_records(cod)
             cod = cod[{"verbalautopsy_id", "cause"}]
 
-            # Get into CSV format, also prefixing keys with - as expected by
-            # pyCrossVA (e.g. Id10424 becomes -Id10424)
-            va_data = [model_to_dict(va) for va in va_data]
-            va_df = pd.DataFrame.from_records(va_data)
+            # Only the columns needed for the record storage file are loaded
+            va_df = pd.DataFrame.from_records(
+                va_data.values("id", "Id10019", "Id10021", "Id10023", "ageInYears2")
+            )
 
             cod_va = cod.join(va_df, how="outer")
 
-            va_data = [{f"-{k}": v for k, v in d.items()} for d in va_data]
-            va_data_csv = pd.DataFrame.from_records(va_data).to_csv()
+            # Get into CSV format, loading just the columns pyCrossVA uses
+            va_data_csv = pycross_input(pycross_rows(va_ids))
 
             # Transform to algorithm format using the pyCrossVA web service
             # TODO: Check that this service is running and provide a warning if
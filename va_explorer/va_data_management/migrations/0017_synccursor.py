@@ -0,0 +1,27 @@
+# Generated by Django 4.1.2 on 2026-10-17 04:34
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('va_data_management', '0016_rename_submission_date_historicalhousehold_submissiondate_and_more'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='SyncCursor',
+            fields=[
+                ('id', models.AutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('source', models.CharField(max_length=50)),
+                ('resource_id', models.CharField(max_length=255)),
+                ('last_id', models.BigIntegerField(blank=True, null=True)),
+                ('last_submission_time', models.TextField(blank=True)),
+                ('updated', models.DateTimeField(auto_now=True)),
+            ],
+            options={
+                'unique_together': {('source', 'resource_id')},
+            },
+        ),
+    ]
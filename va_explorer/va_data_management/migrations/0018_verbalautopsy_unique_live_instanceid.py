@@ -0,0 +1,70 @@
+# Generated by Django 4.1.2 on 2026-10-17 04:41
+
+from django.db import migrations, models
+from django.db.models import OuterRef, Subquery
+from django.utils import timezone
+
+
+# Soft delete all but the newest live VA of each instanceid so the unique
+# constraint can be added, recording the deletion in the VAs' history as
+# soft_delete_with_history does (the historical model doesn't have its helpers)
+def soft_delete_duplicate_instanceids(apps, schema_editor):
+    VerbalAutopsy = apps.get_model("va_data_management", "VerbalAutopsy")
+    HistoricalVerbalAutopsy = apps.get_model(
+        "va_data_management", "HistoricalVerbalAutopsy"
+    )
+    live = VerbalAutopsy.objects.filter(deleted_at__isnull=True).exclude(
+        instanceid=""
+    )
+    newest = live.filter(instanceid=OuterRef("instanceid")).order_by(
+        "-created", "-id"
+    )
+    duplicate_ids = list(
+        live.exclude(id=Subquery(newest.values("id")[:1])).values_list(
+            "id", flat=True
+        )
+    )
+    if not duplicate_ids:
+        return
+
+    deleted_at = timezone.now()
+    tracked_fields = [
+        field.attname
+        for field in HistoricalVerbalAutopsy._meta.fields
+        if not field.name.startswith("history_")
+    ]
+    for start in range(0, len(duplicate_ids), 1000):
+        batch = duplicate_ids[start : start + 1000]
+        VerbalAutopsy.objects.filter(id__in=batch).update(deleted_at=deleted_at)
+        HistoricalVerbalAutopsy.objects.bulk_create(
+            [
+                HistoricalVerbalAutopsy(
+                    **{field: getattr(va, field) for field in tracked_fields},
+                    history_date=deleted_at,
+                    history_type="~",
+                    history_change_reason="Duplicate instanceid",
+                )
+                for va in VerbalAutopsy.objects.filter(id__in=batch)
+            ]
+        )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('va_data_management', '0017_synccursor'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='verbalautopsy',
+            index=models.Index(fields=['instancename'], name='va_data_man_instanc_4efe77_idx'),
+        ),
+        migrations.RunPython(
+            soft_delete_duplicate_instanceids, migrations.RunPython.noop
+        ),
+        migrations.AddConstraint(
+            model_name='verbalautopsy',
+            constraint=models.UniqueConstraint(condition=models.Q(('deleted_at__isnull', True), models.Q(('instanceid', ''), _negated=True)), fields=('instanceid',), name='unique_live_instanceid'),
+        ),
+    ]
@@ -0,0 +1,18 @@
+# Generated by Django 4.1.2 on 2026-10-17 04:48
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('va_data_management', '0019_importbatch'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='importbatch',
+            name='stats',
+            field=models.JSONField(blank=True, default=dict),
+        ),
+    ]
@@ -0,0 +1,23 @@
+# Generated by Django 4.1.2 on 2026-10-17 04:51
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('va_data_management', '0020_importbatch_stats'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='causeofdeath',
+            name='input_hash',
+            field=models.TextField(blank=True, db_index=True),
+        ),
+        migrations.AddField(
+            model_name='historicalcauseofdeath',
+            name='input_hash',
+            field=models.TextField(blank=True, db_index=True),
+        ),
+    ]
@@ -0,0 +1,84 @@
+# Generated by Django 4.1.2 on 2026-10-17 05:09
+
+from django.db import migrations, models
+
+from va_explorer.va_data_management.models.verbal_autopsy import derive_age_category
+from va_explorer.va_data_management.utils.date_parsing import (
+    get_interview_date,
+    to_date,
+)
+
+DERIVED_FIELDS = ["death_date", "interview_date", "age_category", "sex"]
+SOURCE_FIELDS = ["Id10023", "Id10012", "Id10011", "Id10019"] + [
+    f"{flag}{suffix}"
+    for flag in ["isNeonatal", "isChild", "isAdult"]
+    for suffix in ["", "1", "2"]
+]
+
+
+# Set the derived fields of existing VAs (deleted ones too) from their answers, as
+# VerbalAutopsy.set_derived_fields and the backfill_va_derived_fields command do
+# (the historical model doesn't have its methods), so VAs aren't left out of
+# queries on them until the command is run
+def set_derived_fields(apps, schema_editor, batch_size=5000):
+    VerbalAutopsy = apps.get_model("va_data_management", "VerbalAutopsy")
+    vas = VerbalAutopsy._base_manager.only("id", *SOURCE_FIELDS).order_by("id")
+    last_id = 0
+    while True:
+        batch = list(vas.filter(id__gt=last_id)[:batch_size])
+        if not batch:
+            break
+        for va in batch:
+            va.death_date = to_date(va.Id10023)
+            va.interview_date = to_date(get_interview_date(va))
+            va.age_category = derive_age_category(va)
+            va.sex = str(va.Id10019 or "").strip().lower()
+        VerbalAutopsy._base_manager.bulk_update(batch, DERIVED_FIELDS)
+        last_id = batch[-1].id
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('va_data_management', '0021_causeofdeath_input_hash'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='verbalautopsy',
+            name='age_category',
+            field=models.TextField(blank=True, editable=False),
+        ),
+        migrations.AddField(
+            model_name='verbalautopsy',
+            name='death_date',
+            field=models.DateField(blank=True, editable=False, null=True),
+        ),
+        migrations.AddField(
+            model_name='verbalautopsy',
+            name='interview_date',
+            field=models.DateField(blank=True, editable=False, null=True),
+        ),
+        migrations.AddField(
+            model_name='verbalautopsy',
+            name='sex',
+            field=models.TextField(blank=True, editable=False),
+        ),
+        migrations.RunPython(set_derived_fields, migrations.RunPython.noop),
+        migrations.AddIndex(
+            model_name='verbalautopsy',
+            index=models.Index(fields=['death_date'], name='va_data_man_death_d_74f9d5_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='verbalautopsy',
+            index=models.Index(fields=['interview_date'], name='va_data_man_intervi_347cb8_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='verbalautopsy',
+            index=models.Index(fields=['age_category'], name='va_data_man_age_cat_4c769f_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='verbalautopsy',
+            index=models.Index(fields=['sex'], name='va_data_man_sex_0c6de4_idx'),
+        ),
+    ]
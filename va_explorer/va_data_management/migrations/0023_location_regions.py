@@ -0,0 +1,53 @@
+# Generated by Django 4.1.2 on 2026-10-17 05:12
+
+import django.db.models.deletion
+from django.db import migrations, models
+from django.db.models import OuterRef, Subquery
+from django.db.models.functions import Length, Substr
+
+
+# Set the province and district of existing locations, as Location.refresh_regions
+# does (the historical model doesn't have its methods)
+def set_location_regions(apps, schema_editor):
+    Location = apps.get_model("va_data_management", "Location")
+    for region in ["province", "district"]:
+        ancestor = Location.objects.filter(
+            location_type=region, path=Substr(OuterRef("path"), 1, Length("path"))
+        ).order_by("-depth")
+        Location.objects.update(
+            **{
+                region: Subquery(ancestor.values("id")[:1]),
+                f"{region}_name": Subquery(ancestor.values("name")[:1]),
+            }
+        )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('va_data_management', '0022_verbalautopsy_derived_fields'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='location',
+            name='district',
+            field=models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='+', to='va_data_management.location'),
+        ),
+        migrations.AddField(
+            model_name='location',
+            name='district_name',
+            field=models.TextField(blank=True, db_index=True, null=True),
+        ),
+        migrations.AddField(
+            model_name='location',
+            name='province',
+            field=models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='+', to='va_data_management.location'),
+        ),
+        migrations.AddField(
+            model_name='location',
+            name='province_name',
+            field=models.TextField(blank=True, db_index=True, null=True),
+        ),
+        migrations.RunPython(set_location_regions, migrations.RunPython.noop),
+    ]
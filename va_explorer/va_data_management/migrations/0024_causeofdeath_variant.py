@@ -0,0 +1,23 @@
+# Generated by Django 4.1.2 on 2026-10-17 05:21
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('va_data_management', '0023_location_regions'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='causeofdeath',
+            name='variant',
+            field=models.TextField(blank=True, db_index=True, default=''),
+        ),
+        migrations.AddField(
+            model_name='historicalcauseofdeath',
+            name='variant',
+            field=models.TextField(blank=True, db_index=True, default=''),
+        ),
+    ]
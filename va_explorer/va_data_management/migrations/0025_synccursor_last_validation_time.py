@@ -0,0 +1,18 @@
+# Generated by Django 4.1.2 on 2026-10-17 05:26
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('va_data_management', '0024_causeofdeath_variant'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='synccursor',
+            name='last_validation_time',
+            field=models.BigIntegerField(blank=True, null=True),
+        ),
+    ]
@@ -1,8 +1,10 @@
 from .death import Death
 from .household_census import SRSClusterLocation, Household, HouseholdMember
+from .import_batch import ImportBatch
 from .odk_reference import ODKFormChoice
 from .pregnancy import Pregnancy
 from .pregnancy_outcome import PregnancyOutcome
+from .sync_cursor import SyncCursor
 from .verbal_autopsy import (
     CauseCodingIssue,
     CauseOfDeath,
@@ -10,6 +12,8 @@ from .verbal_autopsy import (
     DhisStatus,
     Location,
     VerbalAutopsy,
+    default_cause,
+    prefetch_default_cause,
     questions_to_autodetect_duplicates,
 )
 
@@ -23,8 +27,12 @@ __all__ = [ "SRSClusterLocation",
     "Location",
     "CauseCodingIssue",
     "questions_to_autodetect_duplicates",
+    "default_cause",
+    "prefetch_default_cause",
     "CauseOfDeath",
     "CODCodesDHIS",
     "DhisStatus",
     "ODKFormChoice",
+    "SyncCursor",
+    "ImportBatch",
 ]
@@ -0,0 +1,14 @@
+from django.db import models
+
+
+class ImportBatch(models.Model):
+    # One run of a VA import (e.g. a Kobo sync or csv load). VAs imported with
+    # deferred history point at their batch instead of getting a full historical
+    # row each; the batch records where and when they came from, and how long
+    # each stage of the import took (see IngestStats)
+    source = models.CharField(max_length=50, blank=True)
+    created = models.DateTimeField(auto_now_add=True)
+    stats = models.JSONField(default=dict, blank=True)
+
+    def __str__(self):
+        return f"{self.source or 'import'} {self.created:%Y-%m-%d %H:%M}"
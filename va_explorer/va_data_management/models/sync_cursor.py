@@ -0,0 +1,34 @@
+from django.db import models
+
+
+class SyncCursor(models.Model):
+    # Watermark of the newest submission imported from a remote data source (e.g. a Kobo
+    # asset or ODK form) so scheduled imports only need to request newer/edited data
+    source = models.CharField(max_length=50)
+    resource_id = models.CharField(max_length=255)
+    last_id = models.BigIntegerField(null=True, blank=True)
+    last_submission_time = models.TextField(blank=True)
+    # newest validation status change (Kobo timestamps, seconds since the epoch), so
+    # submissions approved or rejected after they were imported are requested again
+    last_validation_time = models.BigIntegerField(null=True, blank=True)
+    updated = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        unique_together = ("source", "resource_id")
+
+    def __str__(self):
+        return f"{self.source}:{self.resource_id} {self.last_id} {self.last_submission_time}"
+
+    # advance the watermark past the given ids/submission times (never moves it backwards)
+    def advance(
+        self, last_id=None, last_submission_time=None, last_validation_time=None
+    ):
+        if last_id is not None and (self.last_id is None or last_id > self.last_id):
+            self.last_id = last_id
+        if last_submission_time and last_submission_time > self.last_submission_time:
+            self.last_submission_time = last_submission_time
+        if last_validation_time is not None and (
+            self.last_validation_time is None
+            or last_validation_time > self.last_validation_time
+        ):
+            self.last_validation_time = last_validation_time
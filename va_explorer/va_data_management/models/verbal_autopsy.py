@@ -1,11 +1,20 @@
 # flake8: noqa: N815 - We want the model fields to exactly reflect the VA instrument's fields
 import contextlib
 import hashlib
+from functools import lru_cache
 
 from django.conf import settings
 from django.core.exceptions import FieldDoesNotExist
-from django.db import models
-from django.db.models import Count, JSONField
+from django.db import connection, models
+from django.db.models import (
+    FilteredRelation,
+    JSONField,
+    OuterRef,
+    Prefetch,
+    Q,
+    Subquery,
+)
+from django.db.models.functions import Length, Substr
 from simple_history.models import HistoricalRecords
 from treebeard.mp_tree import MP_Node
 
@@ -21,7 +30,15 @@ from ..constants import (
     _select_512,
     _select_vaccines,
 )
+from ..utils.date_parsing import get_interview_date, to_date
 from ..utils.multi_select import MultiSelectField
+from .import_batch import ImportBatch
+
+# Location types of the regions stored on locations
+REGIONS = ["province", "district"]
+REGION_FIELDS = [field for region in REGIONS for field in [region, f"{region}_name"]]
+# Location fields the regions of a location and those below it are looked up by
+REGION_SOURCE_FIELDS = ["path", "depth", "location_type", "name"]
 
 
 class Location(MP_Node):
@@ -33,6 +50,17 @@ class Location(MP_Node):
     is_active = models.BooleanField(default=False)
     key = models.TextField(blank=True)
     path_string = models.TextField(unique=True, null=True)
+    # The province and district the location is in (or is), stored so VAs can be
+    # filtered and grouped by region with plain joins; kept in step by save() and
+    # refresh_regions
+    province = models.ForeignKey(
+        "self", related_name="+", on_delete=models.SET_NULL, null=True, blank=True
+    )
+    province_name = models.TextField(null=True, blank=True, db_index=True)
+    district = models.ForeignKey(
+        "self", related_name="+", on_delete=models.SET_NULL, null=True, blank=True
+    )
+    district_name = models.TextField(null=True, blank=True, db_index=True)
     node_order_by = ["name"]
 
     # A user can have their access scoped by one or more locations
@@ -45,6 +73,50 @@ class Location(MP_Node):
     def __str__(self):
         return self.name
 
+    @classmethod
+    def from_db(cls, db, field_names, values):
+        location = super().from_db(db, field_names, values)
+        location._saved_region_sources = location._region_sources()
+        return location
+
+    def _region_sources(self):
+        return {field: self.__dict__.get(field) for field in REGION_SOURCE_FIELDS}
+
+    # Pass refresh_regions=False when saving many locations, then refresh_regions()
+    # them all at once
+    def save(self, *args, refresh_regions=True, **kwargs):
+        adding = self._state.adding
+        super().save(*args, **kwargs)
+        # the path is set by the time a location is saved, so its regions can be
+        # looked up. They only change with its place in the tree, its type or (for
+        # the locations below it) its name; a new location has nothing below it
+        sources = self._region_sources()
+        if refresh_regions and sources != getattr(self, "_saved_region_sources", None):
+            if adding:
+                locations = Location.objects.filter(pk=self.pk)
+            else:
+                locations = Location.objects.filter(path__startswith=self.path)
+            Location.refresh_regions(locations)
+            self.refresh_from_db(fields=REGION_FIELDS)
+        self._saved_region_sources = sources
+
+    # Set the province and district of the given locations (all by default) to
+    # the ancestor (or the location itself) of that location type
+    @classmethod
+    def refresh_regions(cls, locations=None):
+        locations = cls.objects.all() if locations is None else locations
+        for region in REGIONS:
+            ancestor = cls.objects.filter(
+                location_type=region,
+                path=Substr(OuterRef("path"), 1, Length("path")),
+            ).order_by("-depth")
+            locations.update(
+                **{
+                    region: Subquery(ancestor.values("id")[:1]),
+                    f"{region}_name": Subquery(ancestor.values("name")[:1]),
+                }
+            )
+
     def get_descendant_ids(self):
         return [descendant.id for descendant in self.get_descendants()]
 
@@ -52,12 +124,36 @@ class Location(MP_Node):
         return self.get_parent().id
 
 
+# Fields of a VerbalAutopsy derived from its answers (see set_derived_fields)
+DERIVED_FIELDS = ["death_date", "interview_date", "age_category", "sex"]
+# is<X> flags of the VA specification and the age group each one marks
+AGE_CATEGORY_FLAGS = [
+    ("isNeonatal", "neonate"),
+    ("isChild", "child"),
+    ("isAdult", "adult"),
+]
+
+
 class VerbalAutopsy(SoftDeletionModel):
     class Meta:
         permissions = (("bulk_delete", "Can bulk delete"),)
         indexes = [
             models.Index(fields=["unique_va_identifier"]),
             models.Index(fields=["Id10023"], name="death_date_filter_idx"),
+            models.Index(fields=["instancename"]),
+            models.Index(fields=["death_date"]),
+            models.Index(fields=["interview_date"]),
+            models.Index(fields=["age_category"]),
+            models.Index(fields=["sex"]),
+        ]
+        constraints = [
+            # a submission can only be imported once; deleted VAs and those without
+            # an instanceid don't count
+            models.UniqueConstraint(
+                fields=["instanceid"],
+                condition=Q(deleted_at__isnull=True) & ~Q(instanceid=""),
+                name="unique_live_instanceid",
+            ),
         ]
 
     # Each VerbalAutopsy is associated with a facility, which is the leaf node location
@@ -1599,7 +1695,14 @@ class VerbalAutopsy(SoftDeletionModel):
     geopoint = models.TextField("geopoint", blank=True)
     comment = models.TextField("Comment", blank=True)
     # Track the history of changes to each verbal autopsy
-    history = HistoricalRecords(excluded_fields=["unique_va_identifier", "duplicate"])
+    history = HistoricalRecords(
+        excluded_fields=[
+            "unique_va_identifier",
+            "duplicate",
+            "history_deferred",
+            *DERIVED_FIELDS,
+        ]
+    )
     # Automatically set timestamps
     created = models.DateTimeField(auto_now_add=True)
     updated = models.DateTimeField(auto_now=True)
@@ -1611,6 +1714,25 @@ class VerbalAutopsy(SoftDeletionModel):
     duplicate = models.BooleanField(
         "Marks the record as duplicate", blank=True, default=False
     )
+    # VAs imported with deferred history have no historical row until they're
+    # first changed; until then the import batch stands in for it
+    import_batch = models.ForeignKey(
+        ImportBatch,
+        related_name="verbalautopsies",
+        on_delete=models.SET_NULL,
+        null=True,
+        blank=True,
+    )
+    history_deferred = models.BooleanField(default=False, editable=False)
+    # Typed copies of answers the dashboards filter and group on, kept in step with
+    # the answers by set_derived_fields so queries hit indexes instead of parsing
+    # text: date of death (Id10023), interview date (Id10012, or the VA start date
+    # Id10011 if missing), age group (from the is<X> flags; the age_group field is
+    # the questionnaire's own answer) and sex (Id10019)
+    death_date = models.DateField(null=True, blank=True, editable=False)
+    interview_date = models.DateField(null=True, blank=True, editable=False)
+    age_category = models.TextField(blank=True, editable=False)
+    sex = models.TextField(blank=True, editable=False)
 
     # function to tell if VA had any coding errors
     def any_errors(self):
@@ -1625,6 +1747,10 @@ class VerbalAutopsy(SoftDeletionModel):
     #       return
 
     def set_null_location(self, null_name="Unknown"):
+        self.location = VerbalAutopsy.get_null_location(null_name)
+
+    @staticmethod
+    def get_null_location(null_name="Unknown"):
         # to handle passing null_name=None
         if not null_name:
             null_name = "Unknown"
@@ -1640,7 +1766,7 @@ class VerbalAutopsy(SoftDeletionModel):
                 )
             # find new location we just created
             null_location = Location.objects.get(name=null_name)
-        self.location = null_location
+        return null_location
 
     @staticmethod
     def auto_detect_duplicates():
@@ -1664,24 +1790,32 @@ class VerbalAutopsy(SoftDeletionModel):
         self.unique_va_identifier = md5.hexdigest()
 
     @classmethod
-    def mark_duplicates(cls):
-        duplicate_vas = (
-            cls.objects.values("unique_va_identifier")
-            .annotate(unique_va_identifier_count=Count("unique_va_identifier"))
-            .filter(unique_va_identifier_count__gt=1)
-        )
-        if duplicate_vas.exists():
-            for identifiers_hash in duplicate_vas:
-                vas = VerbalAutopsy.objects.filter(
-                    unique_va_identifier=identifiers_hash["unique_va_identifier"]
-                ).order_by("created")
-                # Skip the first record: this is the oldest record one and the one we will not mark as duplicate
-                duplicate_vas = []
-                for va in vas[1:]:
-                    va.duplicate = True
-                    duplicate_vas.append(va)
-
-                VerbalAutopsy.objects.bulk_update(duplicate_vas, ["duplicate"])
+    def mark_duplicates(cls, identifiers=None):
+        # Marks every non-deleted VA that isn't the oldest with its unique_va_identifier as
+        # duplicate, in a single UPDATE. Pass identifiers (e.g. the hashes of VAs just imported)
+        # to only look at the VAs sharing those hashes instead of the whole table.
+        if identifiers is not None:
+            identifiers = list(identifiers)
+            if not identifiers:
+                return
+        table = cls._meta.db_table
+        identifier_filter = "AND unique_va_identifier = ANY(%s)" if identifiers else ""
+        with connection.cursor() as cursor:
+            cursor.execute(
+                f"""
+                UPDATE {table} AS va SET duplicate = TRUE
+                FROM (
+                    SELECT id, ROW_NUMBER() OVER (
+                        PARTITION BY unique_va_identifier ORDER BY created, id
+                    ) AS position
+                    FROM {table}
+                    WHERE deleted_at IS NULL {identifier_filter}
+                ) AS ranked
+                -- the first record is the oldest one and the one we will not mark as duplicate
+                WHERE va.id = ranked.id AND ranked.position > 1 AND NOT va.duplicate
+                """,
+                [identifiers] if identifiers else [],
+            )
 
     def update_duplicates_with_changed_unique_identifier(self, saved_va):
         # Given a set of duplicate VAs, we designate the oldest one as the non-duplicate record.
@@ -1722,7 +1856,10 @@ class VerbalAutopsy(SoftDeletionModel):
     def handle_update_duplicates(self):
         # If the Verbal Autopsy already exists and we are updating it
         if self.pk:
-            saved_va = VerbalAutopsy.objects.get(pk=self.pk)
+            # only the fields needed to tell whether this VA's identity changed
+            saved_va = VerbalAutopsy.objects.only(
+                "unique_va_identifier", *questions_to_autodetect_duplicates()
+            ).get(pk=self.pk)
 
             if self.any_identifier_changed(saved_va):
                 # Generate a new unique_identifier_hash since one of the constituent fields has changed
@@ -1746,7 +1883,41 @@ class VerbalAutopsy(SoftDeletionModel):
             else:
                 self.duplicate = False
 
+    # Write the initial ("+") historical row of VAs imported with deferred history,
+    # as they were imported. Must happen before such a VA is first changed so its
+    # history (and Reset/RevertLatest) starts from the imported record
+    @classmethod
+    def materialize_history(cls, ids):
+        vas = list(
+            cls.all_objects.filter(pk__in=ids, history_deferred=True).select_related(
+                "import_batch"
+            )
+        )
+        if vas:
+            for va in vas:
+                va._history_date = (
+                    va.import_batch.created if va.import_batch else va.created
+                )
+            cls.history.bulk_history_create(vas)
+            cls.all_objects.filter(pk__in=[va.pk for va in vas]).update(
+                history_deferred=False
+            )
+        return vas
+
+    # Set the derived fields from the answers they're copies of
+    def set_derived_fields(self):
+        self.death_date = to_date(self.Id10023)
+        self.interview_date = to_date(get_interview_date(self))
+        self.age_category = derive_age_category(self)
+        self.sex = str(self.Id10019 or "").strip().lower()
+
     def save(self, *args, **kwargs):
+        self.set_derived_fields()
+
+        if self.pk and self.history_deferred:
+            VerbalAutopsy.materialize_history([self.pk])
+            self.history_deferred = False
+
         if VerbalAutopsy.auto_detect_duplicates():
             self.handle_update_duplicates()
 
@@ -1757,16 +1928,34 @@ class VerbalAutopsy(SoftDeletionModel):
         return f'{self.deviceid} - {self.Id10023_a} - {self.hospital} - {self.area}'
 
 
+# Age group of a VA from the is<X>, is<X>1 and is<X>2 flags of the VA
+# specification, checked from youngest to oldest
+def derive_age_category(va):
+    for flag, age_category in AGE_CATEGORY_FLAGS:
+        for suffix in ["", "1", "2"]:
+            if getattr(va, f"{flag}{suffix}") in ["1", "1.0"]:
+                return age_category
+    return "Unknown"
+
+
 # Parses the comma-separated list string in settings.QUESTIONS_TO_AUTODETECT_DUPLICATES into a Python list
 # Validates that the question IDs passed into settings.QUESTIONS_TO_AUTODETECT_DUPLICATES match a field in the VA model
 # If a question ID that is not a field on the VA model is encountered, skip it
 def questions_to_autodetect_duplicates():
-    if not settings.QUESTIONS_TO_AUTODETECT_DUPLICATES:
-        return []
+    # parsed once per distinct setting value since this is called for every VA saved or loaded
+    return list(
+        _parse_questions_to_autodetect_duplicates(
+            settings.QUESTIONS_TO_AUTODETECT_DUPLICATES
+        )
+    )
+
 
-    questions = [
-        q.strip() for q in settings.QUESTIONS_TO_AUTODETECT_DUPLICATES.split(",")
-    ]
+@lru_cache(maxsize=8)
+def _parse_questions_to_autodetect_duplicates(questions_setting):
+    if not questions_setting:
+        return ()
+
+    questions = [q.strip() for q in questions_setting.split(",")]
     validated_questions = []
     valid_field = None
 
@@ -1776,7 +1965,7 @@ def questions_to_autodetect_duplicates():
         if valid_field:
             validated_questions.append(q)
 
-    return validated_questions
+    return tuple(validated_questions)
 
 
 class CODCodesDHIS(models.Model):
@@ -1798,6 +1987,13 @@ class DhisStatusManager(models.Manager):
         return super().get_queryset().filter(verbalautopsy__deleted_at__isnull=True)
 
 
+# A VA's cause under the default algorithm settings, for VA querysets to join
+# instead of all of its causes, e.g. vas.annotate(cod=default_cause()) and then
+# filter or group on cod__cause. VAs without one are kept, with a null cod
+def default_cause():
+    return FilteredRelation("causes", condition=Q(causes__variant=""))
+
+
 class CauseOfDeathManager(models.Manager):
     def get_queryset(self):
         return super().get_queryset().filter(verbalautopsy__deleted_at__isnull=True)
@@ -1833,6 +2029,13 @@ class CauseOfDeath(models.Model):
     # Store the settings used for this particular coding run
     # NOTE: by using JSONField we tie ourselves to postgres
     settings = JSONField()
+    # Which settings variant the cause is from: blank for the default settings,
+    # whose causes are the ones the app shows and counts (see default_cause);
+    # other variants (e.g. of a sensitivity analysis) are only kept alongside
+    variant = models.TextField(blank=True, default="", db_index=True)
+    # Hash of the algorithm input (the VA's pyCrossVA row) and settings, so the
+    # result can be reused for VAs whose relevant answers haven't changed
+    input_hash = models.TextField(blank=True, db_index=True)
     # Track the history of changes to each verbal autopsy cause of death coding
     # TODO: confirm that we need a history of this
     history = HistoricalRecords()
@@ -1845,6 +2048,12 @@ class CauseOfDeath(models.Model):
         return self.cause
 
 
+# Prefetch of VAs' causes limited to their default_cause, so va.causes.all()
+# holds the one cause the app shows
+def prefetch_default_cause():
+    return Prefetch("causes", queryset=CauseOfDeath.objects.filter(variant=""))
+
+
 class CauseCodingIssue(models.Model):
     # One VerbalAutopsy can have multiple coding issues
     verbalautopsy = models.ForeignKey(
@@ -3,7 +3,12 @@ from collections import defaultdict
 from io import BytesIO
 
 import pandas as pd
+from celery import chord
+from celery.exceptions import SoftTimeLimitExceeded
 from celery.schedules import crontab
+from celery.utils.log import get_task_logger
+from django.conf import settings
+from django.core.cache import cache
 
 from config.celery_app import app
 from config.settings.base import env
@@ -15,12 +20,19 @@ from va_explorer.va_data_management.management.commands.load_form_csv import (
 )
 from va_explorer.va_data_management.models import ODKFormChoice
 from va_explorer.va_data_management.utils import coding, kobo, odk
-from va_explorer.va_data_management.utils.loading import load_records_from_dataframe
+from va_explorer.va_data_management.utils.loading import (
+    IngestContext,
+    load_records_from_dataframe,
+    load_records_in_chunks,
+)
 from va_explorer.va_data_management.utils.odk import (
     pyodk_download_definition,
     pyodk_download_table,
+    pyodk_sync_table,
 )
 
+logger = get_task_logger(__name__)
+
 
 def load_definition_from_bytes(form_name: str, content: bytes) -> int:
     """Parse an XLSForm definition and populate ODKFormChoice."""
@@ -69,6 +81,23 @@ def import_dataframe_records(form_name: str, df: pd.DataFrame) -> int:
     return len(objects)
 
 
+# Log and store the per-stage timings of an import run, so regressions in any one
+# stage show up as data volumes grow
+def log_ingest_stats(context):
+    stats = context.record_stats()
+    logger.info(
+        "Imported %d %s rows in %.1fs (%s rows/s, process peak memory %d KB). "
+        "Stages: %s",
+        stats["rows"],
+        context.source,
+        stats["seconds"],
+        stats["rows_per_second"],
+        stats["process_peak_memory_kb"],
+        stats["stages"],
+    )
+    return stats
+
+
 @app.on_after_finalize.connect
 def setup_periodic_tasks(sender, **kwargs):
     # Import from Kobo daily at 00:00
@@ -76,6 +105,14 @@ def setup_periodic_tasks(sender, **kwargs):
         crontab(hour=0, minute=0), import_from_kobo.s(), name="Import from Kobo daily"
     )
 
+    # Re-download all Kobo submissions weekly on Sundays at 02:00. Daily imports only
+    # ask for new or approved/rejected submissions; Kobo doesn't timestamp edits
+    sender.add_periodic_task(
+        crontab(hour=2, minute=0, day_of_week=0),
+        import_from_kobo.s(full_resync=True),
+        name="Resync from Kobo weekly",
+    )
+
     # Run Coding Algorithms daily at 00:30
     sender.add_periodic_task(
         crontab(hour=0, minute=30),
@@ -92,66 +129,175 @@ def setup_periodic_tasks(sender, **kwargs):
 
 
 # Result of tasks need to be json serializable so return dicts.
-@app.task()
-def run_coding_algorithms():
-    results = coding.run_coding_algorithms()
+def coding_counts(results):
     return {
         "num_coded": len(results["causes"]),
         "num_total": len(results["verbal_autopsies"]),
         "num_issues": len(results["issues"]),
+        "num_failed": len(results["failed"]),
     }
 
 
+# Code the VAs without a cause coding as one task per id range, run in parallel
+# across the workers; once they've all finished the chord callback adds up their
+# counts.
 @app.task()
-def import_from_odk():
+def run_coding_algorithms():
+    return code_id_ranges(coding.uncoded_id_ranges(coding.CODING_CHUNK_SIZE))
+
+
+def code_id_ranges(id_ranges):
+    if not id_ranges:
+        return {"num_chunks": 0, "aggregate_task_id": None}
+    result = chord(
+        code_va_range.s(first_id, last_id) for first_id, last_id in id_ranges
+    )(aggregate_coding_results.s())
+    return {"num_chunks": len(id_ranges), "aggregate_task_id": result.id}
+
+
+# Cache key holding the lowest id of the VAs waiting for a scheduled
+# code_new_vas task, while one is pending
+CODING_TRIGGER_KEY = "va_data_management:coding_trigger"
+
+
+# Queue coding of newly imported VAs (if VA_CODE_AFTER_IMPORT is on), so they get
+# a cause within minutes rather than at the nightly run. The first import
+# schedules code_new_vas VA_CODING_TRIGGER_DELAY seconds out; imports until it
+# runs find it pending and add nothing, as their VAs' ids are higher than the
+# first import's and so covered by it. Many small imports (e.g. Kobo pages) thus
+# coalesce into a few coding runs. Returns whether a run was scheduled.
+def schedule_coding(va_ids):
+    if not settings.VA_CODE_AFTER_IMPORT or not va_ids:
+        return False
+    delay = settings.VA_CODING_TRIGGER_DELAY
+    # expires in case the task is lost, so imports don't stay untriggered
+    if not cache.add(CODING_TRIGGER_KEY, min(va_ids), timeout=delay * 2 + 60):
+        return False
+    code_new_vas.apply_async(args=[min(va_ids)], countdown=delay)
+    return True
+
+
+# Code the uncoded VAs from from_id on. The trigger is cleared before their ranges
+# are worked out, so a VA imported while that runs gets a run of its own rather
+# than falling between the ranges and the trigger being cleared.
+@app.task()
+def code_new_vas(from_id):
+    cache.delete(CODING_TRIGGER_KEY)
+    id_ranges = coding.uncoded_id_ranges(coding.CODING_CHUNK_SIZE, from_id=from_id)
+    return code_id_ranges(id_ranges)
+
+
+# Code the uncoded VAs with ids from first_id to last_id. Batches that failed
+# (or didn't finish before the time limit) are retried by re-running the range:
+# VAs it already coded have causes by then, so only the rest are coded again.
+# Counts of earlier attempts are passed along so the chunk reports them all.
+@app.task(bind=True, max_retries=coding.CODING_RETRIES)
+def code_va_range(self, first_id, last_id, counts=None):
+    summed = ["num_coded", "num_total", "num_issues"]
+    counts = counts or dict.fromkeys(summed, 0)
+    try:
+        results = coding.run_coding_algorithms(id_range=(first_id, last_id))
+    except SoftTimeLimitExceeded as error:
+        raise self.retry(exc=error, countdown=0, kwargs={"counts": counts}) from error
+    attempt = coding_counts(results)
+    # VAs still failing after this attempt are retried in the next one
+    counts = {
+        **{key: counts[key] + attempt[key] for key in summed},
+        "num_failed": attempt["num_failed"],
+    }
+    if counts["num_failed"] and self.request.retries < self.max_retries:
+        raise self.retry(countdown=60, kwargs={"counts": counts})
+    return counts
+
+
+# Chord callback: totals of all the chunks of a coding run
+@app.task()
+def aggregate_coding_results(chunk_counts):
+    totals = dict.fromkeys(["num_coded", "num_total", "num_issues", "num_failed"], 0)
+    for counts in chunk_counts:
+        for key in totals:
+            totals[key] += counts[key]
+    logger.info(
+        "Coded %d verbal autopsies (out of %d) [%d issues, %d failed]",
+        totals["num_coded"],
+        totals["num_total"],
+        totals["num_issues"],
+        totals["num_failed"],
+    )
+    return totals
+
+
+@app.task()
+def import_from_odk(full_resync=False):
     options = {
         "email": env("ODK_EMAIL"),
         "password": env("ODK_PASSWORD"),
         "project_id": env("ODK_PROJECT_ID"),
         "form_id": env("ODK_FORM_ID"),
     }
-    data = odk.download_responses(
-        options["email"],
-        options["password"],
-        project_id=options["project_id"],
-        form_id=options["form_id"],
-    )
-    results = load_records_from_dataframe(data)
+    chunk_size = settings.VA_IMPORT_CHUNK_SIZE
+    context = IngestContext(source="odk")
+    if odk.ODK_INCREMENTAL_SYNC:
+        # only submissions since the last sync, loaded one page at a time
+        counts = load_records_in_chunks(
+            odk.sync_responses(
+                options["email"],
+                options["password"],
+                project_id=options["project_id"],
+                form_id=options["form_id"],
+                full_resync=full_resync,
+            ),
+            context=context,
+        )
+    else:
+        data = odk.download_responses(
+            options["email"],
+            options["password"],
+            project_id=options["project_id"],
+            form_id=options["form_id"],
+            chunk_size=chunk_size if chunk_size > 0 else None,
+        )
+        if chunk_size > 0:
+            counts = load_records_in_chunks(data, context=context)
+        else:
+            results = load_records_from_dataframe(data, context=context)
+            counts = {
+                key: len(results[key]) for key in ["created", "ignored", "outdated"]
+            }
+    schedule_coding(context.created_ids)
     return {
-        "num_created": len(results["created"]),
-        "num_ignored": len(results["ignored"]),
-        "num_outdated": len(results["outdated"]),
+        "num_created": counts["created"],
+        "num_ignored": counts["ignored"],
+        "num_outdated": counts["outdated"],
+        "stats": log_ingest_stats(context),
     }
 
 
 @app.task()
-def import_from_kobo():
+def import_from_kobo(full_resync=False):
     options = {
         "token": env("KOBO_API_TOKEN"),
         "asset_id": env("KOBO_ASSET_ID"),
     }
-    data, next_page = kobo.download_responses(
-        options["token"], options["asset_id"], BATCH_SIZE, None
-    )
-    results = load_records_from_dataframe(data)
-
-    num_created = len(results["created"])
-    num_ignored = len(results["ignored"])
-    num_outdated = len(results["outdated"])
-    num_corrected = len(results["corrected"])
-    num_invalid = len(results["removed"])
-
-    # Process all available pages of kobo data since it is provided via pagination
-    while next_page is not None:
-        data, next_page = kobo.download_responses(
-            options["token"], options["asset_id"], BATCH_SIZE, next_page
+    num_created = num_ignored = num_outdated = num_corrected = num_invalid = 0
+
+    # Process all new pages of kobo data since it is provided via pagination. Only
+    # submissions since the last sync are requested unless full_resync is set.
+    # Pages share one ingest context so existing data is only looked up once
+    context = IngestContext(source="kobo")
+    for data in kobo.sync_responses(
+        options["token"], options["asset_id"], BATCH_SIZE, full_resync=full_resync
+    ):
+        results = load_records_from_dataframe(
+            data, mark_duplicates=False, context=context
         )
-        results = load_records_from_dataframe(data)
         num_created = num_created + len(results["created"])
         num_ignored = num_ignored + len(results["ignored"])
         num_outdated = num_outdated + len(results["outdated"])
         num_corrected = num_corrected + len(results["corrected"])
         num_invalid = num_invalid + len(results["removed"])
+        schedule_coding([va.id for va in results["created"]])
+    context.mark_duplicates()
 
     return {
         "num_ignored": num_ignored,
@@ -159,11 +305,12 @@ def import_from_kobo():
         "num_created": num_created,
         "num_corrected": num_corrected,
         "num_removed": num_invalid,
+        "stats": log_ingest_stats(context),
     }
 
 
 @app.task()
-def import_odk_forms():
+def import_odk_forms(full_resync=False):
     """Download ODK form definitions and data using pyODK."""
     forms = {
         "household": env("ODK_HOUSEHOLD_FORM_ID", default=""),
@@ -178,6 +325,16 @@ def import_odk_forms():
         definition = pyodk_download_definition(form_id)
         if definition:
             load_definition_from_bytes(name, definition)
+        if odk.ODK_INCREMENTAL_SYNC:
+            # only records submitted since the last sync, one page at a time
+            num = sum(
+                import_dataframe_records(name, df)
+                for df in pyodk_sync_table(form_id, full_resync=full_resync)
+                if not df.empty
+            )
+            if num:
+                results[name] = num
+            continue
         df = pyodk_download_table(form_id)
         if not df.empty:
             num = import_dataframe_records(name, df)
@@ -0,0 +1,350 @@
+import csv
+import json
+from io import StringIO
+
+import pandas as pd
+import pytest
+from django.core.cache import cache
+from django.core.exceptions import ImproperlyConfigured
+
+from va_explorer.tests.factories import VerbalAutopsyFactory
+from va_explorer.va_data_management import tasks
+from va_explorer.va_data_management.models import (
+    CauseCodingIssue,
+    CauseOfDeath,
+    VerbalAutopsy,
+    default_cause,
+)
+from va_explorer.va_data_management.utils import coding
+from va_explorer.va_data_management.utils.coding import (
+    ALGORITHM_SETTINGS,
+    INTERVA_HOST,
+    PYCROSS_HOST,
+    pycross_input,
+    pycross_rows,
+    run_coding_algorithms,
+    uncoded_id_ranges,
+    variant_key,
+)
+
+pytestmark = pytest.mark.django_db
+
+
+# pyCrossVA stand-in: one output row per VA, keyed by its (1-based) position
+def transform(request, context):
+    rows = list(csv.DictReader(StringIO(request.body.decode("utf-8"))))
+    return "".join([",i004a\n", *[f"{i},1.0\n" for i in range(1, len(rows) + 1)]])
+
+
+# InterVA5 stand-in: codes every VA it's sent
+def interva5(request, context):
+    rows = json.loads(request.body)["Input"]
+    causes = [
+        {"ID": [row["ID"]], "CAUSE1": ["Cause"], "LIK1": ["50"], "INDET": [0]}
+        for row in rows
+    ]
+    return {"results": {"VA5": causes}, "errors": [], "warnings": []}
+
+
+def test_run_coding_algorithms(requests_mock):
+    vas = VerbalAutopsyFactory.create_batch(7)
+    requests_mock.post(f"{PYCROSS_HOST}/transform", text=transform)
+    # the first call to InterVA5 fails; its batch is retried
+    requests_mock.post(
+        f"{INTERVA_HOST}/interva5",
+        [{"status_code": 503}, {"json": interva5}],
+    )
+
+    results = run_coding_algorithms(batch_size=2, workers=3, retries=1)
+
+    # every VA is coded exactly once, even though coded VAs drop out of the set of
+    # uncoded VAs while the run pages through it
+    assert len(results["causes"]) == 7
+    assert results["failed"] == []
+    assert sorted(results["verbal_autopsies"]) == [va.id for va in vas]
+    assert CauseOfDeath.objects.count() == 7
+    assert not VerbalAutopsy.objects.filter(causes__isnull=True).exists()
+
+
+def test_run_coding_algorithms_failed_batch(requests_mock):
+    VerbalAutopsyFactory.create_batch(3)
+    requests_mock.post(f"{PYCROSS_HOST}/transform", text=transform)
+    requests_mock.post(f"{INTERVA_HOST}/interva5", status_code=503)
+
+    results = run_coding_algorithms(batch_size=2, workers=2, retries=1)
+
+    # failing batches are left uncoded for the next run
+    assert len(results["failed"]) == 3
+    assert results["causes"] == []
+    assert CauseOfDeath.objects.count() == 0
+
+
+def test_run_coding_algorithms_reuses_results(requests_mock):
+    vas = [VerbalAutopsyFactory.create(Id10017=name) for name in ["a", "b", "c"]]
+    requests_mock.post(f"{PYCROSS_HOST}/transform", text=transform)
+    interva = requests_mock.post(f"{INTERVA_HOST}/interva5", json=interva5)
+    run_coding_algorithms(batch_size=10, reuse_results=True)
+    assert interva.call_count == 1
+    CauseCodingIssue.objects.create(
+        verbalautopsy=vas[2],
+        text="warning",
+        severity="warning",
+        algorithm="InterVA5",
+        settings=ALGORITHM_SETTINGS,
+    )
+
+    # recode everything: unchanged VAs reuse their results, edited ones don't. A
+    # VA replaced by an identical copy (e.g. re-imported) reuses the original's
+    CauseOfDeath.objects.all().delete()
+    vas[0].Id10019 = "male"
+    vas[0].save()
+    copy = VerbalAutopsyFactory.create(Id10017="c")
+    vas[2].delete()
+
+    results = run_coding_algorithms(batch_size=10, reuse_results=True)
+
+    assert interva.call_count == 2
+    assert len(interva.last_request.json()["Input"]) == 1
+    assert sorted(results["reused"]) == [vas[1].id, copy.id]
+    assert len(results["causes"]) == 3
+    assert [issue.text for issue in copy.coding_issues.all()] == ["warning"]
+
+
+def test_run_coding_algorithms_reuses_one_source_for_many(requests_mock):
+    source = VerbalAutopsyFactory.create(Id10017="a")
+    requests_mock.post(f"{PYCROSS_HOST}/transform", text=transform)
+    interva = requests_mock.post(f"{INTERVA_HOST}/interva5", json=interva5)
+    run_coding_algorithms(batch_size=10, reuse_results=True)
+    CauseCodingIssue.objects.create(
+        verbalautopsy=source,
+        text="warning",
+        severity="warning",
+        algorithm="InterVA5",
+        settings=ALGORITHM_SETTINGS,
+    )
+
+    # identical copies all reuse the one coded VA, issues included
+    copies = [VerbalAutopsyFactory.create(Id10017="a") for _ in range(3)]
+    results = run_coding_algorithms(batch_size=10, reuse_results=True)
+
+    assert interva.call_count == 1
+    assert sorted(results["reused"]) == [copy.id for copy in copies]
+    for copy in copies:
+        assert [issue.text for issue in copy.coding_issues.all()] == ["warning"]
+
+
+def test_pycross_fields_from_mapping(monkeypatch):
+    # with the library installed, only the fields its mapping reads are sent
+    monkeypatch.setattr(
+        coding,
+        "pycross_source_columns",
+        lambda: {"Id10019", "Id10017", "ageInDays", "unknown"},
+    )
+    coding.pycross_fields.cache_clear()
+    try:
+        assert coding.pycross_fields() == ["Id10017", "Id10019", "ageInDays"]
+    finally:
+        coding.pycross_fields.cache_clear()
+
+    # and every questionnaire field without it
+    monkeypatch.setattr(coding, "pycross_source_columns", lambda: None)
+    try:
+        assert len(coding.pycross_fields()) > 500
+    finally:
+        coding.pycross_fields.cache_clear()
+
+
+def test_pycross_input_projects_questionnaire_columns():
+    vas = [
+        VerbalAutopsyFactory.create(Id10017=name, deviceid="device", hospital="h")
+        for name in ["a", "b"]
+    ]
+
+    rows = list(
+        csv.reader(StringIO(pycross_input(pycross_rows([vas[1].id, vas[0].id]))))
+    )
+
+    # rows come back in the order asked for, indexed by position, without the
+    # metadata pyCrossVA doesn't use
+    header = rows[0]
+    assert header[0] == ""
+    assert "-Id10017" in header
+    assert not {"-id", "-deviceid", "-hospital"} & set(header)
+    assert [(row[0], row[header.index("-Id10017")]) for row in rows[1:]] == [
+        ("0", "b"),
+        ("1", "a"),
+    ]
+
+
+def test_coding_by_id_range(requests_mock):
+    vas = VerbalAutopsyFactory.create_batch(5)
+    requests_mock.post(f"{PYCROSS_HOST}/transform", text=transform)
+    requests_mock.post(f"{INTERVA_HOST}/interva5", json=interva5)
+    ids = [va.id for va in vas]
+
+    assert uncoded_id_ranges(chunk_size=2) == [ids[0:2], ids[2:4], [ids[4], ids[4]]]
+
+    results = run_coding_algorithms(batch_size=10, id_range=ids[2:4])
+
+    assert sorted(results["verbal_autopsies"]) == ids[2:4]
+    # coded VAs aren't part of later ranges, so re-running a range codes nothing
+    assert uncoded_id_ranges(chunk_size=2) == [ids[0:2], [ids[4], ids[4]]]
+    assert run_coding_algorithms(id_range=ids[2:4])["verbal_autopsies"] == []
+
+
+def test_coding_chunk_tasks(requests_mock):
+    vas = VerbalAutopsyFactory.create_batch(3)
+    requests_mock.post(f"{PYCROSS_HOST}/transform", text=transform)
+    requests_mock.post(f"{INTERVA_HOST}/interva5", json=interva5)
+
+    # counts of earlier attempts at the chunk are added to this one's
+    earlier = {"num_coded": 1, "num_total": 1, "num_issues": 1, "num_failed": 2}
+    counts = tasks.code_va_range.apply(
+        args=[vas[1].id, vas[2].id], kwargs={"counts": earlier}
+    ).get()
+    assert counts == {"num_coded": 3, "num_total": 3, "num_issues": 1, "num_failed": 0}
+    assert tasks.aggregate_coding_results(
+        [counts, {"num_coded": 0, "num_total": 1, "num_issues": 0, "num_failed": 1}]
+    ) == {"num_coded": 3, "num_total": 4, "num_issues": 1, "num_failed": 1}
+    assert vas[0].causes.count() == 0
+
+
+def test_schedule_coding_coalesces_imports(settings, monkeypatch):
+    settings.VA_CODE_AFTER_IMPORT = True
+    cache.delete(tasks.CODING_TRIGGER_KEY)
+    scheduled, coded = [], []
+    monkeypatch.setattr(
+        tasks.code_new_vas,
+        "apply_async",
+        lambda args, countdown: scheduled.append(args),
+    )
+    monkeypatch.setattr(tasks, "code_id_ranges", coded.extend)
+    old, *new = VerbalAutopsyFactory.create_batch(3)
+
+    # the first import schedules a run; later ones are covered by it
+    assert tasks.schedule_coding([new[0].id])
+    assert not tasks.schedule_coding([new[1].id])
+    assert scheduled == [[new[0].id]]
+
+    # the run codes only VAs from the first import on, and clears the trigger
+    tasks.code_new_vas(new[0].id)
+    assert coded == [[new[0].id, new[1].id]]
+    assert tasks.schedule_coding([new[1].id])
+    assert old.causes.count() == 0
+
+
+def test_code_new_vas_clears_trigger_first(settings, monkeypatch):
+    settings.VA_CODE_AFTER_IMPORT = True
+    cache.delete(tasks.CODING_TRIGGER_KEY)
+    scheduled = []
+    monkeypatch.setattr(
+        tasks.code_new_vas,
+        "apply_async",
+        lambda args, countdown: scheduled.append(args),
+    )
+    monkeypatch.setattr(tasks, "code_id_ranges", lambda id_ranges: None)
+    first = VerbalAutopsyFactory.create()
+    tasks.schedule_coding([first.id])
+
+    # a VA imported while the run works out its ranges is scheduled a run
+    def import_during_ranges(*args, **kwargs):
+        late = VerbalAutopsyFactory.create()
+        tasks.schedule_coding([late.id])
+        return [[first.id, first.id]]
+
+    monkeypatch.setattr(coding, "uncoded_id_ranges", import_during_ranges)
+    tasks.code_new_vas(first.id)
+    assert len(scheduled) == 2
+
+
+def test_run_coding_algorithms_local_transform(requests_mock, monkeypatch):
+    # pyCrossVA library stand-in: one output row per input row
+    def pycross_transform(mapping, raw_data, verbose):
+        assert mapping == ("2016WHOv151", "InterVA5")
+        return pd.DataFrame(
+            {"i004a": [1.0] * len(raw_data), "i019a": [0] * len(raw_data)}
+        ).assign(i022a=None)
+
+    monkeypatch.setattr(coding, "PYCROSS_BACKEND", "local")
+    monkeypatch.setattr(coding, "pycross_transform", pycross_transform)
+    VerbalAutopsyFactory.create_batch(3)
+    interva = requests_mock.post(f"{INTERVA_HOST}/interva5", json=interva5)
+
+    results = run_coding_algorithms(batch_size=2)
+
+    # the service isn't called; InterVA5 gets the same input it would have
+    assert len(results["causes"]) == 3
+    assert interva.call_count == 2
+    assert interva.request_history[0].json()["Input"] == [
+        {"ID": "1", "i004a": "y", "i019a": ".", "i022a": ""},
+        {"ID": "2", "i004a": "y", "i019a": ".", "i022a": ""},
+    ]
+
+
+def test_local_transform_requires_pycrossva(monkeypatch):
+    monkeypatch.setattr(coding, "PYCROSS_BACKEND", "local")
+    monkeypatch.setattr(coding, "pycross_transform", None)
+
+    with pytest.raises(ImproperlyConfigured):
+        coding.transform_batch([])
+
+
+def test_run_coding_algorithms_settings_variants(requests_mock):
+    VerbalAutopsyFactory.create_batch(3)
+    pycross = requests_mock.post(f"{PYCROSS_HOST}/transform", text=transform)
+    interva = requests_mock.post(f"{INTERVA_HOST}/interva5", json=interva5)
+    variants = [{**ALGORITHM_SETTINGS, "HIV": hiv} for hiv in ["h", "l", "v"]]
+
+    results = run_coding_algorithms(batch_size=10, settings_variants=variants)
+
+    # the batch is transformed once and coded with each of the settings
+    assert pycross.call_count == 1
+    assert interva.call_count == 3
+    assert sorted(request.json()["HIV"] for request in interva.request_history) == [
+        "h",
+        "l",
+        "v",
+    ]
+    assert len(results["causes"]) == 9
+    for variant in variants:
+        assert CauseOfDeath.objects.filter(settings=variant).count() == 3
+
+
+def test_settings_variants_catch_up(requests_mock):
+    VerbalAutopsyFactory.create_batch(3)
+    requests_mock.post(f"{PYCROSS_HOST}/transform", text=transform)
+    requests_mock.post(f"{INTERVA_HOST}/interva5", json=interva5)
+    run_coding_algorithms(batch_size=10)
+
+    # InterVA5 fails for one of the variants
+    def failing_interva5(request, context):
+        if request.json()["HIV"] == "v":
+            context.status_code = 503
+            return {}
+        return interva5(request, context)
+
+    interva = requests_mock.post(f"{INTERVA_HOST}/interva5", json=failing_interva5)
+    variants = [{**ALGORITHM_SETTINGS, "HIV": hiv} for hiv in ["h", "l", "v"]]
+    default, added, failing = variants
+
+    # VAs coded with the default settings are coded with the variants added since
+    results = run_coding_algorithms(
+        batch_size=10, retries=0, settings_variants=variants
+    )
+    assert sorted(request.json()["HIV"] for request in interva.request_history) == [
+        "l",
+        "v",
+    ]
+    assert len(results["failed"]) == 3
+    assert CauseOfDeath.objects.filter(variant="").count() == 3
+    assert CauseOfDeath.objects.filter(variant=variant_key(added)).count() == 3
+
+    # and the variant that failed is retried on the next run
+    interva = requests_mock.post(f"{INTERVA_HOST}/interva5", json=interva5)
+    results = run_coding_algorithms(batch_size=10, settings_variants=variants)
+    assert [request.json()["HIV"] for request in interva.request_history] == ["v"]
+    assert CauseOfDeath.objects.filter(variant=variant_key(failing)).count() == 3
+
+    # each VA still has one cause the app shows
+    vas = VerbalAutopsy.objects.annotate(cod=default_cause())
+    assert vas.filter(cod__isnull=False).count() == 3
@@ -0,0 +1,67 @@
+import pandas
+import pytest
+from django.db import IntegrityError
+from django.forms.models import model_to_dict
+from simple_history.utils import bulk_create_with_history
+
+from va_explorer.va_data_management.models import VerbalAutopsy
+from va_explorer.va_data_management.utils.copy_insert import copy_create_with_history
+from va_explorer.va_data_management.utils.loading import load_records_from_dataframe
+
+pytestmark = pytest.mark.django_db
+
+
+def make_vas(prefix):
+    return [
+        VerbalAutopsy(
+            instanceid=f"{prefix}-tricky",
+            Id10017="tab\there",
+            Id10018="back\\slash\nnew line",
+            Id10023="",
+        ),
+        VerbalAutopsy(instanceid=f"{prefix}-plain", Id10017="name", duplicate=True),
+    ]
+
+
+def stored_values(va):
+    values = model_to_dict(VerbalAutopsy.objects.get(pk=va.pk))
+    return {k: v for k, v in values.items() if k not in ("id", "instanceid")}
+
+
+def test_copy_create_with_history():
+    created = copy_create_with_history(make_vas("copy"), VerbalAutopsy)
+    inserted = bulk_create_with_history(make_vas("insert"), VerbalAutopsy)
+
+    # ids are assigned and the stored values match those of a regular insert
+    assert all(va.pk for va in created)
+    for va, expected in zip(created, inserted):
+        assert stored_values(va) == stored_values(expected)
+        stored = VerbalAutopsy.objects.get(pk=va.pk)
+        assert stored.created is not None
+        history = stored.history.get()
+        assert history.history_type == "+"
+        assert history.Id10018 == va.Id10018
+
+    # later inserts carry on from the allocated ids
+    later = VerbalAutopsy.objects.create(instanceid="later")
+    assert later.pk > max(va.pk for va in created)
+
+
+def test_copy_create_with_history_rejects_live_duplicates():
+    VerbalAutopsy.objects.create(instanceid="taken")
+
+    with pytest.raises(IntegrityError):
+        copy_create_with_history([VerbalAutopsy(instanceid="taken")], VerbalAutopsy)
+
+
+def test_loading_with_copy(settings):
+    settings.VA_IMPORT_USE_COPY = True
+    df = pandas.DataFrame.from_records(
+        [{"instanceid": f"instance{i}", "instancename": f"name {i}"} for i in range(3)]
+    ).assign(Id10017="name", Id10018="surname", Id10012="2021-03-21")
+
+    result = load_records_from_dataframe(df)
+
+    assert len(result["created"]) == 3
+    assert VerbalAutopsy.objects.count() == 3
+    assert VerbalAutopsy.history.count() == 3
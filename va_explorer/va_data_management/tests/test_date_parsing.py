@@ -2,7 +2,11 @@ import pytest
 from numpy import nan
 
 from va_explorer.va_data_management.models import VerbalAutopsy
-from va_explorer.va_data_management.utils.date_parsing import get_interview_date
+from va_explorer.va_data_management.utils.date_parsing import (
+    get_interview_date,
+    parse_date,
+    parse_dates,
+)
 
 pytestmark = pytest.mark.django_db
 
@@ -25,3 +29,61 @@ def test_interview_date_logic():
     assert date_res_1 == "2021-04-19"
     assert date_res_2 == "2020-05-19"
     assert date_res_3 == empty_string
+
+
+# ensure the series-level parser gives exactly what parse_date gives per value,
+# including for ambiguous day/month orders where format priority matters
+def test_parse_dates_matches_parse_date():
+    dates = [
+        "2021-04-19",
+        "04/19/2021",
+        "19/04/2021",
+        "05/04/2021",
+        "04/19/21",
+        "05/04/21",
+        "2021-04-19T13:53:07.928Z",
+        "2021-04-19 13:53:07.928",
+        "19 April 2021",
+        "not a date",
+        "dk",
+        "",
+        nan,
+    ]
+    expected = [parse_date(date) for date in dates]
+
+    assert parse_dates(dates).tolist() == expected
+    # order values so a remembered format is in play before an ambiguous value
+    assert parse_dates(dates[::-1]).tolist() == expected[::-1]
+
+
+# a column mixing day-first and month-first dates: dates that can only be read one
+# way are, and ambiguous ones are read month first (the higher priority format)
+# whatever order the column's values come in
+@pytest.mark.parametrize("reverse", [False, True])
+def test_parse_dates_ambiguous_column(reverse):
+    dates = ["19/04/2021", "05/04/2021", "04/19/2021", "13/01/21", "01/02/21"]
+    expected = ["2021-04-19", "2021-05-04", "2021-04-19", "2021-01-13", "2021-01-02"]
+    if reverse:
+        dates, expected = dates[::-1], expected[::-1]
+
+    assert parse_dates(dates).tolist() == expected
+
+
+def test_parse_dates_repeated_values():
+    dates = ["05/04/2021", "19/04/2021", "05/04/2021", nan, "19/04/2021"]
+
+    assert parse_dates(dates).tolist() == [
+        "2021-05-04",
+        "2021-04-19",
+        "2021-05-04",
+        "dk",
+        "2021-04-19",
+    ]
+
+
+def test_parse_date_strict():
+    assert parse_date("not a date") == "not a date"
+    with pytest.raises(ValueError, match="no valid date format"):
+        parse_date("not a date", strict=True)
+    with pytest.raises(ValueError, match="no valid date format"):
+        parse_dates(["2021-04-19", "not a date"], strict=True)
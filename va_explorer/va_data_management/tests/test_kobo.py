@@ -1,3 +1,4 @@
+import json
 import os
 from io import StringIO
 from pathlib import Path
@@ -7,11 +8,16 @@ import pytest
 from django.core.management import call_command
 from requests.exceptions import HTTPError
 
-from va_explorer.va_data_management.models import Location, VerbalAutopsy
+from va_explorer.va_data_management.models import (
+    Location,
+    SyncCursor,
+    VerbalAutopsy,
+)
 from va_explorer.va_data_management.utils.kobo import (
     KOBO_HOST,
     download_responses,
     get_kobo_api_token,
+    sync_responses,
 )
 
 pytestmark = pytest.mark.django_db
@@ -73,6 +79,119 @@ class TestDownloadResponse:
         assert next_page is None
 
 
+class TestSyncResponses:
+    def test_sync_cursor(self, requests_mock):
+        requests_mock.get(
+            f"{KOBO_HOST}/api/v2/assets/TEST5yolfuacxkjibsj7nw/data/?format=json&limit=5000&start=0&sort=%7B%22_id%22:-1%7D",
+            text=MOCK_TEST_DOWNLOAD_JSON,
+        )
+        token, asset_id = (
+            "8sw4a4ypxthcyjpjjra7ifr3hbyxsp2ey2bf591g",
+            "TEST5yolfuacxkjibsj7nw",
+        )
+
+        # first sync downloads everything and records the newest submission seen
+        pages = list(sync_responses(token, asset_id))
+        assert len(pages) == 1
+        assert "query" not in requests_mock.last_request.qs
+        cursor = SyncCursor.objects.get(source="kobo", resource_id=asset_id)
+        assert cursor.last_id == 6071
+        assert cursor.last_submission_time == "2018-07-13T19:12:47"
+
+        # later syncs only ask for submissions added or edited since then
+        list(sync_responses(token, asset_id))
+        assert requests_mock.last_request.qs["query"] == [
+            '{"$or": [{"_id": {"$gt": 6071}}, '
+            '{"_submission_time": {"$gt": "2018-07-13t19:12:47"}}]}'
+        ]
+
+        # unless a full resync is requested
+        list(sync_responses(token, asset_id, full_resync=True))
+        assert "query" not in requests_mock.last_request.qs
+
+    def test_sync_cursor_validation_status(self, requests_mock):
+        page = json.loads(MOCK_TEST_DOWNLOAD_JSON)
+        page["results"][0]["_validation_status"] = {
+            "uid": "validation_status_not_approved",
+            "timestamp": 1531510000,
+        }
+        requests_mock.get(
+            f"{KOBO_HOST}/api/v2/assets/TEST5yolfuacxkjibsj7nw/data/", json=page
+        )
+        token, asset_id = (
+            "8sw4a4ypxthcyjpjjra7ifr3hbyxsp2ey2bf591g",
+            "TEST5yolfuacxkjibsj7nw",
+        )
+
+        # submissions approved or rejected after the last sync are asked for too
+        list(sync_responses(token, asset_id))
+        assert SyncCursor.objects.get().last_validation_time == 1531510000
+        list(sync_responses(token, asset_id))
+        assert requests_mock.last_request.qs["query"] == [
+            '{"$or": [{"_id": {"$gt": 6071}}, '
+            '{"_submission_time": {"$gt": "2018-07-13t19:12:47"}}, '
+            '{"_validation_status.timestamp": {"$gt": 1531510000}}]}'
+        ]
+
+    def test_interrupted_sync(self, requests_mock):
+        requests_mock.get(
+            f"{KOBO_HOST}/api/v2/assets/TEST5yolfuacxkjibsj7nw/data/?format=json&limit=5000&start=0&sort=%7B%22_id%22:-1%7D",
+            text=MOCK_TEST_DOWNLOAD_JSON,
+        )
+        pages = sync_responses(
+            "8sw4a4ypxthcyjpjjra7ifr3hbyxsp2ey2bf591g", "TEST5yolfuacxkjibsj7nw"
+        )
+
+        # the cursor only moves once every page has been processed
+        next(pages)
+        assert SyncCursor.objects.get().last_id is None
+
+    @pytest.mark.parametrize("prefetch", [0, 2])
+    def test_sync_pages(self, requests_mock, prefetch):
+        # three pages chained by their next links
+        data_url = f"{KOBO_HOST}/api/v2/assets/TEST5yolfuacxkjibsj7nw/data/"
+        page = json.loads(MOCK_TEST_DOWNLOAD_JSON)
+        for start in range(3):
+            next_page = f"{data_url}?start={start + 1}" if start < 2 else None
+            results = [
+                {**result, "_id": result["_id"] + start} for result in page["results"]
+            ]
+            requests_mock.get(
+                f"{data_url}?start={start}",
+                json={**page, "results": results, "next": next_page},
+            )
+
+        pages = list(
+            sync_responses(
+                "8sw4a4ypxthcyjpjjra7ifr3hbyxsp2ey2bf591g",
+                "TEST5yolfuacxkjibsj7nw",
+                prefetch=prefetch,
+            )
+        )
+        assert [data["_id"].tolist() for data in pages] == [
+            [1941, 6071],
+            [1942, 6072],
+            [1943, 6073],
+        ]
+        assert SyncCursor.objects.get().last_id == 6073
+
+    def test_sync_error(self, requests_mock):
+        requests_mock.get(
+            f"{KOBO_HOST}/api/v2/assets/TEST5yolfuacxkjibsj7nw/data/", status_code=500
+        )
+
+        # errors downloading pages in the background are raised to the caller
+        with pytest.raises(HTTPError):
+            list(
+                sync_responses(
+                    "8sw4a4ypxthcyjpjjra7ifr3hbyxsp2ey2bf591g",
+                    "TEST5yolfuacxkjibsj7nw",
+                    prefetch=2,
+                )
+            )
+        assert SyncCursor.objects.get().last_id is None
+
+
 class TestImportCommand:
     @mock.patch.dict(os.environ, {}, clear=True)
     def test_missing_params(self):
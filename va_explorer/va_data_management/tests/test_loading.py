@@ -1,13 +1,28 @@
+from datetime import date
 from io import StringIO
 from pathlib import Path
 
 import pandas
 import pytest
 from django.core.management import call_command
+from django.db import connection
+from django.test.utils import CaptureQueriesContext
 
 from va_explorer.tests.factories import VerbalAutopsyFactory
-from va_explorer.va_data_management.models import Location, VerbalAutopsy
-from va_explorer.va_data_management.utils.loading import load_records_from_dataframe
+from va_explorer.va_data_management.models import (
+    ImportBatch,
+    Location,
+    VerbalAutopsy,
+)
+from va_explorer.va_data_management.utils import loading
+from va_explorer.va_data_management.utils.ingest_stats import INGEST_STAGES
+from va_explorer.va_data_management.utils.loading import (
+    IngestContext,
+    format_multi_select_columns,
+    load_records_from_dataframe,
+    load_records_in_chunks,
+    resolve_existing_records,
+)
 
 pytestmark = pytest.mark.django_db
 
@@ -167,6 +182,267 @@ def test_loading_from_dataframe_with_key():
     assert result["created"][1].location.name == "Unknown"
 
 
+def test_loading_in_chunks():
+    loc = Location.add_root(
+        name="Test Location", key="test_location", location_type="facility"
+    )
+
+    data = [
+        {
+            "instanceid": f"instance{i}",
+            "Id10017": "name",
+            "Id10018": str(i),
+            "Id10012": "2021-03-21",
+            "instancename": f"_Dec---name {i}---2021-03-21",
+            "Id10023": "03/01/2021",
+            "hospital": "test_location",
+        }
+        for i in range(5)
+    ]
+    # repeat a record in a later chunk; it should be ignored, not re-created
+    data.append(data[0])
+
+    df = pandas.DataFrame.from_records(data)
+    chunks = (df.iloc[start : start + 2] for start in range(0, len(df), 2))
+
+    counts = load_records_in_chunks(chunks)
+
+    assert counts["created"] == 5
+    assert counts["ignored"] == 1
+    assert VerbalAutopsy.objects.count() == 5
+    assert VerbalAutopsy.objects.filter(location=loc).count() == 5
+    assert VerbalAutopsy.objects.get(instanceid="instance3").Id10023 == "2021-03-01"
+
+
+def test_loading_with_shared_context():
+    Location.add_root(
+        name="Test Location", key="test_location", location_type="facility"
+    )
+    VerbalAutopsyFactory.create(instanceid="existing", instancename="existing")
+
+    def record(instanceid, instancename):
+        return {
+            "instanceid": instanceid,
+            "Id10017": "name",
+            "Id10018": instanceid,
+            "Id10012": "2021-03-21",
+            "instancename": instancename,
+            "Id10023": "03/01/2021",
+            "hospital": "test_location",
+        }
+
+    context = IngestContext()
+    first = pandas.DataFrame.from_records(
+        [record("instance1", "name 1"), record("existing", "existing")]
+    )
+    result = load_records_from_dataframe(first, context=context)
+    assert len(result["created"]) == 1
+    assert len(result["ignored"]) == 1
+
+    # a later batch sees the first batch's VAs: an edited version of one replaces
+    # it, and a repeat of the original is ignored
+    second = pandas.DataFrame.from_records(
+        [record("instance2", "name 1"), record("instance1", "name 1")]
+    )
+    result = load_records_from_dataframe(second, context=context)
+    assert len(result["created"]) == 1
+    assert len(result["outdated"]) == 1
+    assert len(result["ignored"]) == 1
+    assert set(VerbalAutopsy.objects.values_list("instanceid", flat=True)) == {
+        "existing",
+        "instance2",
+    }
+    assert len(context.created_ids) == 2
+    assert len(context.identifiers) == 1
+
+
+def test_loading_replaces_edited_and_rejected_vas_in_bulk():
+    for i in range(3):
+        VerbalAutopsyFactory.create(instanceid=f"old{i}", instancename=f"name {i}")
+    rejected = VerbalAutopsyFactory.create(instanceid="rejected", instancename="x")
+
+    # edited versions of the first two VAs (new uuid, same name), plus a VA that
+    # was rejected in Kobo since it was last imported
+    df = pandas.DataFrame.from_records(
+        [
+            {"instanceid": "new0", "instancename": "name 0", "_validation_status": {}},
+            {"instanceid": "new1", "instancename": "name 1", "_validation_status": {}},
+            {
+                "instanceid": "rejected",
+                "instancename": "x",
+                "_validation_status": {"label": "Not Approved"},
+            },
+        ]
+    ).assign(Id10017="name", Id10018="surname", Id10012="2021-03-21")
+
+    with CaptureQueriesContext(connection) as queries:
+        result = load_records_from_dataframe(df, mark_duplicates=False)
+
+    deletes = [
+        q["sql"]
+        for q in queries.captured_queries
+        if q["sql"].startswith('UPDATE "va_data_management_verbalautopsy"')
+    ]
+    assert len(deletes) == 2
+    assert sorted(va.instanceid for va in result["outdated"]) == ["old0", "old1"]
+    assert [va.instanceid for va in result["removed"]] == ["rejected"]
+    assert set(VerbalAutopsy.objects.values_list("instanceid", flat=True)) == {
+        "new0",
+        "new1",
+        "old2",
+    }
+    # the deletions are recorded in each VA's history
+    latest = rejected.history.latest()
+    assert latest.history_type == "~"
+    assert latest.deleted_at is not None
+
+
+def test_loading_sets_derived_fields():
+    df = pandas.DataFrame.from_records(
+        [
+            {
+                "instanceid": "instance1",
+                "instancename": "name 1",
+                "Id10023": "2021-03-01",
+                "Id10012": "2021-03-21",
+                "Id10019": "Female",
+                "isChild1": "1.0",
+            },
+            {
+                "instanceid": "instance2",
+                "instancename": "name 2",
+                "Id10023": "dk",
+                "Id10011": "2021-03-22T10:00:00.000+02:00",
+                "Id10019": "male",
+                "isAdult": "1",
+            },
+        ]
+    ).assign(Id10017="name", Id10018="surname")
+
+    load_records_from_dataframe(df)
+
+    assert list(
+        VerbalAutopsy.objects.order_by("instanceid").values(
+            "death_date", "interview_date", "age_category", "sex"
+        )
+    ) == [
+        {
+            "death_date": date(2021, 3, 1),
+            "interview_date": date(2021, 3, 21),
+            "age_category": "child",
+            "sex": "female",
+        },
+        # no date of death, interviewed at the VA's start date
+        {
+            "death_date": None,
+            "interview_date": date(2021, 3, 22),
+            "age_category": "adult",
+            "sex": "male",
+        },
+    ]
+
+
+def test_loading_with_deferred_history(settings):
+    settings.VA_IMPORT_DEFER_HISTORY = True
+    df = pandas.DataFrame.from_records(
+        [{"instanceid": f"instance{i}", "instancename": f"name {i}"} for i in range(3)]
+    ).assign(Id10017="name", Id10018="surname", Id10012="2021-03-21")
+    context = IngestContext(source="test")
+
+    load_records_from_dataframe(df, context=context)
+
+    # the imported VAs reference their batch instead of having historical rows
+    assert VerbalAutopsy.history.count() == 0
+    batch = ImportBatch.objects.get()
+    assert batch.source == "test"
+    assert batch.verbalautopsies.filter(history_deferred=True).count() == 3
+
+    # the imported version is recorded before the first change
+    va = VerbalAutopsy.objects.get(instanceid="instance0")
+    va.Id10017 = "edited"
+    va.save()
+    history = list(va.history.order_by("history_date"))
+    assert [h.history_type for h in history] == ["+", "~"]
+    assert [h.Id10017 for h in history] == ["name", "edited"]
+    assert history[0].history_date == batch.created
+    assert VerbalAutopsy.history.count() == 2
+
+
+def test_loading_stats():
+    df = pandas.DataFrame.from_records(
+        [{"instanceid": f"instance{i}", "instancename": f"name {i}"} for i in range(3)]
+    ).assign(Id10017="name", Id10018="surname", Id10012="2021-03-21")
+    context = IngestContext(source="test")
+
+    stats = load_records_from_dataframe(df, context=context)["stats"]
+
+    assert stats["rows"] == 3
+    assert list(stats["stages"]) == INGEST_STAGES
+    assert stats["seconds"] == pytest.approx(sum(stats["stages"].values()), abs=0.01)
+    assert stats["process_peak_memory_kb"] > 0
+
+    # the run's stats are stored on its import batch
+    stored = context.record_stats()
+    assert ImportBatch.objects.get(source="test").stats == stored
+    assert stored["rows"] == 3
+
+    # a run without any rows doesn't leave an empty batch
+    IngestContext(source="empty").record_stats()
+    assert not ImportBatch.objects.filter(source="empty").exists()
+
+
+def test_resolve_existing_records():
+    VerbalAutopsyFactory.create(instanceid="live", instancename="live name")
+    VerbalAutopsyFactory.create(instanceid="deleted", instancename="old").delete()
+
+    ids, names = resolve_existing_records(
+        ["live", "deleted", "new"], ["live name", "old", "new name"]
+    )
+
+    assert ids == {"live"}
+    assert names == {"live name"}
+
+
+def test_loading_concurrently_imported_va(monkeypatch):
+    # another import creates the VA after this batch has checked for it, so the
+    # unique index on live instanceids rejects the insert and the VA is ignored
+    VerbalAutopsyFactory.create(instanceid="instance1", instancename="name 1")
+    checks = []
+
+    def resolve_after_concurrent_import(*args):
+        checks.append(args)
+        return (set(), set()) if len(checks) == 1 else resolve_existing_records(*args)
+
+    monkeypatch.setattr(
+        loading, "resolve_existing_records", resolve_after_concurrent_import
+    )
+    df = pandas.DataFrame.from_records(
+        [{"instanceid": f"instance{i}", "instancename": f"name {i}"} for i in [1, 2]]
+    ).assign(Id10017="name", Id10018="surname", Id10012="2021-03-21")
+
+    result = load_records_from_dataframe(df)
+
+    assert len(checks) == 2
+    assert [va.instanceid for va in result["created"]] == ["instance2"]
+    assert [va.instanceid for va in result["ignored"]] == ["instance1"]
+    assert VerbalAutopsy.objects.filter(instanceid="instance1").count() == 1
+
+
+def test_format_multi_select_columns():
+    df = pandas.DataFrame(
+        {
+            "Id10235": ["skin_rash  ulcers", None, "ulcers"],
+            "Id10007": ["name 1", "name 2", "name 3"],
+        }
+    )
+
+    df = format_multi_select_columns(df)
+
+    assert df["Id10235"].tolist() == ["skin_rash,ulcers", None, "ulcers"]
+    # only multi-select questions are converted
+    assert df["Id10007"].tolist() == ["name 1", "name 2", "name 3"]
+
+
 def test_load_va_csv_command():
     # Location gets assigned automatically/randomly if hospital is not a facility
     # If that changes in loading.py it needs to change here too
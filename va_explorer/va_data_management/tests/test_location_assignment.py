@@ -0,0 +1,68 @@
+import pytest
+
+from va_explorer.va_data_management.models import Location, VerbalAutopsy
+from va_explorer.va_data_management.utils.location_assignment import (
+    LocationIndex,
+    assign_locations,
+    assign_va_location,
+)
+
+pytestmark = pytest.mark.django_db
+
+
+def build_facilities():
+    # two facilities share a name and key, so they can only be told apart by the
+    # district they're in
+    province = Location.add_root(
+        name="Test", location_type="province", path_string="Test Province"
+    )
+    facilities = {}
+    for district in ["North", "South"]:
+        parent = province.add_child(
+            name=district,
+            location_type="district",
+            path_string=f"Test Province/{district} District",
+        )
+        facilities[district] = parent.add_child(
+            name="Clinic",
+            key="clinic",
+            location_type="facility",
+            path_string=f"Test Province/{district} District/Clinic",
+        )
+    return facilities
+
+
+def test_assign_locations(django_assert_max_num_queries):
+    facilities = build_facilities()
+    Location.add_root(name="Unknown", key="other", location_type="facility")
+    vas = [
+        VerbalAutopsy(hospital="clinic", province="test", area="South"),
+        VerbalAutopsy(hospital="clinic", province="Test", area="North"),
+        VerbalAutopsy(hospital="home"),
+        VerbalAutopsy(hospital="dk"),
+        VerbalAutopsy(hospital=""),
+    ] * 100
+
+    # keys + facilities + one lookup of the "Unknown" location, however many vas
+    with django_assert_max_num_queries(3):
+        assign_locations(vas)
+
+    # ambiguous facility names are matched against the va's province & district
+    assert vas[0].location == facilities["South"]
+    assert vas[1].location == facilities["North"]
+    # unmatched locations are recorded as unknown, missing ones are left blank
+    assert vas[2].location.name == "Unknown"
+    assert vas[3].location is None
+    assert vas[4].location is None
+
+
+def test_assign_va_location_matches_index():
+    build_facilities()
+    location_index = LocationIndex()
+    va = VerbalAutopsy(hospital="clinic", province="Test", area="North")
+
+    # a one-off assignment (no index) should give the same result as a shared one
+    assert assign_va_location(va).location == location_index.lookup("clinic", va)
+    assert va.location.path_string == "Test Province/North District/Clinic"
+    assert location_index.null_location() == location_index.null_location()
+    assert Location.objects.filter(name="Unknown").count() == 1
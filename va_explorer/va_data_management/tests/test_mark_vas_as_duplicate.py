@@ -4,6 +4,7 @@ import pytest
 from django.core.management import call_command
 
 from va_explorer.tests.factories import VerbalAutopsyFactory
+from va_explorer.va_data_management.models import VerbalAutopsy
 
 pytestmark = pytest.mark.django_db
 
@@ -47,7 +48,7 @@ def test_mark_vas_as_duplicate(settings):
         Id10021="dk",
         Id10022="Yes",
         Id10023="dk",
-        instanceid="00",
+        instanceid="01",
     )
 
     va2 = VerbalAutopsyFactory.create(
@@ -69,7 +70,7 @@ def test_mark_vas_as_duplicate(settings):
         Id10021="dk",
         Id10022="Yes",
         Id10023="dk",
-        instanceid="02",
+        instanceid="03",
     )
 
     # Assert that no VAs marked as duplicate and no unique_va_identifiers populated
@@ -116,3 +117,34 @@ def test_mark_vas_as_duplicate(settings):
         "Marking existing VAs as duplicate...\n"
         "Successfully marked 2 existing VAs as duplicate!"
     )
+
+
+def test_mark_duplicates_for_identifiers(settings):
+    settings.QUESTIONS_TO_AUTODETECT_DUPLICATES = None
+
+    # hashes are set directly, as if generated on import
+    vas = {
+        name: VerbalAutopsyFactory.create(unique_va_identifier=identifier)
+        for name, identifier in [
+            ("a1", "a"),
+            ("a2", "a"),
+            ("a3", "a"),
+            ("b1", "b"),
+            ("b2", "b"),
+            ("c1", "c"),
+        ]
+    }
+    # soft deleted VAs are never the oldest of their hash
+    vas["a1"].delete()
+
+    # only the given hashes are looked at
+    VerbalAutopsy.mark_duplicates(identifiers=["a", "c"])
+    for va in vas.values():
+        va.refresh_from_db()
+    assert [name for name, va in vas.items() if va.duplicate] == ["a3"]
+
+    # without identifiers, the whole table is checked
+    VerbalAutopsy.mark_duplicates()
+    for va in vas.values():
+        va.refresh_from_db()
+    assert [name for name, va in vas.items() if va.duplicate] == ["a3", "b2"]
@@ -1,4 +1,7 @@
+from datetime import date
+
 import pytest
+from django.core.management import call_command
 
 from va_explorer.tests.factories import (
     CauseCodingIssueFactory,
@@ -10,6 +13,7 @@ from va_explorer.va_data_management.models import (
     CauseCodingIssue,
     CauseOfDeath,
     DhisStatus,
+    Location,
     VerbalAutopsy,
 )
 
@@ -195,7 +199,7 @@ def test_save_updates_duplicates_with_autodetect_duplicates(
         Id10021="1/1/60",
         Id10022="Yes",
         Id10023="1/5/21",
-        instanceid="00",
+        instanceid="01",
     )
     va3 = VerbalAutopsyFactory.create(
         Id10017="Bob",
@@ -205,7 +209,7 @@ def test_save_updates_duplicates_with_autodetect_duplicates(
         Id10021="1/1/60",
         Id10022="Yes",
         Id10023="1/5/21",
-        instanceid="00",
+        instanceid="02",
     )
     va4 = VerbalAutopsyFactory.create(
         Id10017="Bob",
@@ -215,7 +219,7 @@ def test_save_updates_duplicates_with_autodetect_duplicates(
         Id10021="1/1/60",
         Id10022="No",
         Id10023="1/5/21",
-        instanceid="00",
+        instanceid="03",
     )
 
     va1.refresh_from_db()
@@ -263,7 +267,7 @@ def test_save_does_not_update_duplicates_without_autodetect_duplicates(settings)
         Id10021="1/1/60",
         Id10022="Yes",
         Id10023="1/5/21",
-        instanceid="00",
+        instanceid="01",
     )
 
     va1.refresh_from_db()
@@ -311,3 +315,88 @@ def test_related_model_managers():
     assert CauseOfDeath.objects.all().count() == 0
     assert CauseCodingIssue.objects.all().count() == 0
     assert DhisStatus.objects.all().count() == 0
+
+
+def test_save_sets_derived_fields():
+    va = VerbalAutopsyFactory.create(
+        Id10023="2021-01-05", Id10012="dk", Id10011="", isNeonatal2="1"
+    )
+    assert (va.death_date, va.interview_date, va.age_category) == (
+        date(2021, 1, 5),
+        None,
+        "neonate",
+    )
+
+    # edits keep the derived fields in step with the answers
+    va.Id10023 = "dk"
+    va.Id10012 = "2021-02-01"
+    va.isNeonatal2 = ""
+    va.save()
+    va.refresh_from_db()
+    assert (va.death_date, va.interview_date, va.age_category) == (
+        None,
+        date(2021, 2, 1),
+        "Unknown",
+    )
+
+
+def test_backfill_va_derived_fields():
+    vas = VerbalAutopsyFactory.create_batch(3, Id10023="2021-01-05", Id10019="male")
+    # as for VAs that predate the derived fields
+    VerbalAutopsy.objects.update(death_date=None, sex="")
+    vas[0].delete()
+
+    call_command("backfill_va_derived_fields", batch_size=2)
+
+    assert (
+        VerbalAutopsy.all_objects.filter(
+            death_date=date(2021, 1, 5), sex="male"
+        ).count()
+        == 3
+    )
+
+
+def test_location_regions():
+    country = Location.add_root(name="Zambia", location_type="country")
+    province = country.add_child(name="North Province", location_type="province")
+    district = province.add_child(name="East District", location_type="district")
+    facility = district.add_child(name="Facility", location_type="facility")
+
+    assert (facility.province, facility.province_name) == (province, "North Province")
+    assert (facility.district, facility.district_name) == (district, "East District")
+    # a region is in itself
+    assert (province.province, province.district) == (province, None)
+    assert country.province is None
+
+    # renaming a region renames it on the locations below
+    district.name = "West District"
+    district.save()
+    facility.refresh_from_db()
+    assert facility.district_name == "West District"
+
+    # regions of locations changed without save() are refreshed in bulk
+    Location.objects.filter(pk=facility.pk).update(province=None, district_name=None)
+    Location.refresh_regions()
+    facility.refresh_from_db()
+    assert (facility.province, facility.district_name) == (province, "West District")
+
+
+def test_location_save_refreshes_regions_only_on_change(django_assert_num_queries):
+    province = Location.add_root(name="North Province", location_type="province")
+    facility = province.add_child(name="Facility", location_type="facility")
+    assert facility.province_name == "North Province"
+
+    # saving without changing its place, type or name leaves regions alone
+    facility = Location.objects.get(pk=facility.pk)
+    facility.is_active = True
+    with django_assert_num_queries(1):
+        facility.save()
+
+    # and loads can opt out, refreshing every location once they're done
+    province.name = "South Province"
+    province.save(refresh_regions=False)
+    facility.refresh_from_db()
+    assert facility.province_name == "North Province"
+    Location.refresh_regions()
+    facility.refresh_from_db()
+    assert facility.province_name == "South Province"
@@ -5,13 +5,18 @@ import pytest
 from django.core.management import call_command
 from requests.exceptions import HTTPError
 
-from va_explorer.va_data_management.models import Location, VerbalAutopsy
+from va_explorer.va_data_management.models import (
+    Location,
+    SyncCursor,
+    VerbalAutopsy,
+)
 from va_explorer.va_data_management.utils.odk import (
     ODK_HOST,
     download_responses,
     get_odk_form,
     get_odk_login_token,
     get_odk_project_id,
+    sync_responses,
 )
 
 pytestmark = pytest.mark.django_db
@@ -259,6 +264,53 @@ class TestDownloadResponse:
         assert result["Id10007"][0] == "test data"
 
 
+class TestSyncResponses:
+    def test_sync_responses(self, requests_mock):
+        requests_mock.post(f"{ODK_HOST}/v1/sessions", json=MOCK_GET_ODK_LOGIN_TOKEN)
+        requests_mock.get(f"{ODK_HOST}/v1/projects/34/forms", json=MOCK_GET_ODK_FORM)
+        submissions = requests_mock.get(
+            f"{ODK_HOST}/v1/projects/34/forms/va_who_v1_5_2.svc/Submissions",
+            text=MOCK_TEST_DOWNLOAD_JSON,
+        )
+
+        # first sync pages through every submission and records the latest one
+        pages = list(
+            sync_responses(
+                "email", "password", project_id="34", form_id="va_who_v1_5_2"
+            )
+        )
+        assert len(pages) == 1
+        assert pages[0]["Id10007"][0] == "test data"
+        assert "$filter" not in submissions.last_request.qs
+        assert submissions.last_request.qs["$top"] == ["1000"]
+        assert submissions.last_request.qs["$skip"] == ["0"]
+        cursor = SyncCursor.objects.get(source="odk", resource_id="34/va_who_v1_5_2")
+        assert cursor.last_submission_time == "2021-03-22T20:05:30.377Z"
+
+        # later syncs only ask for submissions received or edited since then
+        list(
+            sync_responses(
+                "email", "password", project_id="34", form_id="va_who_v1_5_2"
+            )
+        )
+        assert submissions.last_request.qs["$filter"] == [
+            "__system/submissiondate gt 2021-03-22t20:05:30.377z or "
+            "__system/updatedat gt 2021-03-22t20:05:30.377z"
+        ]
+
+        # unless a full resync is requested
+        list(
+            sync_responses(
+                "email",
+                "password",
+                project_id="34",
+                form_id="va_who_v1_5_2",
+                full_resync=True,
+            )
+        )
+        assert "$filter" not in submissions.last_request.qs
+
+
 class TestImportCommand:
     def test_missing_email_password(self):
         output = StringIO()
@@ -0,0 +1,63 @@
+import pytest
+
+from va_explorer.tests.factories import CauseCodingIssueFactory, VerbalAutopsyFactory
+from va_explorer.va_data_management.models import (
+    CauseCodingIssue,
+    Location,
+    VerbalAutopsy,
+)
+from va_explorer.va_data_management.utils.validate import validate_vas_for_dashboard
+
+pytestmark = pytest.mark.django_db
+
+
+def issue_texts(va):
+    return [issue.text[:30] for issue in va.coding_issues.order_by("id")]
+
+
+def test_validate_vas_for_dashboard():
+    facility = Location.add_root(
+        name="Facility", key="facility", location_type="facility", is_active=True
+    )
+    valid_va = VerbalAutopsyFactory.create(
+        Id10023="2021-03-01", ageInYears2="60", isAdult="1", location=facility
+    )
+    invalid_va = VerbalAutopsyFactory.create(
+        Id10023="not a date",
+        ageInYears2="",
+        isAdult="0",
+        hospital="nowhere",
+        location=None,
+    )
+    # stale data issues are cleared, algorithm issues are kept
+    CauseCodingIssueFactory.create(verbalautopsy=valid_va, algorithm="")
+    CauseCodingIssueFactory.create(verbalautopsy=valid_va, algorithm="InterVA5")
+
+    validate_vas_for_dashboard([valid_va, invalid_va])
+
+    assert valid_va.coding_issues.filter(algorithm="").count() == 0
+    assert valid_va.coding_issues.count() == 1
+    # unmatched hospitals are assigned the "Unknown" location
+    assert issue_texts(invalid_va) == [
+        "Error: field Id10023, couldn't",
+        "Warning: field ageInYears2, ag",
+        "Warning: field age_group, no r",
+        "ERROR: location field (parsed ",
+    ]
+
+
+def test_validate_queryset_in_batch(django_assert_max_num_queries):
+    facility = Location.add_root(
+        name="Facility", key="facility", location_type="facility", is_active=False
+    )
+    VerbalAutopsyFactory.create_batch(
+        50, Id10023="2021-03-01", ageInYears2="60", isAdult="1", location=facility
+    )
+
+    # projection + missing locations + delete + locations + insert
+    with django_assert_max_num_queries(5):
+        validate_vas_for_dashboard(VerbalAutopsy.objects.order_by("id"))
+
+    issues = CauseCodingIssue.objects.all()
+    assert issues.count() == 50
+    assert all("inactive" in issue.text for issue in issues)
@@ -426,6 +426,36 @@ def test_reset_with_valid_permissions(user: User):
     assert va.history.first().history_user == user
 
 
+# Reset a VA imported with deferred history, which has no historical rows until
+# it's first edited
+def test_reset_with_deferred_history(user: User):
+    can_edit_record = Permission.objects.filter(codename="change_verbalautopsy").first()
+    user = UserFactory.create(
+        groups=[GroupFactory.create(permissions=[can_edit_record])]
+    )
+    client = Client()
+    client.force_login(user=user)
+    va = VerbalAutopsyFactory.create(Id10017="Victim name", Id10010="Interviewer name")
+    va.history.all().delete()
+    VerbalAutopsy.objects.filter(pk=va.pk).update(history_deferred=True)
+
+    # an unedited VA can be reset; its imported version is recorded first
+    response = client.get(f"/va_data_management/reset/{va.id}")
+    assert response.status_code == 302
+    assert va.history.count() == 1
+
+    client.post(
+        f"/va_data_management/edit/{va.id}",
+        {"Id10010": "Updated Name", "Id10023": "2021-03-01"},
+    )
+    assert va.history.count() == 2
+    client.get(f"/va_data_management/reset/{va.id}")
+    va = VerbalAutopsy.objects.get(id=va.id)
+    assert va.Id10010 == "Interviewer name"
+    assert not va.history_deferred
+    assert va.history.count() == 3
+
+
 # Verify reset access is restricted
 def test_reset_without_valid_permissions(user: User):
     client = Client()
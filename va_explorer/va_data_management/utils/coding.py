@@ -1,27 +1,95 @@
 import csv
+import hashlib
 import json
 import os
 import re
+from concurrent.futures import (
+    ALL_COMPLETED,
+    FIRST_COMPLETED,
+    ThreadPoolExecutor,
+    wait,
+)
+from functools import cache, reduce
+from importlib.resources import files
 from io import StringIO
-from math import ceil
+from operator import or_
 
 import pandas as pd
 import requests
-from django.forms import model_to_dict
+from django.core.exceptions import ImproperlyConfigured
+from django.db.models import Exists, OuterRef
 from simple_history.utils import bulk_create_with_history
 
+from va_explorer.va_analytics.utils.rollup import refresh_dashboard_rollup
 from va_explorer.va_data_management.models import (
     CauseCodingIssue,
     CauseOfDeath,
     VerbalAutopsy,
 )
 
+# pyCrossVA is optional: without the library, VAs are transformed by its web
+# service at PYCROSS_HOST
+try:
+    from pycrossva.transform import transform as pycross_transform
+except ImportError:
+    pycross_transform = None
+
 # NOTE: By default, VA Explorer runs InterVA5 (settings found in .env file)
 # To change coding algorithm, will need to update settings below and point
 # to that algorithm's service
 
 PYCROSS_HOST = os.environ.get("PYCROSS_HOST", "http://127.0.0.1:5001")
 INTERVA_HOST = os.environ.get("INTERVA_HOST", "http://127.0.0.1:5002")
+# How VAs are transformed into algorithm input: "local" calls the pyCrossVA
+# library in-process, "http" posts them to the pyCrossVA service and "auto" (the
+# default) uses the library when it's installed and the service otherwise
+PYCROSS_BACKEND = os.environ.get("PYCROSS_BACKEND", "auto")
+
+# VAs are coded in batches of CODING_BATCH_SIZE, with up to CODING_WORKERS batches
+# in flight against the coding services at once. A batch whose requests fail is
+# retried up to CODING_RETRIES times before it's left for the next run
+CODING_BATCH_SIZE = int(os.environ.get("CODING_BATCH_SIZE", 500))
+CODING_WORKERS = int(os.environ.get("CODING_WORKERS", 4))
+CODING_RETRIES = int(os.environ.get("CODING_RETRIES", 2))
+# When True, VAs whose algorithm input and settings match an earlier coding reuse
+# that result instead of being sent to pyCrossVA/InterVA5 again
+CODING_REUSE_RESULTS = os.environ.get("CODING_REUSE_RESULTS", "False") == "True"
+# The coding task splits the uncoded VAs into id ranges of up to
+# CODING_CHUNK_SIZE VAs, each coded by its own task so big backlogs are spread
+# over the workers and no single task runs into the time limit
+CODING_CHUNK_SIZE = int(os.environ.get("CODING_CHUNK_SIZE", 5000))
+
+# The pyCrossVA mapping VAs are transformed with (2016 WHO v1.5.1 to InterVA5)
+PYCROSS_MAPPING = ("2016WHOv151", "InterVA5")
+
+# VerbalAutopsy fields that aren't questionnaire answers (record keeping, ODK
+# submission metadata and data-management flags). pyCrossVA's mapping doesn't use
+# them, so they're neither loaded nor sent when the mapping itself isn't available
+# (see pycross_fields); leaving them out of the input hash also lets e.g. a VA
+# re-imported into a new batch reuse its coding
+PYCROSS_EXCLUDED_FIELDS = {
+    "id",
+    "deleted_at",
+    "location",
+    "deviceid",
+    "phonenumber",
+    "simserial",
+    "username",
+    "bid",
+    "bid2",
+    "bid_check",
+    "bid_image",
+    "province",
+    "area",
+    "hospital",
+    "submissiondate",
+    "narrat_image",
+    "geopoint",
+    "comment",
+    "unique_va_identifier",
+    "duplicate",
+    "import_batch",
+}
 
 # Param Setting value sets (used for validation)
 # TODO: add other algorithms' settings as we add support for them
@@ -50,10 +118,10 @@ ALGORITHM_SETTINGS = {
 
 # validates provided algorithm settings against algorithm param value sets. Currently
 # only works with interva5 but set up to generalize to other algorithms once supported
-def validate_algorithm_settings():
+def validate_algorithm_settings(settings=ALGORITHM_SETTINGS):
     # TODO: turn algorithm key name into parameter once we support other algorithms
     param_opts = ALGORITHM_PARAM_OPTIONS["INTERVA"]
-    setting_keys = set(ALGORITHM_SETTINGS.keys())
+    setting_keys = set(settings.keys())
     common_keys = setting_keys.intersection(param_opts.keys())
 
     if len(common_keys) != len(setting_keys):
@@ -65,9 +133,9 @@ def validate_algorithm_settings():
 
     # ensure all common settings are valid
     for key in common_keys:
-        if ALGORITHM_SETTINGS[key] not in param_opts[key]:
+        if settings[key] not in param_opts[key]:
             print(
-                f"ERROR: provided {key} value {ALGORITHM_SETTINGS[key]} not \
+                f"ERROR: provided {key} value {settings[key]} not \
                  found. Expecting one of {param_opts[key]}"
             )
             return False
@@ -75,76 +143,482 @@ def validate_algorithm_settings():
     return True
 
 
-def _run_pycross_and_interva5(verbal_autopsies):
-    # Get into CSV format, also prefixing keys with - as expected by
-    # pyCrossVA (e.g. Id10424 becomes -Id10424)
-    va_data = [model_to_dict(va) for va in verbal_autopsies]
-    va_data = [{f"-{k}": v for k, v in d.items()} for d in va_data]
-    va_data_csv = pd.DataFrame.from_records(va_data).to_csv()
+# Source columns of the pyCrossVA mapping, read from the mapping file shipped with
+# the library, or None when the library (or its mapping file) isn't available
+def pycross_source_columns():
+    if pycross_transform is None:
+        return None
+    source, target = PYCROSS_MAPPING
+    try:
+        mapping = (
+            files("pycrossva")
+            / "resources"
+            / "mapping_configuration_files"
+            / f"{source}_to_{target}.csv"
+        )
+        with mapping.open() as mapping_file:
+            return set(pd.read_csv(mapping_file)["Source Column ID"].dropna())
+    except (ImportError, OSError, KeyError):
+        return None
+
+
+# Columns sent to pyCrossVA. With the library installed, these are only the VA
+# fields its mapping reads; otherwise every VerbalAutopsy field but those in
+# PYCROSS_EXCLUDED_FIELDS (over 500 columns)
+@cache
+def pycross_fields():
+    fields = [
+        field.name
+        for field in VerbalAutopsy._meta.concrete_fields
+        if field.editable and field.name not in PYCROSS_EXCLUDED_FIELDS
+    ]
+    source_columns = pycross_source_columns()
+    if source_columns:
+        mapped = [field for field in fields if field in source_columns]
+        if mapped:
+            return mapped
+    return fields
+
+
+# pyCrossVA input rows for the given VA ids, in the same order, prefixing keys
+# with - as expected by pyCrossVA (e.g. Id10424 becomes -Id10424). Only the
+# columns sent to pyCrossVA are loaded, as plain values rather than model instances
+def pycross_rows(va_ids):
+    fields = pycross_fields()
+    columns = [f"-{field}" for field in fields]
+    values = VerbalAutopsy.objects.filter(id__in=va_ids).values_list("id", *fields)
+    rows = {va_id: dict(zip(columns, row)) for va_id, *row in values}
+    return [rows[va_id] for va_id in va_ids]
+
+
+# Get into CSV format: a header row, then each row with its (0-based) position as
+# the first, unnamed column, as pandas' DataFrame.to_csv writes it
+def pycross_input(rows):
+    output = StringIO()
+    writer = csv.writer(output, lineterminator="\n")
+    columns = [f"-{field}" for field in pycross_fields()]
+    writer.writerow(["", *columns])
+    for index, row in enumerate(rows):
+        writer.writerow([index, *(row[column] for column in columns)])
+    return output.getvalue()
+
+
+# Key the causes coded with the given settings are stored under (see
+# CauseOfDeath.variant): blank for the default settings, whose causes are the
+# ones the app shows, and the settings themselves for any other variant
+def variant_key(settings):
+    if settings == ALGORITHM_SETTINGS:
+        return ""
+    return json.dumps(settings, sort_keys=True)
+
+
+# Hash of a VA's pyCrossVA input row and the algorithm settings: VAs with equal
+# hashes get the same result from the coding algorithm
+def coding_input_hash(row, settings=ALGORITHM_SETTINGS):
+    payload = json.dumps(
+        {"input": row, "settings": settings}, sort_keys=True, default=str
+    )
+    return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+
+# Hash of a VA's pyCrossVA input row alone: VAs with equal hashes have the same
+# pyCrossVA output, whatever the algorithm settings
+def transform_input_hash(row):
+    payload = json.dumps(row, sort_keys=True, default=str)
+    return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+
+# Code the VAs whose input hash matches an earlier InterVA5 coding (kept in the
+# cause of death history, so results of deleted codings can be reused too) with
+# that coding's cause, copying its coding issues if it belonged to another VA.
+# Returns the positions of the VAs that still need to be coded.
+def _reuse_results(va_ids, hashes, results, settings=ALGORITHM_SETTINGS):
+    cached = {
+        entry["input_hash"]: entry
+        for entry in CauseOfDeath.history.filter(
+            input_hash__in=set(hashes), history_type="+", algorithm="InterVA5"
+        )
+        .order_by("history_date")
+        .values("input_hash", "cause", "verbalautopsy_id")
+    }
+    reused, causes, sources, misses = [], [], {}, []
+    for position, (va_id, input_hash) in enumerate(zip(va_ids, hashes)):
+        entry = cached.get(input_hash)
+        if not entry:
+            misses.append(position)
+            continue
+        reused.append(va_id)
+        causes.append(
+            CauseOfDeath(
+                verbalautopsy_id=va_id,
+                cause=entry["cause"],
+                algorithm="InterVA5",
+                settings=settings,
+                variant=variant_key(settings),
+                input_hash=input_hash,
+            )
+        )
+        # several VAs (e.g. re-imported copies) can reuse the same source
+        if entry["verbalautopsy_id"] != va_id:
+            sources.setdefault(entry["verbalautopsy_id"], []).append(va_id)
+
+    if reused:
+        causes = bulk_create_with_history(causes, CauseOfDeath)
+        # the source VA may have been deleted (e.g. replaced by an edited version),
+        # which the default manager hides
+        issues = [
+            CauseCodingIssue(
+                verbalautopsy_id=target_id,
+                text=issue.text,
+                severity=issue.severity,
+                algorithm=issue.algorithm,
+                settings=issue.settings,
+            )
+            for issue in CauseCodingIssue._base_manager.filter(
+                verbalautopsy_id__in=sources, algorithm="InterVA5", settings=settings
+            )
+            for target_id in sources[issue.verbalautopsy_id]
+        ]
+        CauseCodingIssue.objects.bulk_create(issues)
+        refresh_dashboard_rollup(reused)
+        results["causes"].extend(causes)
+        results["issues"].extend(issues)
+        results["verbal_autopsies"].extend(reused)
+        results["reused"].extend(reused)
 
-    # Transform to algorithm format using the pyCrossVA web service
-    transform_url = f"{PYCROSS_HOST}/transform?input=2016WHOv151&output=InterVA5"
-    transform_response = requests.post(transform_url, data=va_data_csv.encode("utf-8"))
+    return misses
 
-    # Convert result to JSON
-    transform_response_reader = csv.DictReader(StringIO(transform_response.text))
 
-    # Replace blank key with ID and append to list for later jsonification
-    rows = [
-        {"ID" if key == "" else key: value for key, value in row.items()}
-        for row in transform_response_reader
+# A requests session shared by all coding batches, so connections to the coding
+# services are pooled (one per worker) instead of opened for every request
+def coding_session(workers=CODING_WORKERS):
+    session = requests.Session()
+    adapter = requests.adapters.HTTPAdapter(pool_maxsize=max(workers, 1))
+    session.mount("http://", adapter)
+    session.mount("https://", adapter)
+    return session
+
+
+# The transform backend to use (see PYCROSS_BACKEND)
+def pycross_backend():
+    if PYCROSS_BACKEND == "auto":
+        return "http" if pycross_transform is None else "local"
+    if PYCROSS_BACKEND == "local" and pycross_transform is None:
+        raise ImproperlyConfigured("PYCROSS_BACKEND is local but pycrossva is missing")
+    return PYCROSS_BACKEND
+
+
+# pyCrossVA output values as InterVA5 expects them: 1.0 (present) becomes y, 0.0
+# (absent) becomes . and anything else is kept, with missing values left blank
+def _interva_value(value):
+    return {"1.0": "y", "0.0": "."}.get(value, value)
+
+
+# Transform a batch's pyCrossVA input rows into InterVA5 input rows, each with its
+# 1-based position in the batch as ID (see save_interva5_results)
+def transform_batch(rows, session=None):
+    if pycross_backend() == "local":
+        return _transform_local(rows)
+    return _transform_http(rows, session)
+
+
+def _transform_http(rows, session=None):
+    http = session or requests
+
+    # Transform to algorithm format using the pyCrossVA web service
+    source, target = PYCROSS_MAPPING
+    transform_url = f"{PYCROSS_HOST}/transform?input={source}&output={target}"
+    transform_response = http.post(
+        transform_url, data=pycross_input(rows).encode("utf-8")
+    )
+    transform_response.raise_for_status()
+
+    # Replace blank key with ID, as the service returns the rows' index under it
+    return [
+        {
+            "ID" if key == "" else key: _interva_value(value)
+            for key, value in row.items()
+        }
+        for row in csv.DictReader(StringIO(transform_response.text))
     ]
 
-    result_json = json.dumps({"Input": rows, **ALGORITHM_SETTINGS})
 
-    # This is to get to the data into required algorithm format for interva5
-    result_json = result_json.replace('"0.0"', '"."').replace('"1.0"', '"y"')
+# Transform with the pyCrossVA library, skipping the CSV round trips to and from
+# the web service
+def _transform_local(rows):
+    columns = [f"-{field}" for field in pycross_fields()]
+    # values as the service reads them from the CSV: blanks are missing
+    raw_data = pd.DataFrame.from_records(
+        [
+            [None if row[col] in (None, "") else str(row[col]) for col in columns]
+            for row in rows
+        ],
+        columns=columns,
+    )
+    output = pycross_transform(PYCROSS_MAPPING, raw_data, verbose=0)
+    return [
+        {"ID": str(position), **{key: _local_value(v) for key, v in row.items()}}
+        for position, row in enumerate(output.to_dict(orient="records"), start=1)
+    ]
 
-    algorithm_url = f"{INTERVA_HOST}/interva5"
-    algorithm_response = requests.post(algorithm_url, data=result_json)
-    return json.loads(algorithm_response.text)
 
+# pyCrossVA library output value as the service would have written it to CSV
+def _local_value(value):
+    if pd.isna(value):
+        return ""
+    if isinstance(value, (bool, int, float)):
+        return _interva_value(str(float(value)))
+    return str(value)
 
-def run_coding_algorithms():
-    # Load all verbal autopsies that don't have a cause coding
-    # TODO: This should eventually check to see that there's a cause coding for
-    # every supported algorithm
 
-    print(f"ALGORITHM SETTINGS: {ALGORITHM_SETTINGS}")
+# Code InterVA5 input rows with the given settings
+def _post_interva5(input_rows, settings, session=None):
+    http = session or requests
+    result_json = json.dumps({"Input": input_rows, **settings})
+
+    algorithm_url = f"{INTERVA_HOST}/interva5"
+    algorithm_response = http.post(algorithm_url, data=result_json)
+    algorithm_response.raise_for_status()
+    return json.loads(algorithm_response.text)
 
-    causes_list = []
-    issues_list = []
-    verbal_autopsies_without_causes_list = []
 
-    # Determine number of iterations necessary for large lists of verbal autopsies
-    count = VerbalAutopsy.objects.filter(causes__isnull=True).count()
-    batch_size = 500
-    batches = ceil(count / batch_size)
+# Call func, retrying if the coding services fail or time out
+def _with_retries(retries, func, *args):
+    for attempt in range(retries + 1):
+        try:
+            return func(*args)
+        except (requests.RequestException, ValueError) as error:
+            if attempt == retries:
+                raise
+            print(f"WARNING: coding request failed ({error}), retrying...")
+
+
+# The coding part of a batch that doesn't touch the db, so it's safe to run in
+# worker threads. The batch's rows are transformed once, each distinct input
+# row only once, and the output is shared by its runs: (settings, positions of
+# the rows to code) pairs, posted to InterVA5 in parallel. Returns the result of
+# each run, or the error it failed with; a failed transform fails them all.
+def _code_batch(rows, runs, session=None, retries=CODING_RETRIES):
+    keys = [transform_input_hash(row) for row in rows]
+    needed = {
+        keys[position]: rows[position]
+        for _, positions in runs
+        for position in positions
+    }
+    output = _with_retries(retries, transform_batch, list(needed.values()), session)
+    transformed = {
+        key: {column: v for column, v in row.items() if column != "ID"}
+        for key, row in zip(needed, output)
+    }
 
-    for i in range(batches):
-        batch_start = i * batch_size
-        batch_end = (i + 1) * batch_size
-        verbal_autopsies_without_causes = list(
-            VerbalAutopsy.objects.filter(causes__isnull=True)[batch_start:batch_end]
+    def code(settings, positions):
+        input_rows = [
+            {"ID": str(number), **transformed[keys[position]]}
+            for number, position in enumerate(positions, start=1)
+        ]
+        return _with_retries(retries, _post_interva5, input_rows, settings, session)
+
+    with ThreadPoolExecutor(max_workers=len(runs)) as pool:
+        futures = [
+            pool.submit(code, settings, positions) for settings, positions in runs
+        ]
+    # failed requests are returned, other errors raised
+    return [
+        (
+            error
+            if isinstance(
+                error := future.exception(), (requests.RequestException, ValueError)
+            )
+            else future.result()
         )
-        causes, issues = run_interva5(verbal_autopsies_without_causes)
+        for future in futures
+    ]
 
-        causes_list += causes
-        issues_list += issues
-        verbal_autopsies_without_causes_list += verbal_autopsies_without_causes
 
-    return {
-        "verbal_autopsies": verbal_autopsies_without_causes_list,
-        "causes": causes_list,
-        "issues": issues_list,
-    }
+# Yields batches of the ids of VAs without a cause coding for at least one of the
+# given variants (see variant_key), in id order. Pages by id rather than by
+# offset: coded VAs drop out of the filtered set as the run goes, which would
+# make offsets skip records. Only VAs that existed when the run started are
+# coded, and only those in id_range (first and last id, inclusive; a last id of
+# None leaves the range open-ended) if one is given.
+def _uncoded_batches(batch_size, id_range=None, variants=("",)):
+    missing = [
+        ~Exists(
+            CauseOfDeath._base_manager.filter(
+                verbalautopsy=OuterRef("pk"), variant=variant
+            )
+        )
+        for variant in variants
+    ]
+    uncoded = VerbalAutopsy.objects.filter(reduce(or_, missing)).order_by("id")
+    if id_range:
+        uncoded = uncoded.filter(id__gte=id_range[0])
+        if id_range[1] is not None:
+            uncoded = uncoded.filter(id__lte=id_range[1])
+    last_id = uncoded.values_list("id", flat=True).last()
+    if last_id is None:
+        return
+    after_id = 0
+    while after_id < last_id:
+        batch = list(
+            uncoded.filter(id__gt=after_id, id__lte=last_id).values_list(
+                "id", flat=True
+            )[:batch_size]
+        )
+        if not batch:
+            return
+        after_id = batch[-1]
+        yield batch
+
+
+# Split the VAs without a cause coding (for the default settings) into id ranges
+# (first and last id, inclusive) of up to chunk_size VAs each, to be coded
+# independently. Coding a range only touches its VAs that are still uncoded, so a
+# range can be re-run after a failure without recoding the rest. Only VAs from
+# from_id on are included, so recently imported VAs can be coded without scanning
+# older ones.
+def uncoded_id_ranges(chunk_size=CODING_CHUNK_SIZE, from_id=None):
+    id_range = (from_id, None) if from_id else None
+    return [
+        [batch[0], batch[-1]]
+        for batch in _uncoded_batches(max(chunk_size, 1), id_range)
+    ]
 
 
-def run_interva5(verbal_autopsies_without_causes):
-    interva_response_data = _run_pycross_and_interva5(verbal_autopsies_without_causes)
+def run_coding_algorithms(
+    batch_size=CODING_BATCH_SIZE,
+    workers=CODING_WORKERS,
+    retries=CODING_RETRIES,
+    reuse_results=CODING_REUSE_RESULTS,
+    id_range=None,
+    settings_variants=None,
+):
+    # Load all verbal autopsies that don't have a cause coding (in id_range, if
+    # given)
+    # TODO: This should eventually check to see that there's a cause coding for
+    # every supported algorithm
 
+    # Each VA is coded once per variant of the algorithm settings (e.g. for a
+    # sensitivity analysis), getting a cause for each. A VA is coded with the
+    # variants it has no cause for yet, so variants that failed or were added
+    # since it was coded are caught up on
+    settings_variants = settings_variants or [ALGORITHM_SETTINGS]
+    for settings in settings_variants:
+        print(f"ALGORITHM SETTINGS: {settings}")
+    variants = [variant_key(settings) for settings in settings_variants]
+
+    # VAs are referred to by id throughout: they're only ever loaded as the
+    # columns sent to pyCrossVA. With several settings variants, VAs are listed
+    # once per variant they were coded (or failed to be coded) with
+    results = {
+        "verbal_autopsies": [],
+        "causes": [],
+        "issues": [],
+        "failed": [],
+        "reused": [],
+    }
+    workers = max(workers, 1)
+
+    # Batches are read and their results saved on this thread; only the requests
+    # to the coding services run in the pool, with at most `workers` in flight
+    in_flight = {}
+    session = coding_session(workers)
+    with session, ThreadPoolExecutor(max_workers=workers) as pool:
+        for va_ids in _uncoded_batches(batch_size, id_range, variants):
+            rows = pycross_rows(va_ids)
+            coded = set(
+                CauseOfDeath._base_manager.filter(
+                    verbalautopsy_id__in=va_ids, variant__in=variants
+                ).values_list("verbalautopsy_id", "variant")
+            )
+            runs = []
+            for settings, variant in zip(settings_variants, variants):
+                hashes = [coding_input_hash(row, settings) for row in rows]
+                positions = [
+                    position
+                    for position, va_id in enumerate(va_ids)
+                    if (va_id, variant) not in coded
+                ]
+                if reuse_results and positions:
+                    misses = _reuse_results(
+                        [va_ids[position] for position in positions],
+                        [hashes[position] for position in positions],
+                        results,
+                        settings,
+                    )
+                    positions = [positions[miss] for miss in misses]
+                if positions:
+                    runs.append((settings, positions, hashes))
+            if not runs:
+                continue
+            if len(in_flight) >= workers:
+                _save_finished_batches(in_flight, results, FIRST_COMPLETED)
+            future = pool.submit(
+                _code_batch,
+                rows,
+                [(settings, positions) for settings, positions, _ in runs],
+                session,
+                retries,
+            )
+            in_flight[future] = (va_ids, runs)
+        _save_finished_batches(in_flight, results, ALL_COMPLETED)
+
+    return results
+
+
+# Wait for coding requests in flight to finish and save their results. Batches
+# (or settings variants of them) that still failed after their retries are
+# recorded as failed and left uncoded
+def _save_finished_batches(in_flight, results, return_when):
+    done, _ = wait(in_flight, return_when=return_when)
+    for future in done:
+        va_ids, runs = in_flight.pop(future)
+        try:
+            run_results = future.result()
+        except (requests.RequestException, ValueError) as error:
+            run_results = [error] * len(runs)
+        for (settings, positions, hashes), interva_response_data in zip(
+            runs, run_results
+        ):
+            run_va_ids = [va_ids[position] for position in positions]
+            if isinstance(interva_response_data, Exception):
+                print(
+                    f"ERROR: could not code batch ({interva_response_data}), skipping"
+                )
+                results["failed"].extend(run_va_ids)
+                continue
+            causes, issues = save_interva5_results(
+                run_va_ids,
+                interva_response_data,
+                [hashes[position] for position in positions],
+                settings,
+            )
+            results["causes"].extend(causes)
+            results["issues"].extend(issues)
+            results["verbal_autopsies"].extend(run_va_ids)
+
+
+def run_interva5(va_ids, session=None):
+    rows = pycross_rows(va_ids)
+    [interva_response_data] = _code_batch(
+        rows, [(ALGORITHM_SETTINGS, range(len(rows)))], session, retries=0
+    )
+    if isinstance(interva_response_data, Exception):
+        raise interva_response_data
+    return save_interva5_results(
+        va_ids,
+        interva_response_data,
+        [coding_input_hash(row) for row in rows],
+    )
+
+
+# Save the causes and issues InterVA5 returned for a batch of VAs coded with the
+# given settings, along with the hashes of their inputs
+def save_interva5_results(
+    va_ids, interva_response_data, input_hashes=None, settings=ALGORITHM_SETTINGS
+):
     # The ID that comes back is the index in the data that was passed in.
-    # Use that to look up the matching VA in the verbal_autopsies_without_causes list.
+    # Use that to look up the matching VA id in the va_ids list.
     causes = []
     for cause_data in interva_response_data["results"]["VA5"]:
         cause = cause_data["CAUSE1"][0].strip()
@@ -159,44 +633,48 @@ def run_interva5(verbal_autopsies_without_causes):
 
         if cause:
             va_offset = int(cause_data["ID"][0].strip())
-            va_id = verbal_autopsies_without_causes[va_offset - 1].id
+            va_id = va_ids[va_offset - 1]
             causes.append(
                 CauseOfDeath(
                     verbalautopsy_id=va_id,
                     cause=cause,
                     algorithm="InterVA5",
-                    settings=ALGORITHM_SETTINGS,
+                    settings=settings,
+                    variant=variant_key(settings),
+                    input_hash=input_hashes[va_offset - 1] if input_hashes else "",
                 )
             )
 
     causes = bulk_create_with_history(causes, CauseOfDeath)
 
     # The ID that comes back is the index in the data that was passed in.
-    # Use that to look up the matching VA in the verbal_autopsies_without_causes list.
+    # Use that to look up the matching VA id in the va_ids list.
     issues = []
     for severity in CauseCodingIssue.SEVERITY_OPTIONS:
         for issue in interva_response_data[severity + "s"]:
             if isinstance(issue, list):
                 issue = issue[0]
             va_offset, issue_text = re.split("  +", issue, maxsplit=1)
-            va_id = verbal_autopsies_without_causes[int(va_offset) - 1].id
+            va_id = va_ids[int(va_offset) - 1]
             # TODO: For now, clear old issues for records that are newly coded;
             #       if we associate errors w/ runs we may prefer not to do this
-            # use exclude to keep errors related to the raw data
+            # use exclude to keep errors related to the raw data, and only clear
+            # issues from these settings, so variants don't clear each other's
             # TODO: build out the issue model to capture non coding errors
-            CauseCodingIssue.objects.filter(verbalautopsy_id=va_id).exclude(
-                algorithm=""
-            ).delete()
+            CauseCodingIssue.objects.filter(
+                verbalautopsy_id=va_id, settings=settings
+            ).exclude(algorithm="").delete()
             issues.append(
                 CauseCodingIssue(
                     verbalautopsy_id=va_id,
                     text=issue_text,
                     severity=severity,
                     algorithm="InterVA5",
-                    settings=ALGORITHM_SETTINGS,
+                    settings=settings,
                 )
             )
 
     CauseCodingIssue.objects.bulk_create(issues)
+    refresh_dashboard_rollup(va_ids)
 
     return causes, issues
@@ -1,5 +1,6 @@
 import re
-from datetime import datetime
+from datetime import date, datetime
+from functools import lru_cache
 
 import numpy as np
 import pandas as pd
@@ -8,6 +9,9 @@ from config.settings.base import DATE_FORMATS
 
 DATE_FORMATS = DATE_FORMATS.keys()
 NULL_STRINGS = ["nan", "dk"]
+# how many distinct raw date strings to remember parse results for. Dates in VA
+# data are massively repeated so even a modest cache absorbs most of the work
+DATE_CACHE_SIZE = 2**16
 
 
 # helper method to parse dates in a variety of formats
@@ -15,41 +19,58 @@ def parse_date(date_str, formats=DATE_FORMATS, strict=False, return_format="%Y-%
     if isinstance(date_str, str):
         if len(date_str) == 0 or date_str.lower() in ["dk", "nan"]:
             return "dk"
-        else:
-            # try parsing using a variety of date formats
-            for fmt in formats:
-                try:
-                    # remove any excessive decimals at end of string
-                    date_str = date_str.split(".")[0]
-                    return (
-                        datetime.strptime(date_str, fmt)
-                        .astimezone()
-                        .date()
-                        .strftime(return_format)
-                    )
-                except ValueError:
-                    pass
-            # if we get here, all hardcoded patterns failed - try timestamp regex
-            # if time time separator T present, strip out time and pull solely date
-            if len(re.findall(r"\dT\d", date_str)) > 0:
-                return re.split(r"T\d", date_str)[0]
-            # if regex patterns not found, try pandas's to_datetime util as last resort
-            else:
-                try:
-                    return pd.to_datetime(date_str).date().strftime(return_format)
-                # Intent is only to handle exception with custom error or pass-through
-                except Exception as e:
-                    # if we get here, couldn't parse the date. If strict, raise error.
-                    # Otherwise, return original string
-                    if strict:
-                        raise ValueError(
-                            f"no valid date format found for date string {date_str}"
-                        ) from e
-                    else:
-                        return str(date_str)
+        parsed, valid = _parse_date_str(date_str, tuple(formats), return_format)
+        # if we get here, couldn't parse the date. If strict, raise error.
+        # Otherwise, return original string
+        if not valid and strict:
+            raise ValueError(f"no valid date format found for date string {parsed}")
+        return parsed
     return "dk"
 
 
+# memoized core of parse_date. Returns the parsed string and whether parsing
+# succeeded
+@lru_cache(maxsize=DATE_CACHE_SIZE)
+def _parse_date_str(date_str, formats, return_format):
+    if formats:
+        # remove any excessive decimals at end of string
+        date_str = date_str.split(".")[0]
+    # try parsing using a variety of date formats
+    for fmt in formats:
+        parsed = _strptime(date_str, fmt, return_format)
+        if parsed is not None:
+            return parsed, True
+    # if we get here, all hardcoded patterns failed - try timestamp regex
+    # if time time separator T present, strip out time and pull solely date
+    if len(re.findall(r"\dT\d", date_str)) > 0:
+        return re.split(r"T\d", date_str)[0], True
+    # if regex patterns not found, try pandas's to_datetime util as last resort
+    try:
+        return pd.to_datetime(date_str).date().strftime(return_format), True
+    # Intent is only to handle exception with custom error or pass-through
+    except Exception:
+        return str(date_str), False
+
+
+def _strptime(date_str, fmt, return_format):
+    try:
+        return (
+            datetime.strptime(date_str, fmt).astimezone().date().strftime(return_format)
+        )
+    except ValueError:
+        return None
+
+
+# vectorized version of parse_date for a series (or list) of date strings. Each
+# distinct value is only parsed once and the results are mapped back onto the
+# series; missing values come back as "dk" just like parse_date
+def parse_dates(dates, **kwargs):
+    if isinstance(dates, list):
+        dates = pd.Series(dates, dtype=object)
+    parsed = {date: parse_date(date, **kwargs) for date in dates.dropna().unique()}
+    return dates.map(parsed).fillna("dk")
+
+
 # vectorized method to extract dates from datetime strings
 def to_dt(dates, utc=True):
     if isinstance(dates, list):
@@ -92,5 +113,18 @@ def get_interview_date(va_data, empty_string=None, parse=False):
         return parse_date(va_data.Id10012) if parse else va_data.Id10012
 
 
+# parse a date string (or date/datetime) into a date, or None if it's unknown or
+# can't be parsed
+def to_date(value):
+    if isinstance(value, datetime):
+        return value.date()
+    if isinstance(value, date):
+        return value
+    try:
+        return date.fromisoformat(parse_date(value))
+    except ValueError:
+        return None
+
+
 def empty_dates(va_df, date_col="Id10012", null_strings=NULL_STRINGS):
     return (pd.isna(va_df[date_col])) | (va_df[date_col].isin(null_strings))
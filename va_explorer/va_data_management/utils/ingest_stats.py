@@ -0,0 +1,63 @@
+import resource
+import time
+
+# Stages of a VA import, in the order load_records_from_dataframe runs them
+INGEST_STAGES = [
+    "normalize",
+    "dates",
+    "locations",
+    "dedupe",
+    "insert",
+    "validate",
+    "duplicates",
+    "rollup",
+]
+
+
+class IngestStats:
+    """
+    Wall-clock time spent in each stage of a VA import, plus row counts, so slow
+    stages can be spotted as data volumes grow. Stages are timed with lap(): the
+    time since the previous lap goes to the named stage. Time measured with add()
+    inside a lap (e.g. per-row work interleaved with another stage) goes to its own
+    stage instead.
+    """
+
+    def __init__(self):
+        self.stages = dict.fromkeys(INGEST_STAGES, 0.0)
+        self.rows = 0
+        self._lap_start = time.perf_counter()
+        self._added = 0.0
+
+    def lap(self, stage):
+        now = time.perf_counter()
+        self.stages[stage] += now - self._lap_start - self._added
+        self._lap_start = now
+        self._added = 0.0
+
+    def add(self, stage, seconds):
+        self.stages[stage] += seconds
+        self._added += seconds
+
+    # add another run's (e.g. a batch's) timings and counts to these
+    def merge(self, other):
+        for stage, seconds in other.stages.items():
+            self.stages[stage] = self.stages.get(stage, 0.0) + seconds
+        self.rows += other.rows
+
+    def as_dict(self):
+        seconds = sum(self.stages.values())
+        return {
+            "rows": self.rows,
+            "seconds": round(seconds, 3),
+            "rows_per_second": round(self.rows / seconds, 1) if seconds else None,
+            "stages": {stage: round(t, 3) for stage, t in self.stages.items()},
+            "process_peak_memory_kb": process_peak_memory_kb(),
+        }
+
+
+# Peak resident memory of this process over its whole lifetime so far, not just
+# the import (ru_maxrss is in KB on Linux). In a long-lived worker it can come from
+# an earlier task, so it only ever goes up between runs
+def process_peak_memory_kb():
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
@@ -1,15 +1,23 @@
-from urllib.parse import urlparse
+import json
+import threading
+from queue import Empty, Full, Queue
+from urllib.parse import quote, urlparse
 
 import environ
 import pandas as pd
 import requests
 from requests.auth import HTTPBasicAuth
 
+from va_explorer.va_data_management.models import SyncCursor
+
 env = environ.Env()
 USE_GATEWAY = env.bool("USE_GATEWAY", default=False)
 KOBO_HOST = env("KOBO_HOST", default="http://127.0.0.1:6001")
 # Don't verify localhost (self-signed cert)
 SSL_VERIFY = env.bool("KOBO_SSL_VERIFY", default=("localhost" in KOBO_HOST))
+# Number of pages downloaded ahead in the background while earlier pages are being
+# loaded into the database. 0 downloads each page only once it is needed
+PREFETCH_PAGES = env.int("KOBO_PREFETCH_PAGES", default=2)
 
 # TODO: Further support Kobo integration by creating an endpoint for VAs coming
 #       in via REST Services feature (uploaded as soon as they're filled out)
@@ -38,7 +46,9 @@ def get_kobo_api_token(username, password):
     return {"Authorization": f"Token {token}"}
 
 
-def download_responses(token, asset_id, batch_size=5000, next_page=None):
+def download_responses(
+    token, asset_id, batch_size=5000, next_page=None, query=None, session=None
+):
     if not token or not asset_id:
         raise AttributeError(
             "Must specify either --token and --asset_id arguments or "
@@ -48,6 +58,9 @@ def download_responses(token, asset_id, batch_size=5000, next_page=None):
     # Support advanced networking setups by allowing explicit use of external
     # docker network gateways
     params = "?format=json" + f"&limit={batch_size}" + "&start=0&sort={%22_id%22:-1}"
+    # optionally only request submissions matching a (mongo style) query
+    if query:
+        params += f"&query={quote(json.dumps(query))}"
     if USE_GATEWAY:
         DOCKER_GATEWAY = env("DOCKER_GATEWAY", default="https://172.18.0.1")
         if next_page is None:
@@ -64,7 +77,10 @@ def download_responses(token, asset_id, batch_size=5000, next_page=None):
         )
         headers = {"Authorization": f"Token {token}"}
 
-    response = requests.get(resource_uri, headers=headers, verify=SSL_VERIFY)
+    # a shared session keeps the connection alive between pages
+    response = (session or requests).get(
+        resource_uri, headers=headers, verify=SSL_VERIFY
+    )
     response.raise_for_status()
     data = response.json()
     if "results" in data:
@@ -80,3 +96,124 @@ def download_responses(token, asset_id, batch_size=5000, next_page=None):
         return pd.DataFrame(parsed_results), next_results
     else:
         return pd.DataFrame([]), None
+
+
+# Download all pages of responses for an asset, one dataframe at a time. Unless a
+# full resync is requested, only submissions added or approved/rejected since the
+# last sync are requested. Kobo doesn't timestamp edits (an edited submission keeps
+# its _id and _submission_time), so edits are only picked up by a full resync,
+# which is scheduled weekly (see tasks.py). The asset's sync cursor is only advanced once every page has been
+# consumed, so an interrupted import will pick up the same submissions next time.
+# Up to `prefetch` pages are downloaded ahead in a background thread so the network
+# and the database are kept busy at the same time.
+def sync_responses(
+    token, asset_id, batch_size=5000, full_resync=False, prefetch=PREFETCH_PAGES
+):
+    if not token or not asset_id:
+        raise AttributeError(
+            "Must specify either --token and --asset_id arguments or "
+            "KOBO_API_TOKEN and KOBO_ASSET_ID environment variables."
+        )
+    cursor, _ = SyncCursor.objects.get_or_create(source="kobo", resource_id=asset_id)
+    query = None if full_resync else get_sync_query(cursor)
+
+    with requests.Session() as session:
+        pages = _download_pages(token, asset_id, batch_size, query, session)
+        if prefetch > 0:
+            pages = _prefetch(pages, prefetch)
+        try:
+            for data in pages:
+                cursor.advance(*_get_watermark(data))
+                yield data
+        finally:
+            # stop any background downloads if we're interrupted
+            pages.close()
+
+    cursor.save()
+
+
+# newest submission _id, _submission_time and validation status change in a page
+# of responses
+def _get_watermark(data):
+    last_id, last_submission_time, last_validation_time = None, None, None
+    if "_id" in data and data["_id"].notna().any():
+        last_id = int(data["_id"].max())
+    if "_submission_time" in data and data["_submission_time"].notna().any():
+        last_submission_time = data["_submission_time"].dropna().max()
+    if "_validation_status" in data:
+        validation_times = data["_validation_status"].map(
+            lambda status: status.get("timestamp") if isinstance(status, dict) else None
+        )
+        if validation_times.notna().any():
+            last_validation_time = int(validation_times.dropna().max())
+    return last_id, last_submission_time, last_validation_time
+
+
+def _download_pages(token, asset_id, batch_size, query, session):
+    next_page = None
+    while True:
+        data, next_page = download_responses(
+            token, asset_id, batch_size, next_page, query, session
+        )
+        yield data
+        if next_page is None:
+            break
+
+
+# Iterate over pages while a background thread fetches up to `size` pages ahead.
+# Errors raised while fetching are re-raised here, in the order they happened.
+def _prefetch(pages, size):
+    queue = Queue(maxsize=size)
+    stopped = threading.Event()
+
+    def put(item):
+        # give up if the consumer has stopped listening so the thread can exit
+        while not stopped.is_set():
+            try:
+                queue.put(item, timeout=0.1)
+                return True
+            except Full:
+                continue
+        return False
+
+    def produce():
+        try:
+            for page in pages:
+                if not put(("page", page)):
+                    return
+        except Exception as err:
+            put(("error", err))
+            return
+        put(("done", None))
+
+    producer = threading.Thread(target=produce, daemon=True)
+    producer.start()
+    try:
+        while True:
+            try:
+                kind, item = queue.get(timeout=0.1)
+            except Empty:
+                if not producer.is_alive() and queue.empty():
+                    return
+                continue
+            if kind == "error":
+                raise item
+            if kind == "done":
+                return
+            yield item
+    finally:
+        stopped.set()
+
+
+# query for submissions newer than the cursor's watermark, or None for everything
+def get_sync_query(cursor):
+    conditions = []
+    if cursor.last_id is not None:
+        conditions.append({"_id": {"$gt": cursor.last_id}})
+    if cursor.last_submission_time:
+        conditions.append({"_submission_time": {"$gt": cursor.last_submission_time}})
+    if cursor.last_validation_time is not None:
+        conditions.append(
+            {"_validation_status.timestamp": {"$gt": cursor.last_validation_time}}
+        )
+    return {"$or": conditions} if conditions else None
@@ -1,17 +1,33 @@
 import logging
 import random
+import time
 
 import numpy as np
 import pandas as pd
+from django.conf import settings
 from django.contrib.auth import get_user_model
 from django.core.cache import cache
+from django.db import IntegrityError, connection, transaction
 from django.db.models import Count, Max, Q
+from django.utils import timezone
 from simple_history.utils import bulk_create_with_history
 
 from va_explorer.users.utils.demo_users import make_field_workers_for_facilities
-from va_explorer.va_data_management.models import Location, VerbalAutopsy, SRSClusterLocation
-from va_explorer.va_data_management.utils.date_parsing import parse_date
+from va_explorer.va_analytics.utils.rollup import refresh_dashboard_rollup
+from va_explorer.va_data_management.models import (
+    ImportBatch,
+    SRSClusterLocation,
+    VerbalAutopsy,
+)
+from va_explorer.va_data_management.utils.copy_insert import (
+    copy_create,
+    copy_create_with_history,
+)
+from va_explorer.va_data_management.utils.date_parsing import parse_date, parse_dates
+from va_explorer.va_data_management.utils.ingest_stats import IngestStats
 from va_explorer.va_data_management.utils.location_assignment import (
+    DEFAULT_LOCATION_FIELDS,
+    LocationIndex,
     assign_va_location,
 )
 from va_explorer.va_data_management.utils.validate import validate_vas_for_dashboard
@@ -161,12 +177,184 @@ def load_odk_csv_to_model(
 
 
 
-# load VA records into django database
-def load_records_from_dataframe(record_df, random_locations=False, debug=False):
+class IngestContext:
+    """
+    State shared by every batch of a single import run (e.g. all pages of a Kobo
+    sync or all chunks of a csv): the facility location index, field workers for
+    random locations, the run's ImportBatch, timings of the run's stages
+    (IngestStats) and the VAs created so far. Lookups
+    are loaded once, on first use, instead of being re-queried for every batch.
+    Which records already exist is resolved per batch in the db (see
+    resolve_existing_records).
+    """
+
+    def __init__(self, location_index=None, source=""):
+        self._location_index = location_index
+        self._field_workers = None
+        self._import_batch = None
+        self.source = source
+        self.stats = IngestStats()
+        # ids and unique identifier hashes of the VAs created during this run
+        self.created_ids = []
+        self.identifiers = set()
+
+    @property
+    def location_index(self):
+        # batches can reference any facility, so index all of them
+        if self._location_index is None:
+            self._location_index = LocationIndex()
+        return self._location_index
+
+    @property
+    def field_workers(self):
+        if self._field_workers is None:
+            self._field_workers = [u for u in User.objects.all() if u.is_fieldworker()]
+            if len(self._field_workers) <= 1:
+                print(
+                    "WARNING: no field workers in system. \
+                    Generating random ones now..."
+                )
+                make_field_workers_for_facilities()
+                self._field_workers = [
+                    u for u in User.objects.all() if u.is_fieldworker()
+                ]
+        return self._field_workers
+
+    # created on first use, so runs that import nothing don't leave empty batches
+    @property
+    def import_batch(self):
+        if self._import_batch is None:
+            self._import_batch = ImportBatch.objects.create(source=self.source)
+        return self._import_batch
+
+    # record the VAs created by a committed batch
+    def commit_batch(self, created_vas):
+        for va in created_vas:
+            self.created_ids.append(va.id)
+            self.identifiers.add(va.unique_va_identifier)
+
+    # mark duplicates among the VAs sharing a hash with any VA created this run.
+    # The time taken is added to the given (e.g. a batch's) stats or the run's
+    def mark_duplicates(self, stats=None):
+        if VerbalAutopsy.auto_detect_duplicates():
+            print("Marking VAs as duplicate...")
+            start = time.perf_counter()
+            VerbalAutopsy.mark_duplicates(identifiers=self.identifiers)
+            (stats or self.stats).add("duplicates", time.perf_counter() - start)
+
+    # store the run's stats on its ImportBatch and return them. Runs that didn't
+    # get any rows (e.g. a sync with nothing new) don't leave an empty batch behind
+    def record_stats(self):
+        stats = self.stats.as_dict()
+        if not self.stats.rows and self._import_batch is None:
+            return stats
+        self.import_batch.stats = stats
+        self.import_batch.save(update_fields=["stats"])
+        return stats
+
+
+# Find which of a batch's instanceids and instancenames already belong to live VAs.
+# The batch is joined against the VA table in the db (backed by indexes on both
+# columns), so the cost depends on the size of the batch, not of the table.
+def resolve_existing_records(instanceids, instancenames=()):
+    table = VerbalAutopsy._meta.db_table
+    with connection.cursor() as cursor:
+        cursor.execute(
+            f"""
+            SELECT 'id', va.instanceid
+            FROM {table} va JOIN unnest(%s::text[]) AS batch(value)
+                ON va.instanceid = batch.value
+            WHERE va.deleted_at IS NULL AND va.instanceid <> ''
+            UNION
+            SELECT 'name', va.instancename
+            FROM {table} va JOIN unnest(%s::text[]) AS batch(value)
+                ON va.instancename = batch.value
+            WHERE va.deleted_at IS NULL
+            """,
+            [
+                list({str(v) for v in instanceids}),
+                list({str(v) for v in instancenames}),
+            ],
+        )
+        existing = cursor.fetchall()
+    return (
+        {value for kind, value in existing if kind == "id"},
+        {value for kind, value in existing if kind == "name"},
+    )
+
+
+# Soft delete the VAs in a queryset with a single UPDATE and record the deletion in
+# their history in bulk, rather than saving (and querying) each VA on its own.
+# Returns the deleted VAs.
+def soft_delete_with_history(queryset):
+    vas = list(queryset)
+    if vas:
+        # keep the imported version in the history of VAs with deferred history
+        VerbalAutopsy.materialize_history([va.pk for va in vas])
+        deleted_at = timezone.now()
+        VerbalAutopsy.objects.filter(pk__in=[va.pk for va in vas]).update(
+            deleted_at=deleted_at
+        )
+        for va in vas:
+            va.deleted_at = deleted_at
+        VerbalAutopsy.history.bulk_history_create(
+            vas, update=True, default_date=deleted_at
+        )
+    return vas
+
+
+# Returns the function used to insert new VAs: with COPY if VA_IMPORT_USE_COPY is
+# set, and without historical rows when their history is deferred
+def _va_writer(defer_history=False):
+    if settings.VA_IMPORT_USE_COPY:
+        if defer_history:
+            return lambda vas: copy_create(VerbalAutopsy, vas)
+        return lambda vas: copy_create_with_history(vas, VerbalAutopsy)
+    if defer_history:
+        return VerbalAutopsy.objects.bulk_create
+    return lambda vas: bulk_create_with_history(vas, VerbalAutopsy)
+
+
+# Insert new VAs (and their history). If an import batch is given, history is
+# deferred: the VAs reference the batch and their first historical row is only
+# written when they're first changed (see VerbalAutopsy.materialize_history).
+# The unique index on live instanceids makes a concurrent import of the same
+# submissions fail here instead of creating a second copy; if so, the VAs that now
+# exist are moved to ignored_vas and the insert is retried once.
+def _create_vas(created_vas, ignored_vas, import_batch=None):
+    if import_batch:
+        for va in created_vas:
+            va.import_batch = import_batch
+            va.history_deferred = True
+    create = _va_writer(defer_history=import_batch is not None)
+    try:
+        with transaction.atomic():
+            return create(created_vas)
+    except IntegrityError:
+        existing_ids, _ = resolve_existing_records(
+            [va.instanceid for va in created_vas if va.instanceid]
+        )
+        ignored_vas.extend(va for va in created_vas if va.instanceid in existing_ids)
+        created_vas[:] = [va for va in created_vas if va.instanceid not in existing_ids]
+        with transaction.atomic():
+            return create(created_vas)
+
+
+# load VA records into django database. Pass the same context to every call that
+# is part of one import run so lookups of existing data are shared between them
+def load_records_from_dataframe(
+    record_df,
+    random_locations=False,
+    debug=False,
+    mark_duplicates=True,
+    context=None,
+):
     logger = None if not debug else logging.getLogger("debug")
     if logger:
         header = "=" * 10 + "DATA INGEST" + "=" * 10
         logger.info(header)
+    stats = IngestStats()
+    stats.rows = len(record_df)
 
     # CSV can prefix column names with a strings and a dash or more. Examples:
     #     presets-Id10004
@@ -210,12 +398,17 @@ def load_records_from_dataframe(record_df, random_locations=False, debug=False):
     invalid_vas.extend(unrecoverable.iterrows())
     record_df.drop(labels=unrecoverable.index.values, axis=0)
 
-    missing_instancenames = record_df[record_df["instancename"].isnull()]
-    corrected_vas = []
-    for index, record in missing_instancenames.iterrows():
-        instancename = f"_Dec---{record['Id10017']} {record['Id10018']}_D.o.I---{record['Id10012']}"  # noqa: E501
-        record_df.at[index, "instancename"] = instancename
-        corrected_vas.append(index)
+    missing_instancenames = record_df["instancename"].isnull()
+    corrected_vas = record_df.index[missing_instancenames].tolist()
+    if missing_instancenames.any():
+        record_df.loc[missing_instancenames, "instancename"] = (
+            "_Dec---"
+            + record_df.loc[missing_instancenames, "Id10017"].astype(str)
+            + " "
+            + record_df.loc[missing_instancenames, "Id10018"].astype(str)
+            + "_D.o.I---"
+            + record_df.loc[missing_instancenames, "Id10012"].astype(str)
+        )
     record_df["instancename"] = record_df["instancename"].str.casefold()
 
     # Patch VAs that are missing Id10010 (Interviewer Name) with custom field fallbacks
@@ -240,10 +433,11 @@ def load_records_from_dataframe(record_df, random_locations=False, debug=False):
             )
         ]
         invalid_uuids = invalid["instanceid"].to_list() if len(invalid) > 0 else []
-        to_remove = VerbalAutopsy.objects.filter(instanceid__in=invalid_uuids)
-        for va in to_remove:
-            invalid_vas.append(va)
-        to_remove.delete()
+        invalid_vas.extend(
+            soft_delete_with_history(
+                VerbalAutopsy.objects.filter(instanceid__in=invalid_uuids)
+            )
+        )
         record_df = record_df.drop(labels=invalid.index.values, axis=0)
 
     print("de-duplicating fields...")
@@ -260,7 +454,27 @@ def load_records_from_dataframe(record_df, random_locations=False, debug=False):
         logger.debug("Missing fields: %s", missing_field_names)
         extra_field_names = csv_field_names.difference(common_field_names)
         logger.debug("Extra fields: %s", extra_field_names)
-    record_df = record_df[common_field_names]
+    record_df = record_df.filter(items=common_field_names)
+
+    # Column-wise cleanup of answers, done for the whole batch up front so the
+    # per-row work below is reduced to building model instances
+    record_df = format_multi_select_columns(record_df)
+    stats.lap("normalize")
+
+    # Try to parse date of death and interview date as datetimes. Otherwise, record
+    # the original string and add a record issue during validation
+    for date_field in ["Id10023", "Id10012"]:
+        if date_field in record_df.columns:
+            record_df[date_field] = parse_dates(record_df[date_field], strict=False)
+        else:
+            record_df[date_field] = "dk"
+        if logger:
+            logger.info(
+                "Parsed %s: %d distinct values",
+                date_field,
+                record_df[date_field].nunique(),
+            )
+    stats.lap("dates")
 
     # For each row, check to see if there is an instanceid.
     # If there is instanceid, try to find existing VA with that instanceid.
@@ -269,34 +483,28 @@ def load_records_from_dataframe(record_df, random_locations=False, debug=False):
     ignored_vas = []
     outdated_vas = []
     created_vas = []
-    location_map = {}
-
-    # build location mapper to map csv locations to known db locations
-    if "hospital" in record_df.columns:
-        hospitals = record_df["hospital"].unique().tolist()
-        location_map = {
-            key_name_pair[0]: key_name_pair[1]
-            for key_name_pair in Location.objects.filter(key__in=hospitals)
-            .only("name", "key")
-            .values_list("key", "name")
-        }
+
+    # a one-off load only needs to index the locations this batch refers to
+    if not context:
+        location_fields = record_df.columns.intersection(DEFAULT_LOCATION_FIELDS)
+        hospitals = pd.unique(record_df[location_fields].values.ravel())
+        context = IngestContext(
+            location_index=LocationIndex(
+                keys=[h for h in hospitals if isinstance(h, str) and h]
+            )
+        )
+    # build location index to map csv locations to known db locations
+    location_index = context.location_index
 
     # if random locations, assign random locations via a random field worker.
     if random_locations:
-        field_workers = [u for u in User.objects.all() if u.is_fieldworker()]
-        if len(field_workers) <= 1:
-            print(
-                "WARNING: no field workers in system. \
-                Generating random ones now..."
-            )
-            make_field_workers_for_facilities()
-            field_workers = [u for u in User.objects.all() if u.is_fieldworker()]
-
-    # pull in all existing VA instanceIDs from db for de-duping purposes
-    print("pulling in instance ids...")
-    va_instance_ids = set(VerbalAutopsy.objects.values_list("instanceid", flat=True))
-    va_instance_names = set(
-        VerbalAutopsy.objects.values_list("instancename", flat=True)
+        field_workers = context.field_workers
+    stats.lap("locations")
+
+    # instanceIDs/instanceNames of this batch that already exist in the db, for
+    # de-duping purposes. Only these are looked up, not every VA in the table
+    va_instance_ids, va_instance_names = resolve_existing_records(
+        record_df["instanceid"].dropna(), record_df["instancename"].dropna()
     )
 
     if debug:
@@ -306,10 +514,9 @@ def load_records_from_dataframe(record_df, random_locations=False, debug=False):
             # of instanceNames: {record_df.instancename.nunique()}"
         )
 
+    superseded_names = set()
     print("creating new VAs...")
     for i, row in enumerate(record_df.to_dict(orient="records")):
-        format_multi_select_fields(row)
-
         va = VerbalAutopsy(**row)
         # only import VA if its instanceId doesn't already exist
         if row["instanceid"]:
@@ -320,52 +527,25 @@ def load_records_from_dataframe(record_df, random_locations=False, debug=False):
             else:
                 # If VA "doesn't exist", it's still possible we have an edited VA,
                 # since kobo will change the uuid for an edited VA. Check if a
-                # previous instancename for this "new" VA exists and if so, delete
-                # the old one in favor of this new one
+                # previous instancename for this "new" VA exists and if so, mark
+                # the old one to be deleted in favor of this new one
                 if row["instancename"] in va_instance_names:
-                    outdated_va = VerbalAutopsy.objects.filter(
-                        instancename=row["instancename"]
-                    )
-                    outdated_vas.append(outdated_va)
-                    outdated_va.delete()
+                    superseded_names.add(row["instancename"])
 
                 va_instance_ids.add(row["instanceid"])
 
         # If we got here, we have a new, legit VA on our hands.
         va_id = row.get("instanceid", f"{i} of {record_df.shape[0]}")
 
-        # Try to parse date of death as as datetime. Otherwise, record string and
-        # add record issue during validation
-        parsed_date = parse_date(va.Id10023, strict=False)
-        if logger:
-            logger.info(
-                "va_id: %s - Parsed %s for Date of Death from %s",
-                va_id,
-                parse_date,
-                va.Id10023,
-            )
-        va.Id10023 = parsed_date
-
-        # Try to parse interview date as as datetime. Otherwise, record string and
-        # add record issue during validation
-        parsed_sub_date = parse_date(va.Id10012, strict=False)
-        if logger:
-            logger.info(
-                "va_id: %s - Parsed %s as Interview Date from %s",
-                va_id,
-                parsed_sub_date,
-                va.Id10012,
-            )
-        va.Id10012 = parsed_sub_date
-
         # if random_locations, assign random field worker to VA which can be used
         # to determine location.
         # Otherwise, try assigning location based on hospital field.
+        start = time.perf_counter()
         if random_locations:
             user = random.choice(field_workers)
             va.location = user.location_restrictions.first()
         else:
-            assign_va_location(va, location_map)
+            assign_va_location(va, location_index)
             if "hospital" in row and logger:
                 logger.info(
                     "va_id: %s - Matched hospital %s to %s location in DB",
@@ -373,24 +553,49 @@ def load_records_from_dataframe(record_df, random_locations=False, debug=False):
                     row["hospital"],
                     va.location,
                 )
+        stats.add("locations", time.perf_counter() - start)
 
         # Generate a unique_identifier_hash for each VA if the application is
         # configured to detect duplicate VAs
         if VerbalAutopsy.auto_detect_duplicates():
             va.generate_unique_identifier_hash()
+        # VAs are inserted in bulk without save(), so set the derived fields here
+        va.set_derived_fields()
         created_vas.append(va)
 
+    # delete all VAs replaced by an edited version in one go
+    if superseded_names:
+        outdated_vas.extend(
+            soft_delete_with_history(
+                VerbalAutopsy.objects.filter(instancename__in=superseded_names)
+            )
+        )
+    stats.lap("dedupe")
+
     print("populating DB...")
-    new_vas = bulk_create_with_history(created_vas, VerbalAutopsy)
+    new_vas = _create_vas(
+        created_vas,
+        ignored_vas,
+        context.import_batch if settings.VA_IMPORT_DEFER_HISTORY else None,
+    )
+    stats.lap("insert")
 
     print("Validating VAs...")
     # Add any errors to the db
-    validate_vas_for_dashboard(new_vas)
+    validate_vas_for_dashboard(new_vas, location_index)
+    context.commit_batch(new_vas)
+    stats.lap("validate")
 
     # Mark duplicate VAs if the application is configured to do so
-    if VerbalAutopsy.auto_detect_duplicates():
-        print("Marking VAs as duplicate...")
-        VerbalAutopsy.mark_duplicates()
+    # Only VAs sharing a hash with the newly created ones can have become duplicates
+    if mark_duplicates:
+        context.mark_duplicates(stats)
+    stats.lap("duplicates")
+
+    # recount the dashboard rollup where VAs were added or removed
+    refresh_dashboard_rollup([va.id for va in [*new_vas, *outdated_vas, *invalid_vas]])
+    stats.lap("rollup")
+    context.stats.merge(stats)
 
     return {
         "ignored": ignored_vas,
@@ -398,18 +603,55 @@ def load_records_from_dataframe(record_df, random_locations=False, debug=False):
         "created": created_vas,
         "corrected": corrected_vas,
         "removed": invalid_vas,
+        "stats": stats.as_dict(),
     }
 
 
+# load VA records into django database from an iterable of dataframes (e.x. the
+# reader returned by pd.read_csv(..., chunksize=n)). Each chunk is loaded and
+# committed on its own so memory usage is bounded by the chunk size rather than
+# the size of the whole export. Only counts (and the ingest context) are kept
+# between chunks.
+def load_records_in_chunks(
+    record_chunks, random_locations=False, debug=False, context=None
+):
+    counts = dict.fromkeys(
+        ["created", "ignored", "outdated", "corrected", "removed"], 0
+    )
+    context = context or IngestContext()
+
+    for i, record_df in enumerate(record_chunks):
+        with transaction.atomic():
+            results = load_records_from_dataframe(
+                record_df,
+                random_locations,
+                debug,
+                mark_duplicates=False,
+                context=context,
+            )
+        for key in counts:
+            counts[key] += len(results[key])
+        print(f"committed chunk {i + 1} ({counts['created']} VAs created so far)")
+
+    # duplicates can span chunks, so only mark them once everything is loaded
+    context.mark_duplicates()
+    counts["stats"] = context.stats.as_dict()
+
+    return counts
+
+
 # Change the response format of Multiselect questions from ODK (space-separated)
 # into the format that we expect for rendering in the UI (comma-separated)
-def format_multi_select_fields(row):
-    for multi_select_question in _checkbox_choices:
-        if multi_select_question in row and isinstance(row[multi_select_question], str):
-            # Convert to comma-separated
-            row[multi_select_question] = ",".join(
-                response for response in row[multi_select_question].split()
+def format_multi_select_columns(record_df):
+    multi_select_questions = record_df.columns.intersection(list(_checkbox_choices))
+    for multi_select_question in multi_select_questions:
+        responses = record_df[multi_select_question]
+        # .str is only available on text columns; non-text answers are left as is
+        if responses.dtype == object:
+            record_df[multi_select_question] = (
+                responses.str.split().str.join(",").fillna(responses)
             )
+    return record_df
 
 
 # combine fields ending with _other for their normal counterparts
@@ -454,20 +696,20 @@ def get_va_summary_stats(vas, filter_fields=False):
 
     # if filter_fields=True, filter down to only relevant fields
     if filter_fields:
-        vas = vas.only("created", "id", "location", "Id10023")
+        vas = vas.only("created", "id", "location", "death_date")
 
     # check cache for va summary stats and set it if not already there
     stats = cache.get("va_summary_stats")
     if not stats:
         stats = vas.aggregate(
             last_update=Max("created"),
-            last_interview=Max("Id10012"),
+            last_interview=Max("interview_date"),
             total_vas=Count("id"),
         )
         cache.set("va_summary_stats", stats, timeout=60 * 60)
 
     stats["ineligible_vas"] = vas.filter(
-        Q(Id10023__in=["DK", "dk"]) | Q(Id10023__isnull=True) | Q(location__isnull=True)
+        Q(death_date__isnull=True) | Q(location__isnull=True)
     ).count()
 
     # clean up dates if non-null
@@ -1,48 +1,95 @@
+from collections import defaultdict
+
 import pandas as pd
 from fuzzywuzzy import fuzz
 
-from va_explorer.va_data_management.models import Location
+from va_explorer.va_data_management.models import Location, VerbalAutopsy
+
+DEFAULT_LOCATION_FIELDS = ["hospital", "hospital_other"]
+
+
+class LocationIndex:
+    """
+    In-memory view of the facility tree used to match raw VA location values to
+    db Locations. Built with a couple of queries up front so assigning locations
+    to many VAs doesn't cost a query (or several) per VA. Pass keys to only index
+    the locations those raw values could map to.
+    """
+
+    def __init__(self, keys=None, null_name="Unknown"):
+        locations = Location.objects.all()
+        if keys is not None:
+            locations = locations.filter(key__in=set(keys))
+        # map raw location keys to db location names. Locations come back in tree
+        # order so if keys are repeated, the last one wins (as dict() would do)
+        self.key_map = dict(
+            locations.exclude(key="").only("name", "key").values_list("key", "name")
+        )
+
+        # all facilities that share a name, in tree order, for disambiguation
+        facilities = Location.objects.filter(location_type="facility")
+        if keys is not None:
+            facilities = facilities.filter(name__in=set(self.key_map.values()))
+        self.facilities = defaultdict(list)
+        for facility in facilities:
+            self.facilities[facility.name].append(facility)
+
+        self.null_name = null_name
+        self._null_location = None
+        self._matches = {}
+
+    # find the facility a VA with this raw location value belongs to (or None)
+    def lookup(self, raw_location, va=None):
+        db_location_name = self.key_map.get(raw_location, None)
+        if not db_location_name:
+            return None
+        # TODO: make this more generic to other location hierarchies
+        candidates = self.facilities.get(db_location_name, [])
+        if len(candidates) <= 1:
+            return candidates[0] if candidates else None
+
+        # attempt to find specific facility based on match with other va location
+        # data. warn if that doesn't narrow it down completely
+        search_string = f"{va.province} Province/{va.area} District/{va.hospital}"
+        match_key = (db_location_name, search_string)
+        if match_key not in self._matches:
+            # same case-insensitive comparison as path_string__icontains
+            matches = [
+                facility
+                for facility in candidates
+                if facility.path_string
+                and search_string.upper() in facility.path_string.upper()
+            ]
+            if len(matches) > 1:
+                print(
+                    f"WARNING: ambiguous location: {search_string} "
+                    + "using most likely match"
+                )
+            # take first to get (ideally 1) Location out of the candidates
+            self._matches[match_key] = matches[0] if matches else None
+        return self._matches[match_key]
+
+    # the "Unknown" location, looked up (or created) once and reused
+    def null_location(self):
+        if self._null_location is None:
+            self._null_location = VerbalAutopsy.get_null_location(self.null_name)
+        return self._null_location
 
 
-def assign_va_location(va, location_mapper=None, location_fields=None):
+def assign_va_location(va, location_index=None, location_fields=None):
     # check if the hospital or place of death fields are known locations
-    location_fields = (
-        location_fields if location_fields else ["hospital", "hospital_other"]
-    )
+    location_fields = location_fields if location_fields else DEFAULT_LOCATION_FIELDS
     raw_location, db_location = None, None
     for location_field in location_fields:
         raw_location = va.__dict__.get(location_field, None)
         if raw_location:
             break
     if raw_location:
-        if not location_mapper:
-            # no mapper provided, create a one-off for this assignment
-            location_mapper = dict(
-                Location.objects.filter(key=raw_location)
-                .only("name", "key")
-                .values_list("key", "name")
-            )
-        db_location_name = location_mapper.get(raw_location, None)
+        if not location_index:
+            # no index provided, create a one-off for this assignment
+            location_index = LocationIndex(keys=[raw_location])
         # if matching db location, retrieve it. Otherwise, record location as unknown
-        if db_location_name:
-            # TODO: make this more generic to other location hierarchies
-            db_location = Location.objects.filter(
-                location_type="facility", name=db_location_name
-            )
-            if len(db_location) > 1:
-                # attempt to find specific facility based on match with other
-                # va location data. warn if that doesn't narrow it down completely
-                search_string = (
-                    f"{va.province} Province/{va.area} District/{va.hospital}"
-                )
-                db_location = db_location.filter(path_string__icontains=search_string)
-                if len(db_location) > 1:
-                    print(
-                        f"WARNING: ambiguous location: {search_string} "
-                        + "using most likely match"
-                    )
-            # need to take first anyway to get (ideally 1) Location out of QuerySet
-            db_location = db_location.first()
+        db_location = location_index.lookup(raw_location, va)
 
     # if any db location found, update VA with found location
     if db_location:
@@ -53,11 +100,29 @@ def assign_va_location(va, location_mapper=None, location_fields=None):
         and raw_location.lower() not in ["dk", "nan"]
     ):
         # if raw location detected but no db match, set to "Unknown"
-        va.set_null_location()
+        va.location = location_index.null_location()
     # otherwise, va.location will just be blank
     return va
 
 
+# assign locations to many VAs at once. Builds a single location index for all of
+# them (unless one is provided) so the whole batch only takes a handful of queries
+def assign_locations(vas, location_index=None, location_fields=None):
+    location_fields = location_fields if location_fields else DEFAULT_LOCATION_FIELDS
+    if not location_index:
+        keys = {
+            va.__dict__.get(location_field)
+            for va in vas
+            for location_field in location_fields
+        }
+        location_index = LocationIndex(
+            keys=[key for key in keys if isinstance(key, str) and key]
+        )
+    for va in vas:
+        assign_va_location(va, location_index, location_fields)
+    return vas
+
+
 def fuzzy_match(
     search,
     option_df,
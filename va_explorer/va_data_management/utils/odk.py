@@ -7,11 +7,18 @@ import requests
 import toml
 from pyodk import Client
 
+from va_explorer.va_data_management.models import SyncCursor
+
 env = environ.Env()
 
 ODK_HOST = env("ODK_HOST", default="http://127.0.0.1:5002")
 # Don't verify localhost (self-signed cert)
 SSL_VERIFY = env.bool("ODK_SSL_VERIFY", not ODK_HOST.startswith("https://localhost"))
+# Only request submissions received or edited since the last import (via OData) instead
+# of downloading every submission each time
+ODK_INCREMENTAL_SYNC = env.bool("ODK_INCREMENTAL_SYNC", default=False)
+# Number of submissions requested per OData page when syncing incrementally
+ODK_PAGE_SIZE = env.int("ODK_PAGE_SIZE", default=1000)
 
 
 def flatten_dict(item):
@@ -85,22 +92,16 @@ def download_responses(
     form_name=None,
     form_id=None,
     fmt="csv",
+    chunk_size=None,
 ):
-    if not project_name and not project_id:
-        raise AttributeError("Must specify either project_name or project_id argument.")
-
-    if not form_name and not form_id:
-        raise AttributeError("Must specify either form_name or form_id argument.")
+    _check_form_arguments(project_name, project_id, form_name, form_id)
 
     if fmt not in ["csv", "json"]:
         raise AttributeError("The fmt argument must either be json or csv.")
 
-    token = get_odk_login_token(email, password)
-
-    if not project_id:
-        project_id = get_odk_project_id(token, project_name)
-
-    form = get_odk_form(token, project_id, form_name, form_id)
+    token, project_id, form = _login_and_get_form(
+        email, password, project_name, project_id, form_name, form_id
+    )
 
     if fmt == "json":
         url = f'{ODK_HOST}/v1/projects/{project_id}/forms/{form["xmlFormId"]}.svc/Submissions'
@@ -114,6 +115,12 @@ def download_responses(
 
     if fmt == "csv":
         url = f'{ODK_HOST}/v1/projects/{project_id}/forms/{form["xmlFormId"]}/submissions.csv'
+        # stream large exports instead of holding the whole file in memory
+        if chunk_size:
+            response = requests.get(url, headers=token, verify=SSL_VERIFY, stream=True)
+            response.raise_for_status()
+            return _iter_csv_chunks(response, chunk_size)
+
         response = requests.get(url, headers=token, verify=SSL_VERIFY)
         response.raise_for_status()
         forms = pd.read_csv(BytesIO(response.content))
@@ -121,6 +128,103 @@ def download_responses(
         return forms
 
 
+# Download only the submissions received or edited since the last sync of this form,
+# page by page via the OData Submissions feed ($filter on __system/submissionDate and
+# __system/updatedAt, paged with $top/$skip). Yields a dataframe per page. The form's
+# sync cursor is only advanced once every page has been consumed, so an interrupted
+# import will request the same submissions again next time.
+def sync_responses(
+    email,
+    password,
+    project_name=None,
+    project_id=None,
+    form_name=None,
+    form_id=None,
+    page_size=ODK_PAGE_SIZE,
+    full_resync=False,
+):
+    _check_form_arguments(project_name, project_id, form_name, form_id)
+
+    token, project_id, form = _login_and_get_form(
+        email, password, project_name, project_id, form_name, form_id
+    )
+    url = (
+        f'{ODK_HOST}/v1/projects/{project_id}/forms/{form["xmlFormId"]}.svc/Submissions'
+    )
+    cursor, _ = SyncCursor.objects.get_or_create(
+        source="odk", resource_id=f'{project_id}/{form["xmlFormId"]}'
+    )
+    params = {"$top": page_size, "$orderby": "__system/submissionDate"}
+    if not full_resync and cursor.last_submission_time:
+        params["$filter"] = get_sync_filter(cursor)
+
+    skip = 0
+    while True:
+        response = requests.get(
+            url, headers=token, params={**params, "$skip": skip}, verify=SSL_VERIFY
+        )
+        response.raise_for_status()
+        records = response.json().get("value", [])
+        if records:
+            cursor.advance(last_submission_time=_latest_submission_time(records))
+            yield pd.DataFrame.from_records([flatten_dict(item) for item in records])
+        if len(records) < page_size:
+            break
+        skip += page_size
+
+    cursor.save()
+
+
+# OData filter for submissions received or edited after the cursor's watermark
+def get_sync_filter(cursor):
+    watermark = cursor.last_submission_time
+    return (
+        f"__system/submissionDate gt {watermark} or __system/updatedAt gt {watermark}"
+    )
+
+
+# most recent time any of the given OData submissions were received or edited
+def _latest_submission_time(records):
+    times = [
+        time
+        for item in records
+        for time in (
+            item.get("__system", {}).get("submissionDate"),
+            item.get("__system", {}).get("updatedAt"),
+        )
+        if time
+    ]
+    return max(times, default=None)
+
+
+def _check_form_arguments(project_name, project_id, form_name, form_id):
+    if not project_name and not project_id:
+        raise AttributeError("Must specify either project_name or project_id argument.")
+
+    if not form_name and not form_id:
+        raise AttributeError("Must specify either form_name or form_id argument.")
+
+
+def _login_and_get_form(email, password, project_name, project_id, form_name, form_id):
+    token = get_odk_login_token(email, password)
+
+    if not project_id:
+        project_id = get_odk_project_id(token, project_name)
+
+    form = get_odk_form(token, project_id, form_name, form_id)
+    return token, project_id, form
+
+
+# Yield submissions from a streamed csv response as dataframes of at most
+# chunk_size rows each
+def _iter_csv_chunks(response, chunk_size):
+    response.raw.decode_content = True
+    with response:
+        for forms in pd.read_csv(response.raw, low_memory=False, chunksize=chunk_size):
+            forms.columns = [c.rsplit("-", 1)[-1] for c in forms.columns]
+            yield forms
+
+
 def _make_client():
     """Create a pyODK Client based on environment configuration."""
     cfg = {
@@ -151,9 +255,42 @@ def pyodk_download_table(form_id):
     """Download submission table for a form as a DataFrame."""
     with _make_client().open() as client:
         data = client.submissions.get_table(form_id=form_id)
-        records = data.get("value", [])
-        if not records:
-            return pd.DataFrame()
-        df = pd.DataFrame.from_records(records)
-        df.columns = [c.rsplit("-", 1)[-1] for c in df.columns]
-        return df
+        return _table_to_dataframe(data.get("value", []))
+
+
+def pyodk_sync_table(form_id, page_size=ODK_PAGE_SIZE, full_resync=False):
+    """
+    Download the submissions of a form received or edited since its last sync,
+    yielding a DataFrame per page. The sync cursor is advanced once all pages
+    have been consumed.
+    """
+    with _make_client().open() as client:
+        cursor, _ = SyncCursor.objects.get_or_create(
+            source="odk", resource_id=f"{client.project_id}/{form_id}"
+        )
+        sync_filter = None
+        if not full_resync and cursor.last_submission_time:
+            sync_filter = get_sync_filter(cursor)
+
+        skip = 0
+        while True:
+            data = client.submissions.get_table(
+                form_id=form_id, filter=sync_filter, top=page_size, skip=skip
+            )
+            records = data.get("value", [])
+            if records:
+                cursor.advance(last_submission_time=_latest_submission_time(records))
+                yield _table_to_dataframe(records)
+            if len(records) < page_size:
+                break
+            skip += page_size
+
+    cursor.save()
+
+
+def _table_to_dataframe(records):
+    if not records:
+        return pd.DataFrame()
+    df = pd.DataFrame.from_records(records)
+    df.columns = [c.rsplit("-", 1)[-1] for c in df.columns]
+    return df
@@ -1,172 +1,222 @@
-from va_explorer.va_data_management.models import CauseCodingIssue
+import numpy as np
+import pandas as pd
+from django.db.models import QuerySet
+
+from va_explorer.va_data_management.models import CauseCodingIssue, Location
 from va_explorer.va_data_management.utils.date_parsing import parse_date
-from va_explorer.va_data_management.utils.location_assignment import assign_va_location
+from va_explorer.va_data_management.utils.location_assignment import assign_locations
+
+# fields that can determine a VA's age group. At least one must be "1"
+AGE_GROUP_FIELDS = [
+    "isNeonatal",
+    "isNeonatal1",
+    "isNeonatal2",
+    "isChild",
+    "isChild1",
+    "isChild2",
+    "isAdult",
+    "isAdult1",
+    "isAdult2",
+]
+# all VA fields the validation rules look at
+VALIDATION_FIELDS = [
+    "id",
+    "Id10023",
+    "ageInYears2",
+    "hospital",
+    "location_id",
+    *AGE_GROUP_FIELDS,
+]
+
+ISSUE_TEXTS = {
+    "age_not_a_number": (
+        "Warning: field ageInYears2, age was not provided or not a number."
+    ),
+    "no_age_group": "Warning: field age_group, no relevant data was found in \
+                fields; isNeonatal, isNeonatal1, isNeonatal2, isChild, isChild1, \
+                isChild2 isAdult, isAdult1, or isAdult2.",
+    "no_location": "ERROR: no location provided (or none detected)",
+    "inactive_location": "Warning: VA location was matched to facility known \
+                to be inactive. Consider updating the location to an active \
+                facility instead, or update the facility list.",
+    "other_location": "Warning: location field (parsed from hospital) \
+                was parsed as 'Other Facility'. May not fully show on \
+                dashboards until underlying data is corrected to actual location.",
+    "unknown_location": "ERROR: location field (parsed from hospital) did not \
+                match any known facilities in the facility list. VA Explorer set \
+                the location to 'Unknown.'  This VA will not show on \
+                dashboards until underlying data is corrected to actual location.",
+}
 
 
-def validate_vas_for_dashboard(verbal_autopsies):
+def validate_vas_for_dashboard(verbal_autopsies, location_index=None):
     # This validator is used to determine whether there is sufficient data to include
     # the record in the dashboard. Any errors or warnings are collected and reported
     # in the data manager.
     # The validation has to occur after the va's are created so we can reference
     # the va_id in the CauseCodingIssue.
     # The validator runs after va's are loaded and after a va is edited or reset.
+    # Rules are evaluated column-wise over the whole batch and issues are cleared
+    # and recreated with one statement each, no matter how many VAs are validated.
     # TODO: would it be possible to move this to the VA model clean function?
-    issues = []
-    for va in verbal_autopsies:
-        # clear all data related errors in case any were addressed
-        CauseCodingIssue.objects.filter(verbalautopsy_id=va.id, algorithm="").delete()
-
-        # Validate: date of death
-        # Id10023 is required for the dashboard time frame filters
-        # VA form guarantees this field is either "dk" or a valid datetime.date value
-        try:
-            va.Id10023 = parse_date(va.Id10023, strict=True)
-        except:  # noqa E722 - Intent is to save to db, not do anything with exception
-            issue_text = f"Error: field Id10023, couldn't parse date from {va.Id10023}"
-            issue = CauseCodingIssue(
-                verbalautopsy_id=va.id,
-                text=issue_text,
-                severity="error",
-                algorithm="",
-                settings="",
-            )
-            issues.append(issue)
-
-        # Validate: ageInYears2
-        # ageInYears2 is required for calculating mean age of death
-        try:
-            _ = int(float(va.ageInYears2))
-        except:  # noqa E722 - Intent is to save to db, not do anything with exception
-            issue_text = (
-                "Warning: field ageInYears2, age was not provided or not a number."
-            )
-            issue = CauseCodingIssue(
-                verbalautopsy_id=va.id,
-                text=issue_text,
-                severity="warning",
-                algorithm="",
-                settings="",
-            )
-            issues.append(issue)
-
-        # Validate: age
-        # age group can be determined from multiple fields, it's required for
-        # filtering demographics
-        if (
-            va.isNeonatal != 1
-            and va.isNeonatal != 1.0
-            and va.isNeonatal != "1"
-            and va.isNeonatal1 != 1
-            and va.isNeonatal1 != 1.0
-            and va.isNeonatal1 != "1"
-            and va.isNeonatal2 != 1
-            and va.isNeonatal2 != 1.0
-            and va.isNeonatal2 != "1"
-            and va.isChild != 1
-            and va.isChild != 1.0
-            and va.isChild != "1"
-            and va.isChild1 != 1
-            and va.isChild1 != 1.0
-            and va.isChild1 != "1"
-            and va.isChild2 != 1
-            and va.isChild2 != 1.0
-            and va.isChild2 != "1"
-            and va.isAdult != 1
-            and va.isAdult != 1.0
-            and va.isAdult != "1"
-            and va.isAdult1 != 1
-            and va.isAdult1 != 1.0
-            and va.isAdult1 != "1"
-            and va.isAdult2 != 1
-            and va.isAdult2 != 1.0
-            and va.isAdult2 != "1"
-        ):
-            issue_text = "Warning: field age_group, no relevant data was found in \
-                fields; isNeonatal, isNeonatal1, isNeonatal2, isChild, isChild1, \
-                isChild2 isAdult, isAdult1, or isAdult2."
-            issue = CauseCodingIssue(
-                verbalautopsy_id=va.id,
-                text=issue_text,
-                severity="warning",
-                algorithm="",
-                settings="",
-            )
-            issues.append(issue)
-
-        # Validate: location
-        # location is used to display the record on the map
-        if not va.location:
-            # try re-assigning location using location logic described in loading.py
-            va = assign_va_location(va)
-
-            # if still no location, record an error
-            if not va.location:
-                issue_text = "ERROR: no location provided (or none detected)"
-                issue = CauseCodingIssue(
-                    verbalautopsy_id=va.id,
-                    text=issue_text,
-                    severity="error",
-                    algorithm="",
-                    settings="",
-                )
-                issues.append(issue)
-
-        # if location is valid but inactive record a warning
-        if (
-            va.location
-            and not va.location.is_active
-            and va.location.name.casefold() != "unknown"
-            and va.hospital.casefold() != "other"
-        ):
-            issue_text = "Warning: VA location was matched to facility known \
-                to be inactive. Consider updating the location to an active \
-                facility instead, or update the facility list."
-            issue = CauseCodingIssue(
-                verbalautopsy_id=va.id,
-                text=issue_text,
-                severity="warning",
-                algorithm="",
-                settings="",
-            )
-            issues.append(issue)
-
-        # if location is "Other" (a valid, but non-informative location stemming
-        # stemming from bad data) record a warning
-        if (
-            va.location
-            and va.location.name.casefold() == "unknown"
-            and va.hospital.casefold() == "other"
-        ):
-            issue_text = "Warning: location field (parsed from hospital) \
-                was parsed as 'Other Facility'. May not fully show on \
-                dashboards until underlying data is corrected to actual location."
-            issue = CauseCodingIssue(
-                verbalautopsy_id=va.id,
-                text=issue_text,
-                severity="warning",
-                algorithm="",
-                settings="",
-            )
-            issues.append(issue)
-
-        # if location is "Unknown" (couldn't find match for provided location)
-        # record a warning
-        if (
-            va.location
-            and va.location.name.casefold() == "unknown"
-            and va.hospital.casefold() != "other"
-        ):
-            issue_text = "ERROR: location field (parsed from hospital) did not \
-                match any known facilities in the facility list. VA Explorer set \
-                the location to 'Unknown.'  This VA will not show on \
-                dashboards until underlying data is corrected to actual location."
-            issue = CauseCodingIssue(
-                verbalautopsy_id=va.id,
-                text=issue_text,
-                severity="error",
-                algorithm="",
-                settings="",
-            )
-            issues.append(issue)
+    va_df = _get_validation_df(verbal_autopsies, location_index)
+    if va_df.empty:
+        return
 
+    # clear all data related errors in case any were addressed
+    CauseCodingIssue.objects.filter(
+        verbalautopsy_id__in=va_df["id"].tolist(), algorithm=""
+    ).delete()
+
+    # each rule flags the VAs it applies to with a (severity, text) issue. Rules
+    # are listed in the order their issues are recorded for each VA
+    rules = []
+
+    # Validate: date of death
+    # Id10023 is required for the dashboard time frame filters
+    # VA form guarantees this field is either "dk" or a valid datetime.date value
+    invalid_dates = [
+        date for date in va_df["Id10023"].dropna().unique() if not _is_date(date)
+    ]
+    rules.append(
+        (
+            va_df["Id10023"].isin(invalid_dates),
+            "error",
+            "Error: field Id10023, couldn't parse date from "
+            + va_df["Id10023"].astype(str),
+        )
+    )
+
+    # Validate: ageInYears2
+    # ageInYears2 is required for calculating mean age of death
+    valid_ages = {age: _is_number(age) for age in va_df["ageInYears2"].unique()}
+    rules.append(
+        (
+            [not valid_ages[age] for age in va_df["ageInYears2"]],
+            "warning",
+            ISSUE_TEXTS["age_not_a_number"],
+        )
+    )
+
+    # Validate: age
+    # age group can be determined from multiple fields, it's required for
+    # filtering demographics
+    has_age_group = np.zeros(len(va_df), dtype=bool)
+    for field in AGE_GROUP_FIELDS:
+        has_age_group |= va_df[field].map(_is_flag_set).to_numpy(dtype=bool)
+    rules.append((~has_age_group, "warning", ISSUE_TEXTS["no_age_group"]))
+
+    # Validate: location
+    # location is used to display the record on the map
+    # if still no location after re-assigning, record an error
+    has_location = va_df["location_id"].notna()
+    rules.append((~has_location, "error", ISSUE_TEXTS["no_location"]))
+
+    # look up details of the (few) distinct locations the VAs belong to at once
+    locations = pd.DataFrame(
+        Location.objects.filter(
+            id__in=va_df.loc[has_location, "location_id"].unique().tolist()
+        ).values("id", "name", "is_active"),
+        columns=["id", "name", "is_active"],
+    ).set_index("id")
+    location_name = va_df["location_id"].map(locations["name"]).fillna("")
+    is_active = va_df["location_id"].map(locations["is_active"]).fillna(False)
+    is_unknown = has_location & (location_name.str.casefold() == "unknown")
+    is_other = va_df["hospital"].map(
+        lambda hospital: str(hospital).casefold() == "other"
+    )
+
+    # if location is valid but inactive record a warning
+    rules.append(
+        (
+            has_location & ~is_active.astype(bool) & ~is_unknown & ~is_other,
+            "warning",
+            ISSUE_TEXTS["inactive_location"],
+        )
+    )
+
+    # if location is "Other" (a valid, but non-informative location stemming
+    # stemming from bad data) record a warning
+    rules.append((is_unknown & is_other, "warning", ISSUE_TEXTS["other_location"]))
+
+    # if location is "Unknown" (couldn't find match for provided location)
+    # record a warning
+    rules.append((is_unknown & ~is_other, "error", ISSUE_TEXTS["unknown_location"]))
+
+    # issue texts can be per-VA (series) or the same for every VA (string)
+    rules = [
+        (
+            np.asarray(flagged, dtype=bool),
+            severity,
+            text.tolist() if isinstance(text, pd.Series) else [text] * len(va_df),
+        )
+        for flagged, severity, text in rules
+    ]
+    issues = [
+        CauseCodingIssue(
+            verbalautopsy_id=va_id,
+            text=texts[position],
+            severity=severity,
+            algorithm="",
+            settings="",
+        )
+        for position, va_id in enumerate(va_df["id"].tolist())
+        for flagged, severity, texts in rules
+        if flagged[position]
+    ]
     CauseCodingIssue.objects.bulk_create(issues)
+
+
+# build a dataframe of the fields needed for validation. Querysets are projected
+# with values() so full VA records never need to be loaded; VA objects (which may
+# have unsaved changes) are read as they are. VAs without a location get one
+# assigned (in memory only) before validating.
+def _get_validation_df(verbal_autopsies, location_index=None):
+    if isinstance(verbal_autopsies, QuerySet):
+        va_df = pd.DataFrame(
+            verbal_autopsies.values(*VALIDATION_FIELDS), columns=VALIDATION_FIELDS
+        )
+        unlocated_vas = list(
+            verbal_autopsies.model.objects.filter(
+                id__in=va_df.loc[va_df["location_id"].isna(), "id"].tolist()
+            )
+        )
+    else:
+        verbal_autopsies = list(verbal_autopsies)
+        unlocated_vas = [va for va in verbal_autopsies if not va.location_id]
+        va_df = pd.DataFrame(
+            [
+                {field: getattr(va, field) for field in VALIDATION_FIELDS}
+                for va in verbal_autopsies
+            ],
+            columns=VALIDATION_FIELDS,
+        )
+
+    # try re-assigning missing locations using location logic described in
+    # loading.py. Done for the whole batch at once so lookups are shared
+    assign_locations(unlocated_vas, location_index)
+    new_locations = {va.id: va.location_id for va in unlocated_vas}
+    va_df["location_id"] = va_df["location_id"].fillna(va_df["id"].map(new_locations))
+    # keep as objects so ids aren't turned into floats by missing values
+    va_df = va_df.astype(object).where(va_df.notna(), None)
+    return va_df
+
+
+def _is_date(date):
+    try:
+        parse_date(date, strict=True)
+        return True
+    except:  # noqa E722 - Intent is to flag the date, not handle exception
+        return False
+
+
+def _is_number(age):
+    try:
+        _ = int(float(age))
+        return True
+    except:  # noqa E722 - Intent is to flag the age, not handle exception
+        return False
+
+
+def _is_flag_set(value):
+    return value == 1 or value == "1"
@@ -19,9 +19,17 @@ from django.views.generic import (
 from django.views.generic.detail import SingleObjectMixin
 
 from va_explorer.utils.mixins import CustomAuthMixin
+from va_explorer.va_analytics.utils.rollup import (
+    refresh_dashboard_rollup,
+    rollup_partitions,
+)
 from va_explorer.va_data_management.filters import VAFilter
 from va_explorer.va_data_management.forms import VerbalAutopsyForm
-from va_explorer.va_data_management.models import Location, VerbalAutopsy
+from va_explorer.va_data_management.models import (
+    Location,
+    VerbalAutopsy,
+    default_cause,
+)
 from va_explorer.va_data_management.tasks import run_coding_algorithms
 from va_explorer.va_data_management.utils.date_parsing import parse_date
 from va_explorer.va_data_management.utils.loading import get_va_summary_stats
@@ -38,15 +46,16 @@ class Index(CustomAuthMixin, PermissionRequiredMixin, ListView):
         queryset = (
             self.request.user.verbal_autopsies()
             .select_related("location")
-            .select_related("causes")
             .select_related("coding_issues")
+            # only the causes of the default algorithm settings are shown
+            .annotate(cod=default_cause())
             .annotate(
                 deceased=Concat("Id10017", V(" "), "Id10018", output_field=TextField())
             )
             .values(
                 "id",
                 "location__name",
-                "causes__cause",
+                "cod__cause",
                 "Id10023",
                 "Id10010",
                 "Id10012",
@@ -70,7 +79,7 @@ class Index(CustomAuthMixin, PermissionRequiredMixin, ListView):
             "interviewer": "Id10010",
             "dod": "Id10023",
             "facility": "location__name",
-            "cause": "causes__cause",
+            "cause": "cod__cause",
             "interviewed": "Id10012",
             "deceased": "deceased",
         }
@@ -119,7 +128,7 @@ class Index(CustomAuthMixin, PermissionRequiredMixin, ListView):
                     parse_date(va["Id10023"]) if (va["Id10023"] != "dk") else "Unknown"
                 ),
                 "facility": va["location__name"],
-                "cause": va["causes__cause"],
+                "cause": va["cod__cause"],
                 "warnings": va["warnings"],
                 "errors": va["errors"],
             }
@@ -209,6 +218,13 @@ class Edit(
     pk_url_kwarg = "id"
     success_message = "Verbal Autopsy successfully updated!"
 
+    def form_valid(self, form):
+        # the edit may move the VA to another date or location in the rollup
+        partitions = rollup_partitions([self.object.pk])
+        response = super().form_valid(form)
+        refresh_dashboard_rollup([self.object.pk], partitions)
+        return response
+
     def get_success_url(self):
         # update the validation errors
         validate_vas_for_dashboard([self.object])
@@ -236,6 +252,9 @@ class Reset(
 
     def render_to_response(self, context):
         _ = context  # unused
+        # VAs imported with deferred history need their original version recorded
+        VerbalAutopsy.materialize_history([self.object.pk])
+        partitions = rollup_partitions([self.object.pk])
         earliest = self.object.history.earliest()
         latest = self.object.history.latest()
         if (
@@ -250,6 +269,7 @@ class Reset(
             earliest.instance.save()
             # update the validation errors
             validate_vas_for_dashboard([earliest])
+            refresh_dashboard_rollup([self.object.pk], partitions)
         messages.success(self.request, self.success_message)
         return redirect("va_data_management:show", id=self.object.id)
 
@@ -265,6 +285,8 @@ class RevertLatest(
     def render_to_response(self, context):
         _ = context  # unused
         # TODO: Should record automatically be recoded?
+        VerbalAutopsy.materialize_history([self.object.pk])
+        partitions = rollup_partitions([self.object.pk])
         if self.object.history.count() > 1:
             previous = self.object.history.all()[1]
             latest = self.object.history.latest()
@@ -279,6 +301,7 @@ class RevertLatest(
                 previous.instance.save()
                 # update the validation errors
                 validate_vas_for_dashboard([previous])
+                refresh_dashboard_rollup([self.object.pk], partitions)
         messages.success(self.request, self.success_message)
         return redirect("va_data_management:show", id=self.object.id)
 
@@ -318,7 +341,9 @@ class Delete(CustomAuthMixin, PermissionRequiredMixin, DeleteView):
             .exists()
         ):
             messages.success(self.request, self.success_message % obj.__dict__)
-            return super().delete(request, *args, **kwargs)
+            response = super().delete(request, *args, **kwargs)
+            refresh_dashboard_rollup([obj.id])
+            return response
         else:
             messages.error(self.request, self.error_message % obj.__dict__)
             return redirect("va_data_cleanup:index")
@@ -335,7 +360,10 @@ class DeleteAll(CustomAuthMixin, PermissionRequiredMixin, TemplateView):
     template_name = "va_data_management/verbalautopsy_confirm_delete_all.html"
 
     def post(self, request, *args, **kwargs):
-        self.request.user.verbal_autopsies().filter(duplicate=True).delete()
+        duplicates = self.request.user.verbal_autopsies().filter(duplicate=True)
+        va_ids = list(duplicates.values_list("id", flat=True))
+        duplicates.delete()
+        refresh_dashboard_rollup(va_ids)
         messages.success(self.request, self.success_message)
         return redirect(reverse("va_data_cleanup:index"))
 
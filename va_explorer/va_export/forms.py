@@ -9,7 +9,9 @@ from va_explorer.va_data_management.models import CauseOfDeath, Location
 # load COD options for export form
 def get_cod_options():
     options = list(
-        CauseOfDeath.objects.distinct("cause").values_list("cause", flat=True)
+        CauseOfDeath.objects.filter(variant="")
+        .distinct("cause")
+        .values_list("cause", flat=True)
     )
     options.insert(0, "All")
     return [(o, o) for o in options]
@@ -57,7 +59,9 @@ class VADownloadForm(forms.Form):
     )
 
     causes = ModelMultipleChoiceField(
-        queryset=CauseOfDeath.objects.distinct("cause").order_by("cause"),
+        queryset=CauseOfDeath.objects.filter(variant="")
+        .distinct("cause")
+        .order_by("cause"),
         widget=SelectMultiple(attrs={"class": "cod-select"}),
         required=False,
         help_text="Filter data by Cause of Death (CoD)",
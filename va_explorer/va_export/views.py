@@ -15,7 +15,7 @@ from django.views.generic.edit import FormView
 
 from va_explorer.utils.mixins import CustomAuthMixin
 from va_explorer.va_data_management.constants import PII_FIELDS, REDACTED_STRING
-from va_explorer.va_data_management.models import Location
+from va_explorer.va_data_management.models import Location, default_cause
 from va_explorer.va_export.forms import VADownloadForm
 
 
@@ -35,14 +35,18 @@ class VaApi(CustomAuthMixin, View):
         # unknown death dates, or unknown CODs
         matching_vas = (
             request.user.verbal_autopsies()
-            .exclude(Id10023="dk")
+            .exclude(death_date__isnull=True)
             .exclude(location__isnull=True)
             .select_related("location")
+            # only the causes of the default algorithm settings are exported
+            .annotate(cod=default_cause())
             .annotate(
                 date=F("Id10023"),
-                cause=F("causes__cause"),
-                loc_id=F("location__id"),
+                cause=F("cod__cause"),
+                loc_path=F("location__path"),
                 loc_name=F("location__name"),
+                loc_province=F("location__province_name"),
+                loc_district=F("location__district_name"),
             )
         )
 
@@ -58,8 +62,7 @@ class VaApi(CustomAuthMixin, View):
             # merge in cause information before returning
             matching_vas = (
                 matching_vas.filter(pk__in=va_ids)
-                .select_related("causes")
-                .annotate(cause=F("causes__cause"), cause_id=F("causes__pk"))
+                .annotate(cause=F("cod__cause"), cause_id=F("cod__pk"))
                 .values()
             )
         # otherwise, proceed to check for other filters
@@ -88,18 +91,16 @@ class VaApi(CustomAuthMixin, View):
                 start_date = (
                     start_date[0] if isinstance(start_date, list) else start_date
                 )
-                matching_vas = matching_vas.filter(Id10023__gte=start_date)
+                matching_vas = matching_vas.filter(death_date__gte=start_date)
 
             if end_date not in empty_values:
                 end_date = end_date[0] if isinstance(end_date, list) else end_date
-                matching_vas = matching_vas.filter(Id10023__lte=end_date)
+                matching_vas = matching_vas.filter(death_date__lte=end_date)
 
             # get causes for matching vas and convert to list of records
-            matching_vas = (
-                matching_vas.select_related("causes")
-                .annotate(cause=F("causes__cause"), cause_id=F("causes__pk"))
-                .values()
-            )
+            matching_vas = matching_vas.annotate(
+                cause=F("cod__cause"), cause_id=F("cod__pk")
+            ).values()
 
             # =========COD FILTER LOGIC===================#
             cod_query = params.get("causes", None)
@@ -114,22 +115,24 @@ class VaApi(CustomAuthMixin, View):
         va_df = pd.DataFrame()
 
         if matching_vas.count() > 0:
-            # Build a location ancestors lookup and add location information at
-            # all levels to all vas
-            location_ancestors = {
-                location.id: location.get_ancestors()
-                for location in Location.objects.filter(location_type="facility")
-            }
+            # Add location information at all levels to all vas: the province and
+            # district are stored on the location, the root is looked up by path
+            roots = {root.path: root for root in Location.get_root_nodes()}
 
             # extract COD and location-based fields for each va object and
             # convert to dicts
             for va in matching_vas:
-                for ancestor in location_ancestors[va["loc_id"]]:
-                    va[ancestor.location_type] = ancestor.name
+                loc_path = va.pop("loc_path")
+                if len(loc_path) > Location.steplen:
+                    root = roots[loc_path[: Location.steplen]]
+                    va[root.location_type] = root.name
+                for location_type in ["province", "district"]:
+                    name = va.pop(f"loc_{location_type}")
+                    if name:
+                        va[location_type] = name
 
                 # Clean up location fields.
-                va["location"] = va["loc_name"]
-                del (va["loc_name"], va["loc_id"])
+                va["location"] = va.pop("loc_name")
 
             # convert results to dataframe
             va_df = pd.DataFrame.from_records(matching_vas)